@@ -0,0 +1,137 @@
+"""Check benchmark results against the baseline of ``benchmarks/baseline.json``.
+
+The baseline keeps the time of each benchmark relative to the one of a reference
+benchmark, ``test_reference``, timing the machine with a fixed workload, so that it
+can be compared to the results of any machine. The fastest round of each benchmark
+is used, being the least affected by the other processes of the machine.
+
+Check the results saved by ``pytest benchmarks --benchmark-json=results.json``::
+
+    python benchmarks/check_baseline.py results.json
+
+or replace the baseline with them, with ``--save``. Given the results of several
+runs, the baseline keeps the slowest relative time of each benchmark, covering the
+variations of the machine, and the check uses the fastest one.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+REFERENCE = "test_reference"
+# Relative slowdown of a benchmark, compared to the reference one, failing the check
+DEFAULT_TOLERANCE = 0.5
+
+
+def relative_times(results, reference=REFERENCE):
+    """Times of the benchmarks relative to the one of the reference benchmark.
+
+    :param results: Benchmark results, as saved by pytest-benchmark
+    :type results: dict
+    :param reference: (optional) Name of the reference benchmark
+    :type reference: str
+    :return: The ratio of the fastest round of each benchmark to the one of the
+             reference benchmark, by benchmark name
+    :rtype: dict
+    :raises: :class:`ValueError` if the reference benchmark is not in the results
+    """
+    times = {b["name"]: b["stats"]["min"] for b in results["benchmarks"]}
+    if reference not in times:
+        raise ValueError("Reference benchmark %s not found in the results" % reference)
+    return {
+        name: time / times[reference]
+        for name, time in sorted(times.items())
+        if name != reference
+    }
+
+
+def check(ratios, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Compare relative benchmark times to the baseline ones.
+
+    Benchmarks missing from the baseline are reported but do not fail the check.
+
+    :param ratios: Relative times of the benchmarks, by name
+    :type ratios: dict
+    :param baseline: Relative times of the baseline, by name
+    :type baseline: dict
+    :param tolerance: (optional) Relative slowdown failing the check
+    :type tolerance: float
+    :return: The report lines and the names of the benchmarks that regressed
+    :rtype: tuple
+    """
+    lines = []
+    regressions = []
+    for name, ratio in ratios.items():
+        if name not in baseline:
+            lines.append("%-40s %8.3g   (no baseline)" % (name, ratio))
+            continue
+        change = ratio / baseline[name] - 1
+        status = ""
+        if change > tolerance:
+            status = "REGRESSION"
+            regressions.append(name)
+        lines.append(
+            "%-40s %8.3g %8.3g %+7.0f%%  %s"
+            % (name, ratio, baseline[name], change * 100, status)
+        )
+    return lines, regressions
+
+
+def main(args=None):
+    """Check benchmark results against the baseline, relatively to a reference."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument(
+        "results", nargs="+", help="results of runs saved with --benchmark-json"
+    )
+    parser.add_argument(
+        "--baseline", default=BASELINE, help="the baseline (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help="relative slowdown failing the check (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--save",
+        action="store_true",
+        help="replace the baseline with the results instead of checking them",
+    )
+    options = parser.parse_args(args)
+
+    runs = []
+    for path in options.results:
+        with open(path) as fh:
+            runs.append(relative_times(json.load(fh)))
+    pick = max if options.save else min
+    ratios = {
+        name: pick(run[name] for run in runs if name in run)
+        for name in sorted(set().union(*runs))
+    }
+    if options.save:
+        with open(options.baseline, "w") as fh:
+            rounded = {name: float("%.4g" % ratio) for name, ratio in ratios.items()}
+            json.dump({"reference": REFERENCE, "ratios": rounded}, fh, indent=2)
+            fh.write("\n")
+        print("Baseline of %s benchmarks saved in %s" % (len(ratios), options.baseline))
+        return 0
+
+    with open(options.baseline) as fh:
+        baseline = json.load(fh)["ratios"]
+    lines, regressions = check(ratios, baseline, tolerance=options.tolerance)
+    print("Times relative to %s (fastest rounds):" % REFERENCE)
+    print("%-40s %8s %8s %8s" % ("benchmark", "current", "baseline", "change"))
+    print("\n".join(lines))
+    if regressions:
+        print(
+            "Slower by more than %.0f%%: %s"
+            % (options.tolerance * 100, ", ".join(regressions))
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
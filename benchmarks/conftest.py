@@ -0,0 +1,20 @@
+import pytest
+
+from tests.conftest import plugin_api  # noqa: F401
+from tests.mock_dhus import MockDHuS, synthetic_products
+
+
+@pytest.fixture(scope="session")
+def search_dhus():
+    """A mock DHuS with many small products, without latency."""
+    products, properties = synthetic_products(1000, size=100)
+    with MockDHuS(products, properties=properties) as dhus:
+        yield dhus
+
+
+@pytest.fixture(scope="session")
+def download_dhus():
+    """A mock DHuS with a few SAFE archives of 1 MiB."""
+    products, properties = synthetic_products(16, size=2**20)
+    with MockDHuS(products, properties=properties) as dhus:
+        yield dhus
@@ -0,0 +1,319 @@
+"""Benchmarks of the plugin, against a local mock DHuS server.
+
+Run them with ``tox -e benchmark``, which saves their results in ``.benchmarks``, or
+check them against ``baseline.json`` with ``tox -e benchmark-check``.
+"""
+
+import ast
+import json
+import os
+from unittest import mock
+
+import pytest
+from shapely.geometry import box
+
+from tests.mock_dhus import MockDHuS, synthetic_products
+
+pytest.importorskip("pytest_benchmark")
+
+
+def set_rate(benchmark, name, count):
+    """Add the rate of a benchmark, per second of its mean round, to its results."""
+    if benchmark.stats is None:
+        # Benchmarks disabled, the function only ran once without being timed
+        return
+    benchmark.extra_info[name] = count / benchmark.stats.stats.mean
+
+
+def test_reference(benchmark):
+    """Serialize and sort synthetic results, timing the machine instead of the plugin
+
+    The other benchmarks are compared to their baseline relatively to this one.
+    """
+    _, properties = synthetic_products(1000, size=100, archives=False)
+    results = list(properties.values())
+
+    def workload():
+        decoded = json.loads(json.dumps(results, default=str))
+        return sorted(decoded, key=lambda result: json.dumps(result, sort_keys=True))
+
+    assert len(benchmark.pedantic(workload, rounds=20)) == len(results)
+
+
+def test_search_page(benchmark, plugin_api, search_dhus):
+    """Search a page of 100 products, with their storage status"""
+    plugin_api.config.endpoint = search_dhus.url
+    total = len(search_dhus.products)
+
+    search_result, count = benchmark(
+        plugin_api.query, productType="S2_MSI_L1C", items_per_page=100
+    )
+
+    assert len(search_result) == 100
+    assert count == total
+    set_rate(benchmark, "results_per_second", len(search_result))
+
+
+@pytest.mark.parametrize("latency", [0.05])
+def test_search_page_latency(benchmark, plugin_api, latency):
+    """Search a page of 100 products from a server answering after 50 ms"""
+    products, properties = synthetic_products(100, size=100, archives=False)
+    with MockDHuS(products, properties=properties, latency=latency) as dhus:
+        plugin_api.config.endpoint = dhus.url
+        search_result, _ = benchmark(
+            plugin_api.query, productType="S2_MSI_L1C", items_per_page=100
+        )
+
+    assert len(search_result) == 100
+    set_rate(benchmark, "results_per_second", len(search_result))
+
+
+@pytest.mark.parametrize("count", [True, False], ids=["count", "nocount"])
+def test_search_count(benchmark, plugin_api, count):
+    """Search a page of 20 products from a server answering after 100 ms"""
+    products, properties = synthetic_products(100, size=100, archives=False)
+    with MockDHuS(products, properties=properties, latency=0.1) as dhus:
+        plugin_api.config.endpoint = dhus.url
+        # Only the search is timed, the storage status being resolved when read
+        plugin_api.config.lazy_storage_status = True
+        _, total_count = benchmark.pedantic(
+            plugin_api.query,
+            kwargs={"productType": "S2_MSI_L1C", "items_per_page": 20, "count": count},
+            rounds=5,
+        )
+
+    assert total_count == (100 if count else None)
+    # The count is read from the response of the page request
+    assert dhus.requests.count("GET /search") == 5
+    set_rate(benchmark, "searches_per_second", 1)
+
+
+def test_search_page_catalog(benchmark, plugin_api, search_dhus):
+    """Search a page of 100 products in the local catalog, with their storage status"""
+    plugin_api.config.endpoint = search_dhus.url
+    plugin_api.config.catalog = True
+    total = len(search_dhus.products)
+    plugin_api.query(productType="S2_MSI_L1C", source="hybrid")
+
+    search_result, count = benchmark(
+        plugin_api.query, productType="S2_MSI_L1C", items_per_page=100, source="local"
+    )
+
+    assert len(search_result) == 100
+    assert count == total
+    set_rate(benchmark, "results_per_second", len(search_result))
+
+
+def test_iter_query(benchmark, plugin_api, search_dhus):
+    """Iterate over all the products matching a search, by pages of 100"""
+    plugin_api.config.endpoint = search_dhus.url
+    total = len(search_dhus.products)
+
+    def iter_query():
+        return sum(
+            1
+            for _ in plugin_api.iter_query(items_per_page=100, productType="S2_MSI_L1C")
+        )
+
+    assert benchmark(iter_query) == total
+    set_rate(benchmark, "results_per_second", total)
+
+
+@pytest.mark.parametrize("compiled", [True, False], ids=["compiled", "literal_eval"])
+def test_pagination_params(benchmark, plugin_api, compiled):
+    """Build the pagination parameters of a page, from the compiled template or not"""
+    template = plugin_api.config.pagination["next_page_query_obj"]
+
+    def literal_eval(items_per_page, page):
+        # Template formatted and parsed for each page
+        return ast.literal_eval(
+            template.format(
+                items_per_page=items_per_page,
+                page=page,
+                skip=items_per_page * (page - 1),
+            )
+        )
+
+    get_pagination_params = (
+        plugin_api._get_pagination_params if compiled else literal_eval
+    )
+    params = benchmark(get_pagination_params, 20, 3)
+
+    assert params == plugin_api._get_pagination_params(20, 3)
+
+
+@pytest.mark.parametrize("plan", [True, False], ids=["plan", "generic"])
+def test_update_keyword(benchmark, plugin_api, plan):
+    """Build the sentinelsat parameters of a search, with or without its query plan"""
+    kwargs = dict(
+        productType="S2_MSI_L1C",
+        startTimeFromAscendingNode="2020-05-01",
+        completionTimeFromAscendingNode="2020-05-02T15:00:00Z",
+        geometry=box(1.23, 43.42, 1.68, 43.76),
+        cloudCover=20,
+    )
+    expected, _ = plugin_api._update_keyword(**kwargs)
+
+    def build_query_string(plan, product_type, kwargs):
+        # Parameters built by QueryStringSearch.build_query_string for each search
+        return plugin_api.build_query_string(product_type, **kwargs)
+
+    if plan:
+        params, _ = benchmark(plugin_api._update_keyword, **kwargs)
+    else:
+        with mock.patch.object(
+            plugin_api, "_bind_query_plan", side_effect=build_query_string
+        ):
+            params, _ = benchmark(plugin_api._update_keyword, **kwargs)
+
+    assert params == expected
+
+
+@pytest.mark.parametrize("odata", [True, False], ids=["odata", "is_online"])
+def test_storage_status(benchmark, plugin_api, odata):
+    """Resolve the storage status of 100 products from a server answering after 50 ms"""
+    products, properties = synthetic_products(100, size=100, archives=False)
+    with MockDHuS(products, properties=properties, latency=0.05) as dhus:
+        plugin_api.config.endpoint = dhus.url
+        plugin_api._init_api()
+        query_params, _ = plugin_api._update_keyword(productType="S2_MSI_L1C")
+        results, _ = plugin_api._query_with_count(limit=100, **query_params)
+
+        def setup():
+            # Results whose storage status is not given by the OpenSearch feed
+            return (
+                {
+                    uuid: {
+                        k: v
+                        for k, v in result.items()
+                        if k not in ("Online", "ondemand", "storage_status")
+                    }
+                    for uuid, result in results.items()
+                },
+            ), {}
+
+        # Without OData, the storage status is requested product by product
+        get_online_statuses = (
+            plugin_api._get_online_statuses if odata else lambda uuids: {}
+        )
+        with mock.patch.object(
+            plugin_api, "_get_online_statuses", side_effect=get_online_statuses
+        ):
+            benchmark.pedantic(
+                plugin_api._resolve_storage_status, setup=setup, rounds=5
+            )
+
+    is_online_requests = [r for r in dhus.requests if r.endswith("/Online/$value")]
+    assert bool(is_online_requests) is not odata
+    set_rate(benchmark, "results_per_second", len(results))
+
+
+@pytest.mark.parametrize("count", [100, 1000, 10000])
+def test_normalize_results(benchmark, plugin_api, count):
+    """Convert the sentinelsat results of a search to EO products"""
+    products, properties = synthetic_products(count, size=100, archives=False)
+    with MockDHuS(products, properties=properties) as dhus:
+        plugin_api.config.endpoint = dhus.url
+        plugin_api._init_api()
+        query_params, _ = plugin_api._update_keyword(productType="S2_MSI_L1C")
+        results, _ = plugin_api._query_with_count(limit=count, **query_params)
+        plugin_api._resolve_storage_status(results)
+    results = list(results.values())
+
+    products = benchmark(plugin_api._normalize_results, results)
+
+    assert len(products) == count
+    set_rate(benchmark, "results_per_second", count)
+
+
+@pytest.mark.parametrize("extract", [False, True], ids=["noextract", "extract"])
+def test_download_all(benchmark, plugin_api, download_dhus, tmp_path, extract):
+    """Download 16 products of 1 MiB, each round to a new directory"""
+    plugin_api.config.endpoint = download_dhus.url
+    count = len(download_dhus.products)
+    size = sum(len(content) for content in download_dhus.products.values())
+    rounds = []
+
+    def setup():
+        # Products downloaded are located on the disk: search them again
+        search_result, _ = plugin_api.query(
+            productType="S2_MSI_L1C", items_per_page=count
+        )
+        outputs_prefix = str(tmp_path / str(len(rounds)))
+        rounds.append(outputs_prefix)
+        return (search_result,), {"outputs_prefix": outputs_prefix, "extract": extract}
+
+    paths = benchmark.pedantic(plugin_api.download_all, setup=setup, rounds=5)
+
+    assert len(paths) == count
+    assert all(path.startswith(rounds[-1]) for path in paths)
+    set_rate(benchmark, "megabytes_per_second", size / 1e6)
+
+
+def read_bytes():
+    """Bytes read from files by the process so far"""
+    with open("/proc/self/io") as fh:
+        for line in fh:
+            if line.startswith("rchar:"):
+                return int(line.split()[1])
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/io"), reason="Linux only")
+@pytest.mark.parametrize("extract", [False, True], ids=["noextract", "extract"])
+def test_download_checksum(benchmark, plugin_api, tmp_path, extract):
+    """Download and verify 4 products of 8 MiB, counting the bytes read"""
+    products, properties = synthetic_products(4, size=8 * 2**20)
+    size = sum(len(content) for content in products.values())
+    reads = []
+
+    def download_all(search_result, **kwargs):
+        start = read_bytes()
+        paths = plugin_api.download_all(search_result, **kwargs)
+        reads.append(read_bytes() - start)
+        return paths
+
+    with MockDHuS(products, properties=properties) as dhus:
+        plugin_api.config.endpoint = dhus.url
+
+        def setup():
+            search_result, _ = plugin_api.query(productType="S2_MSI_L1C")
+            outputs_prefix = str(tmp_path / str(len(reads)))
+            return (search_result,), {
+                "outputs_prefix": outputs_prefix,
+                "extract": extract,
+            }
+
+        paths = benchmark.pedantic(download_all, setup=setup, rounds=3)
+
+    assert len(paths) == len(products)
+    # The archives are hashed as they are received (socket reads are not counted),
+    # and only read again from the disk to be extracted
+    assert min(reads) < size * (1.5 if extract else 0.5)
+    benchmark.extra_info["read_bytes_per_product"] = min(reads) / len(products)
+    set_rate(benchmark, "megabytes_per_second", size / 1e6)
+
+
+@pytest.mark.parametrize("records", [None, "sqlite"], ids=["files", "sqlite"])
+def test_skip_downloaded(benchmark, plugin_api, search_dhus, records):
+    """Skip 1000 products already downloaded"""
+    plugin_api.config.endpoint = search_dhus.url
+    plugin_api.config.download_records = records
+    total = len(search_dhus.products)
+    search_result, _ = plugin_api.query(productType="S2_MSI_L1C", items_per_page=total)
+    first_paths = plugin_api.download_all(search_result, extract=False)
+    transfers = len(search_dhus.requests)
+
+    def setup():
+        search_result, _ = plugin_api.query(
+            productType="S2_MSI_L1C", items_per_page=total
+        )
+        return (search_result,), {"extract": False}
+
+    paths = benchmark.pedantic(plugin_api.download_all, setup=setup, rounds=5)
+
+    assert paths == first_paths
+    assert not any(
+        r.endswith("$value") and r.startswith("GET")
+        for r in search_dhus.requests[transfers:]
+    )
+    set_rate(benchmark, "skipped_per_second", total)
@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+# eodag-sentinelsat, a plugin for searching and downloading products from Copernicus Scihub
+#     Copyright 2021, CS GROUP - France, https://www.csgroup.eu/
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""Search results caches used by the Sentinelsat plugin."""
+
+import abc
+import hashlib
+import json
+import logging as py_logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+
+from dateutil.parser import isoparse
+
+logger = py_logging.getLogger("eodag.plugins.apis.sentinelsat")
+
+DEFAULT_CACHE_TTL = 300  # seconds
+DEFAULT_CACHE_MAX_SIZE = 128  # entries
+
+
+def _json_default(obj):
+    """Serialize the values sentinelsat query parameters can hold."""
+    if isinstance(obj, (date, datetime)):
+        return obj.isoformat()
+    if isinstance(obj, (set, frozenset)):
+        return sorted(obj, key=str)
+    return str(obj)
+
+
+def to_json(value):
+    """Serialize sentinelsat results to JSON, keeping their dates and tuples.
+
+    :param value: Results, or any value made of dicts, lists, tuples, dates and JSON
+                  scalars
+    :return: The JSON document, decoded by :func:`from_json`
+    :rtype: str
+    """
+    return json.dumps(_tag(value), separators=(",", ":"))
+
+
+def from_json(data):
+    """Deserialize a value serialized by :func:`to_json`.
+
+    :param data: The JSON document
+    :type data: str
+    :return: The value
+    """
+    return json.loads(data, object_hook=_untag)
+
+
+def _tag(value):
+    """Replace the values JSON cannot hold by tagged objects."""
+    if isinstance(value, dict):
+        return {k: _tag(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_tag(v) for v in value]
+    if isinstance(value, tuple):
+        return {"$tuple": [_tag(v) for v in value]}
+    if isinstance(value, datetime):
+        return {"$datetime": value.isoformat()}
+    if isinstance(value, date):
+        return {"$date": value.isoformat()}
+    return value
+
+
+def _untag(obj):
+    if len(obj) == 1:
+        if "$tuple" in obj:
+            return tuple(obj["$tuple"])
+        if "$datetime" in obj:
+            return isoparse(obj["$datetime"])
+        if "$date" in obj:
+            return isoparse(obj["$date"]).date()
+    return obj
+
+
+def make_cache_key(*args, **kwargs):
+    """Build a cache key from query parameters.
+
+    The parameters are serialized in a canonical way (sorted keys, ISO dates,
+    sorted sets) so that equivalent queries get the same key.
+
+    :return: The cache key
+    :rtype: str
+    """
+    canonical = json.dumps(
+        [args, kwargs], sort_keys=True, default=_json_default, separators=(",", ":")
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class QueryCache(abc.ABC):
+    """Base class of the search results caches.
+
+    Entries expire ``ttl`` seconds after they have been stored. The number of
+    cache hits and misses is counted in ``hits`` and ``misses``.
+
+    :param ttl: Entries time to live in seconds
+    :type ttl: float
+    """
+
+    def __init__(self, ttl=DEFAULT_CACHE_TTL):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def get(self, key):
+        """Get a cached value.
+
+        :param key: The cache key
+        :type key: str
+        :return: The cached value, or None if not found or expired
+        """
+        value = self._get(key)
+        with self._stats_lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    @abc.abstractmethod
+    def set(self, key, value):
+        """Store a value in the cache.
+
+        :param key: The cache key
+        :type key: str
+        :param value: The value to store, that :func:`to_json` must serialize for
+                      on-disk caches
+        """
+
+    @abc.abstractmethod
+    def invalidate(self, key=None):
+        """Remove an entry from the cache, or all of them if no key is given.
+
+        :param key: (optional) The cache key
+        :type key: str
+        """
+
+    def stats(self):
+        """Cache usage statistics.
+
+        :return: The number of hits and misses
+        :rtype: dict
+        """
+        return {"hits": self.hits, "misses": self.misses}
+
+    @abc.abstractmethod
+    def _get(self, key):
+        """Get a cached value, without counting hits and misses."""
+
+
+class MemoryQueryCache(QueryCache):
+    """In-memory LRU cache, with expiring entries.
+
+    :param ttl: Entries time to live in seconds
+    :type ttl: float
+    :param max_size: Maximum number of entries kept, least recently used ones are
+                     evicted first
+    :type max_size: int
+    """
+
+    def __init__(self, ttl=DEFAULT_CACHE_TTL, max_size=DEFAULT_CACHE_MAX_SIZE):
+        super().__init__(ttl=ttl)
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """Store a value in the cache, evicting the least recently used entries."""
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key=None):
+        """Remove an entry from the cache, or all of them if no key is given."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+
+class DiskQueryCache(QueryCache):
+    """On-disk cache, that can be shared between processes.
+
+    Each entry is serialized with :func:`to_json` in its own file of ``directory``,
+    written atomically.
+
+    :param directory: Where cache entries are stored
+    :type directory: str
+    :param ttl: Entries time to live in seconds
+    :type ttl: float
+    """
+
+    def __init__(self, directory, ttl=DEFAULT_CACHE_TTL):
+        super().__init__(ttl=ttl)
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    def _get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as fh:
+                expires_at, value = from_json(fh.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, TypeError, ValueError) as ex:
+            logger.debug("Could not read cache entry %s: %s", path, ex)
+            return None
+        if expires_at < time.time():
+            self._remove(path)
+            return None
+        return value
+
+    def set(self, key, value):
+        """Store a value in the cache, replacing atomically any previous entry."""
+        data = to_json([time.time() + self.ttl, value])
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                fh.write(data)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            self._remove(tmp_path)
+            raise
+
+    def invalidate(self, key=None):
+        """Remove an entry from the cache, or all of them if no key is given."""
+        if key is not None:
+            self._remove(self._path(key))
+            return
+        for filename in os.listdir(self.directory):
+            if filename.endswith(".json"):
+                self._remove(os.path.join(self.directory, filename))
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def build_query_cache(cache_config):
+    """Create the search results cache described by a plugin configuration.
+
+    :param cache_config: ``query_cache`` plugin configuration, with the optional keys
+                         ``ttl``, ``max_size`` and ``directory`` (an on-disk cache is
+                         used if the latter is set)
+    :type cache_config: dict
+    :return: The cache, or None if no configuration is given
+    :rtype: :class:`QueryCache`
+    """
+    if not cache_config:
+        return None
+    if cache_config is True:
+        cache_config = {}
+    ttl = cache_config.get("ttl", DEFAULT_CACHE_TTL)
+    directory = cache_config.get("directory")
+    if directory:
+        return DiskQueryCache(os.path.expanduser(directory), ttl=ttl)
+    return MemoryQueryCache(
+        ttl=ttl, max_size=cache_config.get("max_size", DEFAULT_CACHE_MAX_SIZE)
+    )
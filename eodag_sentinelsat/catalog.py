@@ -0,0 +1,376 @@
+# -*- coding: utf-8 -*-
+# eodag-sentinelsat, a plugin for searching and downloading products from Copernicus Scihub
+#     Copyright 2021, CS GROUP - France, https://www.csgroup.eu/
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""Local catalog of the products found by the Sentinelsat plugin searches.
+
+The sentinelsat results of the searches are kept in a SQLite database, with an R-tree
+index on their footprints and an index on their product type and sensing date, so
+that searches can be answered without requesting the hub.
+
+Each product is linked to the search criteria that found it, except its dates and
+geometry: a search is answered from the products found with the same criteria, whose
+sensing start date and footprint match the search ones. The catalog also keeps, for
+each set of criteria, the date ranges and geometries fully searched on the hub, so
+that only the date ranges not covered yet are requested again.
+"""
+
+import logging as py_logging
+import time
+from datetime import datetime
+
+from shapely import wkt
+from shapely.prepared import prep
+
+from eodag_sentinelsat.cache import from_json, make_cache_key, to_json
+from eodag_sentinelsat.store import (
+    SQLiteStore,
+    format_date,
+    parse_date,
+    store_options,
+    store_path,
+)
+
+logger = py_logging.getLogger("eodag.plugins.apis.sentinelsat")
+
+# Name of the database created in the outputs_prefix directory by default
+DEFAULT_CATALOG_DB = ".catalog.sqlite"
+# Search sources: the catalog only, the hub only, or the hub for what the catalog
+# does not cover
+CATALOG_SOURCES = ("local", "remote", "hybrid")
+# sentinelsat query parameters that are not search criteria, the ingestion dates
+# being only searched by the harvests
+_NON_CRITERIA_PARAMS = ("date", "area", "limit", "offset", "order_by", "ingestiondate")
+# Predicates of the sentinelsat area relations, between the area (prepared) and a
+# footprint. The footprints matching them all have a bounding box intersecting the
+# area one, which is checked first in the R-tree index
+_AREA_RELATIONS = {
+    "intersects": lambda area, footprint: area.intersects(footprint),
+    "contains": lambda area, footprint: area.within(footprint),
+    "iswithin": lambda area, footprint: area.contains(footprint),
+}
+
+
+class CatalogQuery(object):
+    """A search of the catalog, built from sentinelsat query parameters.
+
+    :param endpoint: The hub endpoint, products of different hubs being kept apart
+    :type endpoint: str
+    :param query_params: sentinelsat query parameters, whose ``date`` can only hold
+                         datetimes
+    :type query_params: dict
+    """
+
+    def __init__(self, endpoint, query_params):
+        self.criteria = {
+            k: v for k, v in query_params.items() if k not in _NON_CRITERIA_PARAMS
+        }
+        self.key = make_cache_key(endpoint, **self.criteria)
+        self.area = query_params.get("area")
+        self.area_relation = query_params.get("area_relation", "Intersects")
+        start, end = query_params.get("date") or (None, None)
+        for value in (start, end):
+            if value is not None and not isinstance(value, datetime):
+                raise ValueError("Unsupported date for a catalog search: %r" % (value,))
+        self.start = start
+        # Products sensed in the future are not searched
+        self.end = end or datetime.utcnow()
+
+    def query_params(self, start, end):
+        """sentinelsat query parameters of the search, for a date range.
+
+        :return: The query parameters
+        :rtype: dict
+        """
+        query_params = dict(self.criteria, date=(start, end))
+        if self.area is not None:
+            query_params["area"] = self.area
+        return query_params
+
+
+class SQLiteCatalog(SQLiteStore):
+    """Catalog of products stored in a SQLite database.
+
+    :param path: Path to the database file, created if needed
+    :type path: str
+    :param ttl: (optional) Seconds after which the date ranges searched on the hub
+                are not considered covered anymore, products being ingested by the
+                hub some time after they are sensed (default: never)
+    :type ttl: float
+    """
+
+    def __init__(self, path, ttl=None):
+        self.ttl = ttl
+        super().__init__(path)
+
+    def _create_tables(self):
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS products ("
+            "id INTEGER PRIMARY KEY, "
+            "uuid TEXT UNIQUE, "
+            "producttype TEXT, "
+            "beginposition TEXT, "
+            "footprint TEXT, "
+            "result TEXT, "
+            "updated_at REAL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS products_type_date "
+            "ON products (producttype, beginposition)"
+        )
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS footprints "
+            "USING rtree(id, minx, maxx, miny, maxy)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS matches ("
+            "query_key TEXT, "
+            "product_id INTEGER, "
+            "PRIMARY KEY (query_key, product_id)) WITHOUT ROWID"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS coverage ("
+            "query_key TEXT, "
+            "area TEXT, "
+            "start_date TEXT, "
+            "end_date TEXT, "
+            "searched_at REAL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS coverage_key ON coverage (query_key)"
+        )
+
+    def add(self, query, results):
+        """Add or update products found by a search, in a single transaction.
+
+        :param query: The search
+        :type query: :class:`CatalogQuery`
+        :param results: sentinelsat results of the search. Their ``storage_status``
+                        is not kept, since it changes over time
+        :type results: list(dict)
+        """
+        now = time.time()
+        rows = []
+        for result in results:
+            result = {k: v for k, v in result.items() if k != "storage_status"}
+            footprint = result.get("footprint")
+            bounds = wkt.loads(footprint).bounds if footprint else None
+            rows.append((result, footprint, bounds))
+        with self._lock, self._conn:
+            for result, footprint, bounds in rows:
+                product_id = self._upsert(result, footprint, now)
+                self._conn.execute("DELETE FROM footprints WHERE id = ?", (product_id,))
+                if bounds is not None:
+                    minx, miny, maxx, maxy = bounds
+                    self._conn.execute(
+                        "INSERT INTO footprints VALUES (?, ?, ?, ?, ?)",
+                        (product_id, minx, maxx, miny, maxy),
+                    )
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO matches VALUES (?, ?)",
+                    (query.key, product_id),
+                )
+
+    def _upsert(self, result, footprint, now):
+        values = (
+            result.get("producttype"),
+            format_date(result.get("beginposition")),
+            footprint,
+            to_json(result),
+            now,
+        )
+        row = self._conn.execute(
+            "SELECT id FROM products WHERE uuid = ?", (result["uuid"],)
+        ).fetchone()
+        if row is None:
+            return self._conn.execute(
+                "INSERT INTO products "
+                "(producttype, beginposition, footprint, result, updated_at, uuid) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                values + (result["uuid"],),
+            ).lastrowid
+        self._conn.execute(
+            "UPDATE products SET producttype = ?, beginposition = ?, footprint = ?, "
+            "result = ?, updated_at = ? WHERE id = ?",
+            values + (row[0],),
+        )
+        return row[0]
+
+    def add_coverage(self, query, start, end):
+        """Record that a date range of a search was fully searched on the hub.
+
+        :param query: The search
+        :type query: :class:`CatalogQuery`
+        :param start: Start of the date range, None if unbounded
+        :type start: datetime
+        :param end: End of the date range
+        :type end: datetime
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO coverage VALUES (?, ?, ?, ?, ?)",
+                (
+                    query.key,
+                    query.area,
+                    format_date(start),
+                    format_date(end),
+                    time.time(),
+                ),
+            )
+
+    def uncovered(self, query):
+        """The date ranges of a search not fully searched on the hub yet.
+
+        A date range is covered by the previous searches with the same criteria whose
+        geometry covers the search one, or that had no geometry.
+
+        :param query: The search
+        :type query: :class:`CatalogQuery`
+        :return: The ``(start, end)`` date ranges not covered, ``start`` being None if
+                 unbounded
+        :rtype: list(tuple)
+        """
+        sql = "SELECT area, start_date, end_date FROM coverage WHERE query_key = ?"
+        params = [query.key]
+        if self.ttl is not None:
+            sql += " AND searched_at >= ?"
+            params.append(time.time() - self.ttl)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        area = wkt.loads(query.area) if query.area else None
+        intervals = sorted(
+            (start, end)
+            for covered_area, start, end in rows
+            if covered_area is None
+            or (area is not None and wkt.loads(covered_area).covers(area))
+        )
+        gaps = []
+        position = format_date(query.start)
+        end = format_date(query.end)
+        for covered_start, covered_end in intervals:
+            if covered_start > position:
+                gaps.append((position, min(covered_start, end)))
+            position = max(position, covered_end)
+            if position >= end:
+                break
+        if position < end:
+            gaps.append((position, end))
+        return [(parse_date(start), parse_date(end)) for start, end in gaps]
+
+    def search(self, query, limit=None, offset=0):
+        """Search the products of the catalog.
+
+        Products are sorted by sensing start date and uuid. The candidates are
+        selected in SQL, their bounding box being checked in the R-tree index: without
+        search geometry, the page is selected in SQL too. Otherwise the footprint of
+        each candidate is checked against the search geometry, only the results of the
+        page being loaded.
+
+        :param query: The search
+        :type query: :class:`CatalogQuery`
+        :param limit: (optional) Maximum number of products returned
+        :type limit: int
+        :param offset: (optional) The number of products to skip
+        :type offset: int
+        :return: The sentinelsat results of the products indexed by uuid, and the
+                 total count of the products matching the search
+        :rtype: tuple(dict, int)
+        """
+        where = ["m.query_key = ?", "p.beginposition <= ?"]
+        params = [query.key, format_date(query.end)]
+        if query.start is not None:
+            where.append("p.beginposition >= ?")
+            params.append(format_date(query.start))
+        joins = "JOIN matches m ON m.product_id = p.id "
+        predicate = None
+        if query.area:
+            predicate = _AREA_RELATIONS.get(query.area_relation.lower())
+            if predicate is None:
+                raise ValueError("Unsupported area relation: %s" % query.area_relation)
+            area = wkt.loads(query.area)
+            prepared = prep(area)
+            minx, miny, maxx, maxy = area.bounds
+            joins += "JOIN footprints f ON f.id = p.id "
+            where.append("f.minx <= ? AND f.maxx >= ? AND f.miny <= ? AND f.maxy >= ?")
+            params.extend([maxx, minx, maxy, miny])
+        condition = " AND ".join(where)
+        page_end = None if limit is None else offset + limit
+
+        if predicate is None:
+            sql = (
+                "SELECT p.id FROM products p %sWHERE %s "
+                "ORDER BY p.beginposition, p.uuid LIMIT ? OFFSET ?" % (joins, condition)
+            )
+            with self._lock:
+                (total,) = self._conn.execute(
+                    "SELECT COUNT(*) FROM products p %sWHERE %s" % (joins, condition),
+                    params,
+                ).fetchone()
+                page_ids = [
+                    row[0]
+                    for row in self._conn.execute(
+                        sql, params + [-1 if limit is None else limit, offset]
+                    )
+                ]
+        else:
+            sql = (
+                "SELECT p.id, p.footprint FROM products p %sWHERE %s "
+                "ORDER BY p.beginposition, p.uuid" % (joins, condition)
+            )
+            total = 0
+            page_ids = []
+            with self._lock:
+                for product_id, footprint in self._conn.execute(sql, params):
+                    if not predicate(prepared, wkt.loads(footprint)):
+                        continue
+                    if total >= offset and (page_end is None or total < page_end):
+                        page_ids.append(product_id)
+                    total += 1
+
+        found = dict(
+            self._select_in(
+                "SELECT id, result FROM products WHERE id IN (%s)", page_ids
+            )
+        )
+        results = {}
+        for product_id in page_ids:
+            result = from_json(found[product_id])
+            results[result["uuid"]] = result
+        return results, total
+
+    def invalidate(self):
+        """Forget the date ranges searched on the hub, keeping the products."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM coverage")
+
+
+def build_catalog(catalog_config, outputs_prefix):
+    """Create the catalog described by a plugin configuration.
+
+    :param catalog_config: ``catalog`` plugin configuration, either ``true`` or a
+                           dict with the optional ``path`` of the database and the
+                           ``ttl`` of the date ranges searched on the hub
+    :type catalog_config: bool or dict
+    :param outputs_prefix: The directory where the database is created by default
+    :type outputs_prefix: str
+    :return: The catalog, or None if no configuration is given
+    :rtype: :class:`SQLiteCatalog`
+    """
+    if not catalog_config:
+        return None
+    options = store_options(catalog_config)
+    return SQLiteCatalog(
+        store_path(options, outputs_prefix, DEFAULT_CATALOG_DB), ttl=options.get("ttl")
+    )
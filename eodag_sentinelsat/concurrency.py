@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+# eodag-sentinelsat, a plugin for searching and downloading products from Copernicus Scihub
+#     Copyright 2021, CS GROUP - France, https://www.csgroup.eu/
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""Adaptive limit of the number of products downloaded at the same time.
+
+The limit is increased by one transfer at a time while the aggregate throughput of
+the downloads improves, and halved as soon as the server throttles the downloads or
+answers with an error.
+"""
+
+import logging as py_logging
+import threading
+import time
+
+logger = py_logging.getLogger("eodag.plugins.apis.sentinelsat")
+
+DEFAULT_MIN_CONCURRENCY = 1
+DEFAULT_MAX_CONCURRENCY = 8
+# Seconds during which the throughput is measured before the limit is changed
+DEFAULT_CONCURRENCY_INTERVAL = 5
+# Relative throughput improvement expected from an additional transfer
+DEFAULT_CONCURRENCY_GAIN = 0.05
+
+# HTTP status codes of the responses throttling the downloads
+THROTTLING_STATUS_CODES = (429, 503)
+
+
+class _Unlimited(object):
+    """A context manager that does not limit anything."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+UNLIMITED = _Unlimited()
+
+
+class AdaptiveConcurrency(object):
+    """Limit of the number of concurrent transfers, adapted to their throughput.
+
+    Transfers hold a slot while they run, see :meth:`slot`, and report the bytes they
+    receive with :meth:`record`. Every ``interval`` seconds, if all the slots were
+    used during the measure and the throughput improved by more than ``gain`` since the last change of
+    the limit, the limit is increased. If the throughput dropped after an increase,
+    the limit is decreased back. :meth:`backoff` halves the limit, at most once per
+    ``interval`` so that the transfers failing together only halve it once.
+
+    :param initial: (optional) Initial limit (default: ``min_concurrency``)
+    :type initial: int
+    :param min_concurrency: (optional) Minimum limit
+    :type min_concurrency: int
+    :param max_concurrency: (optional) Maximum limit, the ceiling never exceeded
+    :type max_concurrency: int
+    :param interval: (optional) Seconds during which the throughput is measured
+    :type interval: float
+    :param gain: (optional) Relative throughput improvement expected from an
+                 additional transfer
+    :type gain: float
+    :param clock: (optional) Function giving the current time in seconds
+    :type clock: callable
+    """
+
+    def __init__(
+        self,
+        initial=None,
+        min_concurrency=DEFAULT_MIN_CONCURRENCY,
+        max_concurrency=DEFAULT_MAX_CONCURRENCY,
+        interval=DEFAULT_CONCURRENCY_INTERVAL,
+        gain=DEFAULT_CONCURRENCY_GAIN,
+        clock=time.monotonic,
+    ):
+        self.min_concurrency = max(1, min_concurrency)
+        self.max_concurrency = max(self.min_concurrency, max_concurrency)
+        self.limit = min(
+            max(initial or self.min_concurrency, self.min_concurrency),
+            self.max_concurrency,
+        )
+        self.interval = interval
+        self.gain = gain
+        self.active = 0
+        # Throughput of the last measure, in bytes per second
+        self.throughput = None
+        self._clock = clock
+        self._condition = threading.Condition()
+        self._reset_window()
+        # Throughput before the last increase of the limit
+        self._throughput_before_increase = None
+        self._last_backoff = None
+
+    def slot(self):
+        """Context manager holding a transfer slot, waiting for one to be free.
+
+        :return: A context manager
+        """
+        return _Slot(self)
+
+    def acquire(self):
+        """Wait for a transfer slot to be free, and hold it."""
+        with self._condition:
+            while self.active >= self.limit:
+                self._condition.wait()
+            self.active += 1
+            if self.active >= self.limit:
+                self._saturated = True
+
+    def release(self):
+        """Release a transfer slot."""
+        with self._condition:
+            self.active -= 1
+            self._condition.notify()
+
+    def record(self, nbytes):
+        """Record bytes received by a transfer, adapting the limit if a measure ended.
+
+        :param nbytes: Number of bytes received
+        :type nbytes: int
+        """
+        with self._condition:
+            self._window_bytes += nbytes
+            now = self._clock()
+            elapsed = now - self._window_start
+            if elapsed < self.interval:
+                return
+            throughput = self._window_bytes / elapsed
+            saturated = self._saturated
+            self.throughput = throughput
+            self._reset_window()
+            self._adapt(throughput, saturated)
+
+    def backoff(self, reason):
+        """Halve the limit, the server throttling the downloads or failing.
+
+        :param reason: Why the limit is decreased, logged
+        :type reason: str
+        """
+        with self._condition:
+            now = self._clock()
+            if (
+                self._last_backoff is not None
+                and now - self._last_backoff < self.interval
+            ):
+                return
+            self._last_backoff = now
+            limit = max(self.min_concurrency, self.limit // 2)
+            if limit != self.limit:
+                logger.warning(
+                    "Download concurrency decreased from %s to %s: %s",
+                    self.limit,
+                    limit,
+                    reason,
+                )
+                self.limit = limit
+            self._throughput_before_increase = None
+            self._reset_window()
+
+    def stats(self):
+        """The current limit, number of transfers and throughput.
+
+        :return: ``limit``, ``active`` and ``throughput`` (bytes per second, None
+                 before the first measure)
+        :rtype: dict
+        """
+        with self._condition:
+            return {
+                "limit": self.limit,
+                "active": self.active,
+                "throughput": self.throughput,
+            }
+
+    def _adapt(self, throughput, saturated):
+        previous = self._throughput_before_increase
+        if previous is not None and throughput < previous:
+            # The last increase did not help
+            self._set_limit(self.limit - 1, throughput)
+            self._throughput_before_increase = None
+        elif saturated and self.limit < self.max_concurrency:
+            if previous is None or throughput > previous * (1 + self.gain):
+                self._throughput_before_increase = throughput
+                self._set_limit(self.limit + 1, throughput)
+        else:
+            logger.debug(
+                "Download concurrency: %s, throughput: %.1f MB/s",
+                self.limit,
+                throughput / 1e6,
+            )
+
+    def _set_limit(self, limit, throughput):
+        limit = min(max(limit, self.min_concurrency), self.max_concurrency)
+        if limit == self.limit:
+            return
+        logger.info(
+            "Download concurrency changed from %s to %s (throughput: %.1f MB/s)",
+            self.limit,
+            limit,
+            throughput / 1e6,
+        )
+        self.limit = limit
+        self._condition.notify_all()
+
+    def _reset_window(self):
+        self._window_start = self._clock()
+        self._window_bytes = 0
+        # Whether all the slots were used during the measure
+        self._saturated = self.active >= self.limit
+
+
+class _Slot(object):
+    def __init__(self, concurrency):
+        self._concurrency = concurrency
+
+    def __enter__(self):
+        self._concurrency.acquire()
+        return self
+
+    def __exit__(self, *args):
+        self._concurrency.release()
+        return False
+
+
+def build_adaptive_concurrency(concurrency_config):
+    """Create the adaptive concurrency limit described by a plugin configuration.
+
+    :param concurrency_config: ``adaptive_concurrency`` plugin configuration, either
+                               ``true`` or a dict with the optional ``initial``,
+                               ``min``, ``max``, ``interval`` and ``gain`` settings
+    :type concurrency_config: bool or dict
+    :return: The concurrency limit, or None if the concurrency is fixed
+    :rtype: :class:`AdaptiveConcurrency`
+    """
+    if not concurrency_config:
+        return None
+    if concurrency_config is True:
+        concurrency_config = {}
+    return AdaptiveConcurrency(
+        initial=concurrency_config.get("initial"),
+        min_concurrency=concurrency_config.get("min", DEFAULT_MIN_CONCURRENCY),
+        max_concurrency=concurrency_config.get("max", DEFAULT_MAX_CONCURRENCY),
+        interval=concurrency_config.get("interval", DEFAULT_CONCURRENCY_INTERVAL),
+        gain=concurrency_config.get("gain", DEFAULT_CONCURRENCY_GAIN),
+    )
@@ -17,12 +17,28 @@
 """Sentinelsat plugin to EODAG."""
 
 import ast
+import asyncio
+import functools
+import hashlib
+import itertools
 import logging as py_logging
+import os
 import shutil
-import types
-from datetime import date, datetime
+import threading
+import time
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from contextlib import closing
+from datetime import timedelta
+from pathlib import Path
+from urllib.parse import urlencode
 
+import requests
 from dateutil.parser import isoparse
+from eodag.api.product import EOProduct
+from eodag.api.product.metadata_mapping import (
+    format_metadata,
+    properties_from_json,
+)
 from eodag.api.search_result import SearchResult
 from eodag.plugins.apis.base import Api
 from eodag.plugins.download.base import (
@@ -35,15 +51,134 @@ from eodag.utils import ProgressCallback
 from eodag.utils import logging as eodag_logging
 from eodag.utils import path_to_uri
 from eodag.utils.exceptions import (
+    DownloadError,
     MisconfiguredError,
     NotAvailableError,
     RequestError,
 )
 from eodag.utils.notebook import NotebookWidgets
-from sentinelsat import SentinelAPI, ServerError
+from requests.adapters import HTTPAdapter
+from sentinelsat import (
+    SentinelAPI,
+    SentinelAPIError,
+    ServerError,
+    UnauthorizedError,
+)
+from sentinelsat.download import Downloader, DownloadStatus
+from sentinelsat.exceptions import (
+    InvalidChecksumError,
+    InvalidKeyError,
+    LTAError,
+    LTATriggered,
+)
+from sentinelsat.sentinel import _format_order_by, _parse_opensearch_response
+from shapely import geometry, wkt
+from shapely.geometry.base import BaseGeometry
+
+from eodag_sentinelsat.cache import build_query_cache, make_cache_key
+from eodag_sentinelsat.catalog import (
+    CATALOG_SOURCES,
+    CatalogQuery,
+    build_catalog,
+)
+from eodag_sentinelsat.concurrency import (
+    THROTTLING_STATUS_CODES,
+    UNLIMITED,
+    build_adaptive_concurrency,
+)
+from eodag_sentinelsat.footprint import build_footprint_simplifier
+from eodag_sentinelsat.harvest import build_harvest_watermarks
+from eodag_sentinelsat.journal import (
+    DOWNLOADING,
+    EXTRACTED,
+    MOVED,
+    QUEUED,
+    VERIFIED,
+    build_download_journal,
+    remove_partial_extraction,
+)
+from eodag_sentinelsat.lta import build_lta_scheduler
+from eodag_sentinelsat.metadata import MetadataExtractor, format_temporal
+from eodag_sentinelsat.metrics import NULL_PHASE, build_metrics
+from eodag_sentinelsat.mirrors import (
+    DEFAULT_MIRROR_COOLDOWN,
+    MIRROR_ERRORS,
+    MirrorPool,
+)
+from eodag_sentinelsat.records import (
+    build_download_records,
+    prepare_recorded_download,
+    record_downloads,
+    record_key,
+)
+from eodag_sentinelsat.store import StoresByDirectory
+from eodag_sentinelsat.streaming import StreamExtractError, ZipStreamExtractor
 
 logger = py_logging.getLogger("eodag.plugins.apis.sentinelsat")
 
+# Number of product ids sent in a single OData ``$filter`` request when resolving
+# the storage status of a page of results. Kept small to stay far from URL length limits.
+DEFAULT_STORAGE_STATUS_CHUNK_SIZE = 20
+# Maximum number of concurrent ``is_online`` requests, only used as a fallback
+DEFAULT_STORAGE_STATUS_WORKERS = 4
+# Length in days of the date ranges of split queries
+DEFAULT_SPLIT_PERIOD = 30
+# Maximum number of sub-queries run at the same time by split queries
+DEFAULT_SPLIT_WORKERS = 4
+# Number of products extracted at the same time once downloaded
+DEFAULT_EXTRACT_WORKERS = 4
+# Number of connections kept alive by the HTTP session of a sentinelsat API
+DEFAULT_HTTP_POOL_SIZE = 16
+# Number of threads running the blocking calls of the asynchronous API
+DEFAULT_ASYNC_WORKERS = 8
+
+# Values substituted to the fields of the pagination template when it is compiled
+_PAGINATION_FIELDS_SENTINELS = {
+    "items_per_page": 7310000001,
+    "page": 7310000002,
+    "skip": 7310000003,
+}
+
+# Rate limiters of the requests sent by split queries, shared by endpoint
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+# sentinelsat APIs and their HTTP sessions, shared by endpoint and credentials
+_api_pool = {}
+_api_pool_lock = threading.Lock()
+
+
+def _get_sentinel_api(endpoint, username, password, pool_size=DEFAULT_HTTP_POOL_SIZE):
+    """Get the sentinelsat API shared by the plugins using an endpoint and credentials.
+
+    Its HTTP session keeps alive up to ``pool_size`` connections, reused by all the
+    searches and downloads. The API must not hold the state of a single search or
+    download, as it may be used from several threads at the same time.
+
+    :param endpoint: The API endpoint
+    :type endpoint: str
+    :param username: The user name
+    :type username: str
+    :param password: The user password
+    :type password: str
+    :param pool_size: (optional) Maximum number of connections kept alive
+    :type pool_size: int
+    :return: The shared API
+    :rtype: :class:`~sentinelsat.SentinelAPI`
+    """
+    key = (endpoint, username, password)
+    with _api_pool_lock:
+        api = _api_pool.get(key)
+        if api is None:
+            api = SentinelAPI(username, password, endpoint)
+            # Use eodag progress bar which can be globally disabled
+            api._tqdm = ProgressCallback
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            api.session.mount("https://", adapter)
+            api.session.mount("http://", adapter)
+            _api_pool[key] = api
+        return api
+
 
 class _ProductManager(object):
     """Manage product status before and after downloading it.
@@ -58,8 +193,762 @@ class _ProductManager(object):
         self.product = product  #  EOProduct
         self.fs_path = None  #  str
         self.record_filename = None  # str
+        self.record_key = None  # str, with an indexed download records store
         self.to_download = None  # bool
         self.downloaded_by_sentinelsat = None  # bool
+        self.finalize_future = None  # Future of the product extraction
+        self.checksum = None  # str, computed while the product was downloaded
+
+
+class _ProductDownloader(Downloader):
+    """sentinelsat downloader calling ``on_downloaded`` as soon as a product is downloaded.
+
+    A downloader is created by ``SentinelsatAPI.download_all`` call, holding the settings
+    of this call. ``on_downloaded`` is called with the product information returned by
+    ``Downloader.download``.
+
+    If ``stream_extract`` is True, zip archives are extracted while they are downloaded
+    instead of being written to disk, and the product information ``path`` is the
+    directory where they are extracted.
+
+    Products whose uuid is in ``target_paths`` are downloaded to the given path instead
+    of sentinelsat's one, their temporary file being on the same filesystem.
+
+    If a ``journal`` is given, the download stages reached by the products are
+    journaled in it.
+
+    If a ``concurrency`` limit is given, each transfer holds one of its slots instead
+    of the API download semaphore, and reports its throughput and failures to it.
+
+    Checksums are computed while the products are downloaded, and set as the
+    ``checksum`` product information (see :func:`_format_checksum`).
+
+    If ``metrics`` are given, the transfer of each product is timed and counted.
+
+    If a pool of ``mirrors`` is given, each product is transferred from the mirror
+    with the fewest transfers in progress among the ones holding it online, ``api``
+    being the API of this mirror during the transfer. Outside of the transfers,
+    ``api`` sends the product information requests and the LTA retrievals to the
+    first healthy mirror.
+
+    ``download``, ``_download_common`` and ``_download`` replace the ones of sentinelsat
+    1.2, relying on its internals: sentinelsat is pinned to this minor version and
+    ``test_sentinelsat_internals`` fails when the overridden code changes.
+    """
+
+    on_downloaded = None
+    stream_extract = False
+    target_paths = None
+    journal = None
+    concurrency = None
+    metrics = None
+    mirrors = None
+
+    def __init__(self, *args, **kwargs):
+        # API of the mirror transferring a product, by thread
+        self._mirror_local = threading.local()
+        super().__init__(*args, **kwargs)
+
+    @property
+    def api(self):
+        """The API of the mirror transferring a product in this thread, or the main one."""
+        api = getattr(self._mirror_local, "api", None)
+        if api is not None:
+            return api
+        if self.mirrors is not None:
+            return self.mirrors.api
+        return self._api
+
+    @api.setter
+    def api(self, api):
+        self._api = api
+
+    def download(self, id, directory=".", *, stop_event=None):
+        target_path = self.target_paths.get(id) if self.target_paths else None
+        phase = NULL_PHASE if self.metrics is None else self.metrics.phase("download")
+        with phase:
+            if target_path is None or self.node_filter:
+                product_info = super().download(id, directory, stop_event=stop_event)
+            else:
+                product_info = self._download_to(id, directory, target_path, stop_event)
+            downloaded_bytes = product_info.get("downloaded_bytes", 0)
+            phase.set(uuid=id, bytes=downloaded_bytes)
+        if self.metrics is not None:
+            self.metrics.add("downloaded_bytes", downloaded_bytes)
+            self.metrics.add("downloaded_products")
+        if self.on_downloaded is not None:
+            self.on_downloaded(product_info)
+        return product_info
+
+    def _download_to(self, id, directory, target_path, stop_event):
+        """Same as ``Downloader.download``, but to the given path."""
+        product_info = self.api.get_product_odata(id)
+        path = Path(target_path)
+        product_info["path"] = str(path)
+        product_info["downloaded_bytes"] = 0
+
+        if path.exists():
+            # We assume that the product has been downloaded and is complete
+            return product_info
+
+        # An incomplete download triggers the retrieval from the LTA if the product is not online
+        if not self.api.is_online(id):
+            self.trigger_offline_retrieval(id)
+            raise LTATriggered(id)
+
+        self._download_common(product_info, path, stop_event)
+        default_path = Path(directory) / self.api._get_filename(product_info)
+        if default_path.absolute() != path.absolute():
+            logger.debug(
+                "%s downloaded to EODAG's path instead of %s, %s bytes not moved",
+                product_info["path"],
+                default_path,
+                product_info["size"],
+            )
+        return product_info
+
+    def _download_common(self, product_info, path, stop_event):
+        if self.mirrors is None:
+            return self._download_journaled(product_info, path, stop_event)
+        uuid = product_info["id"]
+        mirror = self.mirrors.acquire_download(
+            functools.partial(self._mirror_has_product, uuid)
+        )
+        self.mirrors.api.forget_online(uuid)
+        product_info["url"] = "%sodata/v1/Products('%s')/$value" % (
+            mirror.api.api_url,
+            uuid,
+        )
+        self._mirror_local.api = mirror.api
+        try:
+            self._download_journaled(product_info, path, stop_event)
+        except BaseException as ex:
+            self.mirrors.release_download(mirror, ex)
+            raise
+        finally:
+            self._mirror_local.api = None
+        self.mirrors.release_download(mirror)
+        return product_info
+
+    def _mirror_has_product(self, uuid, api):
+        """Whether a product can be downloaded from a mirror, being online there."""
+        if self.mirrors.api.found_online(uuid, api):
+            # Already checked before the download
+            return True
+        try:
+            return api.get_product_odata(uuid)["Online"]
+        except InvalidKeyError:
+            return False
+
+    def trigger_offline_retrieval(self, uuid):
+        if self.mirrors is None or getattr(self._mirror_local, "api", None) is not None:
+            return super().trigger_offline_retrieval(uuid)
+        return self.mirrors.api.trigger_offline_retrieval(uuid)
+
+    def _download_journaled(self, product_info, path, stop_event):
+        temp_path = path.with_name(path.name + ".incomplete")
+        if self.journal is not None:
+            self._journal_download(product_info["id"], path, temp_path)
+        try:
+            if not self.stream_extract or path.suffix != ".zip":
+                self._download_archive(product_info, path, stop_event)
+            else:
+                self._download_stream_extract(product_info, path, stop_event)
+        except BaseException:
+            if self.journal is not None:
+                self._journal_download(product_info["id"], path, temp_path)
+            raise
+        if self.journal is not None:
+            self.journal.set(product_info["id"], VERIFIED, product_info["path"])
+        return product_info
+
+    def _journal_download(self, uuid, path, temp_path):
+        """Journal a product being downloaded, with the size of its incomplete file."""
+        downloaded_bytes = temp_path.stat().st_size if temp_path.exists() else 0
+        self.journal.set(uuid, DOWNLOADING, str(path), downloaded_bytes)
+
+    def _download_stream_extract(self, product_info, path, stop_event):
+        try:
+            return self._download_extract(product_info, path, stop_event)
+        except StreamExtractError as ex:
+            self.logger.warning(
+                "%s could not be extracted while downloaded (%s), downloading the archive",
+                path.name,
+                ex,
+            )
+            product_info["path"] = str(path)
+            return self._download_archive(product_info, path, stop_event)
+
+    def _download_archive(self, product_info, path, stop_event):
+        """Same as ``Downloader._download_common``, but the checksum is computed while
+        the archive is downloaded instead of by reading the whole file again."""
+        temp_path = path.with_name(path.name + ".incomplete")
+        checksum = algo = None
+        if self.verify_checksum is True:
+            checksum, algo = _checksum_algo(product_info)
+
+        skip_download = False
+        if temp_path.exists():
+            size = temp_path.stat().st_size
+            if size > product_info["size"]:
+                self.logger.warning(
+                    "Existing incomplete file %s is larger than the expected final size"
+                    " (%s vs %s bytes). Deleting it.",
+                    temp_path,
+                    size,
+                    product_info["size"],
+                )
+                temp_path.unlink()
+            elif size == product_info["size"]:
+                # Downloaded before an interruption, only hashed
+                if algo is not None:
+                    _hash_file(temp_path, algo)
+                if algo is None or algo.hexdigest().lower() == checksum.lower():
+                    skip_download = True
+                else:
+                    self.logger.warning(
+                        "Existing incomplete file %s appears to be fully downloaded but "
+                        "its checksum is incorrect. Deleting it.",
+                        temp_path,
+                    )
+                    temp_path.unlink()
+                    checksum, algo = _checksum_algo(product_info)
+        if not skip_download:
+            temp_path.parent.mkdir(parents=True, exist_ok=True)
+            product_info["downloaded_bytes"] = self._download(
+                product_info["url"],
+                temp_path,
+                product_info["size"],
+                path.name,
+                stop_event,
+                algo=algo,
+            )
+        if algo is not None:
+            if algo.hexdigest().lower() != checksum.lower():
+                temp_path.unlink()
+                raise InvalidChecksumError("File corrupt: checksums do not match")
+            product_info["checksum"] = _format_checksum(algo)
+        shutil.move(str(temp_path), str(path))
+        return product_info
+
+    def _download(self, url, path, file_size, title, stop_event, algo=None):
+        """Same as ``Downloader._download``, but the incomplete file is downloaded again
+        from its start if the server ignores the range request resuming its download.
+
+        If a hash object is given, it is updated with the whole file content: the
+        bytes already downloaded are read once, the others are hashed as received.
+
+        :raises: :class:`~requests.exceptions.ChunkedEncodingError` if the transfer
+                 ends before ``file_size`` bytes, the incomplete file being kept
+        """
+        headers = {}
+        continuing = path.exists()
+        if continuing:
+            already_downloaded_bytes = path.stat().st_size
+            headers = {"Range": "bytes={}-".format(already_downloaded_bytes)}
+        else:
+            already_downloaded_bytes = 0
+        with self._transfer_slot():
+            return self._download_transfer(
+                url,
+                path,
+                file_size,
+                title,
+                stop_event,
+                headers,
+                continuing,
+                already_downloaded_bytes,
+                algo,
+            )
+
+    def _download_transfer(
+        self,
+        url,
+        path,
+        file_size,
+        title,
+        stop_event,
+        headers,
+        continuing,
+        already_downloaded_bytes,
+        algo,
+    ):
+        downloaded_bytes = 0
+        with self._request_limit():
+            r = self.api.session.get(url, stream=True, headers=headers)
+        if continuing and r.status_code == 200:
+            self.logger.info(
+                "Range requests not supported, %s downloaded again from its start",
+                title,
+            )
+            continuing = False
+            already_downloaded_bytes = 0
+        elif continuing:
+            self.logger.info(
+                "%s download resumed from byte %s", title, already_downloaded_bytes
+            )
+            if algo is not None:
+                _hash_file(path, algo)
+        with self._tqdm(
+            desc="Downloading %s" % title,
+            total=file_size,
+            unit="B",
+            unit_scale=True,
+            initial=already_downloaded_bytes,
+        ) as progress, closing(r):
+            self.api._check_scihub_response(r, test_json=False)
+            mode = "ab" if continuing else "wb"
+            with open(path, mode) as f:
+                iterator = r.iter_content(chunk_size=self.chunk_size)
+                while True:
+                    if stop_event and stop_event.is_set():
+                        raise CancelledError()
+                    try:
+                        with self._request_limit():
+                            chunk = next(iterator)
+                    except StopIteration:
+                        break
+                    if chunk:  # filter out keep-alive new chunks
+                        f.write(chunk)
+                        if algo is not None:
+                            algo.update(chunk)
+                        progress.update(len(chunk))
+                        downloaded_bytes += len(chunk)
+                        self._record_transfer(len(chunk))
+        if already_downloaded_bytes + downloaded_bytes < file_size:
+            # The connection was closed before the end of the body: the incomplete
+            # file is kept to resume its download when retried
+            raise requests.exceptions.ChunkedEncodingError(
+                "{} download ended after {} of {} bytes".format(
+                    title, already_downloaded_bytes + downloaded_bytes, file_size
+                )
+            )
+        # Return the number of bytes downloaded
+        return downloaded_bytes
+
+    def _download_extract(self, product_info, path, stop_event):
+        """Download a zip archive and extract it on the fly, next to its path.
+
+        The archive is extracted in a temporary directory renamed once the whole
+        stream has been checked, and is never written to disk.
+        """
+        extract_path = path.with_suffix("")
+        product_info["path"] = str(extract_path)
+        if extract_path.exists():
+            # Like sentinelsat, assume that the product has been downloaded and is complete
+            return product_info
+        temp_path = extract_path.with_name(extract_path.name + ".incomplete")
+        if temp_path.exists():
+            shutil.rmtree(temp_path)
+
+        checksum = algo = None
+        if self.verify_checksum is True:
+            checksum, algo = _checksum_algo(product_info)
+
+        extractor = ZipStreamExtractor(temp_path)
+        try:
+            with self._transfer_slot():
+                downloaded_bytes = self._download_extract_transfer(
+                    product_info, path, stop_event, extractor, algo
+                )
+            extractor.close()
+            if checksum is not None and algo.hexdigest().lower() != checksum.lower():
+                raise InvalidChecksumError("File corrupt: checksums do not match")
+        except BaseException:
+            extractor.close_file()
+            shutil.rmtree(temp_path, ignore_errors=True)
+            raise
+        if algo is not None:
+            product_info["checksum"] = _format_checksum(algo)
+        os.replace(temp_path, extract_path)
+        product_info["downloaded_bytes"] = downloaded_bytes
+        return product_info
+
+    def _download_extract_transfer(
+        self, product_info, path, stop_event, extractor, algo
+    ):
+        downloaded_bytes = 0
+        with self._request_limit():
+            r = self.api.session.get(product_info["url"], stream=True)
+        with self._tqdm(
+            desc="Downloading and extracting %s" % path.name,
+            total=product_info["size"],
+            unit="B",
+            unit_scale=True,
+        ) as progress, closing(r):
+            self.api._check_scihub_response(r, test_json=False)
+            iterator = r.iter_content(chunk_size=self.chunk_size)
+            while True:
+                if stop_event and stop_event.is_set():
+                    raise CancelledError()
+                try:
+                    with self._request_limit():
+                        chunk = next(iterator)
+                except StopIteration:
+                    break
+                if chunk:  # filter out keep-alive new chunks
+                    if algo is not None:
+                        algo.update(chunk)
+                    extractor.feed(chunk)
+                    progress.update(len(chunk))
+                    downloaded_bytes += len(chunk)
+                    self._record_transfer(len(chunk))
+        return downloaded_bytes
+
+    def _transfer_slot(self):
+        """Context manager holding a slot of the concurrency limit during a transfer.
+
+        The limit is decreased if the transfer is throttled or fails.
+        """
+        if self.concurrency is None:
+            return UNLIMITED
+        return _TransferSlot(self.concurrency)
+
+    def _request_limit(self):
+        """The API download semaphore, unless the concurrency limit replaces it."""
+        if self.concurrency is None:
+            return self.api.dl_limit_semaphore
+        return UNLIMITED
+
+    def _record_transfer(self, nbytes):
+        if self.concurrency is not None:
+            self.concurrency.record(nbytes)
+
+
+def _copy_results(results):
+    """Copy sentinelsat results without their ``storage_status``, for the query cache.
+
+    The results stored in the cache and the ones returned by each cache hit are
+    copies, whose ``storage_status`` is resolved again for each search: it is not
+    shared between threads nor kept while it may change.
+    """
+    return {
+        uuid: {k: v for k, v in res.items() if k != "storage_status"}
+        for uuid, res in results.items()
+    }
+
+
+def _checksum_algo(product_info):
+    """The checksum of a product and the hash object to compute it, as sentinelsat.
+
+    :raises: :class:`~sentinelsat.exceptions.InvalidChecksumError` if the product
+             information has no checksum
+    """
+    if "sha3-256" in product_info:
+        return product_info["sha3-256"], hashlib.sha3_256()
+    elif "md5" in product_info:
+        return product_info["md5"], hashlib.md5()
+    raise InvalidChecksumError("No checksum information found in product information.")
+
+
+def _format_checksum(algo):
+    """Checksum of a hash object, as ``<algorithm>:<hex digest>`` (``md5:...`` or
+    ``sha3_256:...``), the form kept in the download records."""
+    return "%s:%s" % (algo.name, algo.hexdigest().lower())
+
+
+def _hash_file(path, algo, block_size=2**20):
+    """Update a hash object with the content of a file."""
+    with open(str(path), "rb") as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            algo.update(block)
+
+
+class _TransferSlot(object):
+    """Slot of an adaptive concurrency limit, decreasing the limit on failures.
+
+    HTTP errors, throttling ones (429 and 503) first, and network errors mean that
+    the server or the link is overloaded. Cancellations and corrupted downloads do
+    not.
+    """
+
+    def __init__(self, concurrency):
+        self._slot = concurrency.slot()
+        self._concurrency = concurrency
+
+    def __enter__(self):
+        self._slot.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._slot.__exit__(exc_type, exc_value, traceback)
+        if isinstance(exc_value, (SentinelAPIError, requests.RequestException)):
+            response = getattr(exc_value, "response", None)
+            status_code = getattr(response, "status_code", None)
+            if status_code in THROTTLING_STATUS_CODES:
+                self._concurrency.backoff("throttled (HTTP %s)" % status_code)
+            else:
+                self._concurrency.backoff(str(exc_value) or type(exc_value).__name__)
+        return False
+
+
+class _QueryPlan(object):
+    """Query parameters of a product type that only depend on the plugin configuration.
+
+    A simple class whose instance attributes are computed once per product type by
+    ``SentinelsatAPI._get_query_plan``, and then bound to the dynamic search
+    criteria of each search by ``SentinelsatAPI._update_keyword``.
+    """
+
+    def __init__(self, provider_product_type, default_params, queryables):
+        self.provider_product_type = provider_product_type  # str
+        self.default_params = default_params  # dict
+        # eodag search key -> (provider search key, value template or None),
+        # None if the configuration needs the generic QueryStringSearch.build_query_string
+        self.queryables = queryables  # dict or None
+
+
+class _StorageStatusResolver(object):
+    """Resolve on demand the storage status of all the products of a search result page.
+
+    The status of every product of the page is fetched in batch the first time one of
+    them is read, and then memoized in their properties.
+    """
+
+    def __init__(self, plugin):
+        self.plugin = plugin  # SentinelsatAPI
+        self.properties = []  # list of _LazyStorageStatusProperties
+        self.lock = threading.Lock()
+
+    def resolve(self):
+        """Fetch and set the storage status of all the products handled, once."""
+        with self.lock:
+            if not self.properties:
+                return
+            results = {props["uuid"]: {} for props in self.properties}
+            logger.debug("Resolving storage status of %s products", len(results))
+            self.plugin._resolve_storage_status(results)
+            mapping = {
+                "storageStatus": self.plugin.config.metadata_mapping["storageStatus"]
+            }
+            for props in self.properties:
+                dict.update(
+                    props, properties_from_json(results[props["uuid"]], mapping)
+                )
+                props._resolver = None
+            # Release the references to the products, they do not need it anymore
+            self.properties = []
+
+
+class _LazyStorageStatusProperties(dict):
+    """Product properties whose ``storageStatus`` is only resolved when it is read."""
+
+    def __init__(self, properties, resolver):
+        super().__init__(properties)
+        self._resolver = resolver  # _StorageStatusResolver
+        resolver.properties.append(self)
+
+    def _resolve(self):
+        resolver = self._resolver
+        if resolver is not None:
+            resolver.resolve()
+
+    def __getitem__(self, key):
+        if key == "storageStatus":
+            self._resolve()
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        if key == "storageStatus":
+            self._resolve()
+        return super().get(key, default)
+
+    def __contains__(self, key):
+        if key == "storageStatus" and self._resolver is not None:
+            return True
+        return super().__contains__(key)
+
+    def __iter__(self):
+        self._resolve()
+        return super().__iter__()
+
+    def keys(self):
+        self._resolve()
+        return super().keys()
+
+    def values(self):
+        self._resolve()
+        return super().values()
+
+    def items(self):
+        self._resolve()
+        return super().items()
+
+    def copy(self):
+        self._resolve()
+        return dict(super().items())
+
+    def __repr__(self):
+        self._resolve()
+        return super().__repr__()
+
+    def __reduce__(self):
+        # Serialize as a plain dict, without the resolver and its plugin
+        return dict, (self.copy(),)
+
+
+def _compile_pagination_template(template):
+    """Compile the ``next_page_query_obj`` pagination template.
+
+    The template is parsed once, with sentinel values in place of its fields, and the
+    returned function then only substitutes the actual values in the parsed structure.
+
+    :param template: Python literal template, with ``items_per_page``, ``page`` and
+                     ``skip`` fields, e.g. ``{{"limit":{items_per_page},"offset":{skip}}}``
+    :type template: str
+    :return: A function building the pagination parameters from ``items_per_page``
+             and ``page``
+    :rtype: callable
+    :raises: :class:`~eodag.utils.exceptions.MisconfiguredError`
+    """
+    try:
+        parsed = ast.literal_eval(template.format(**_PAGINATION_FIELDS_SENTINELS))
+    except (KeyError, IndexError, ValueError, SyntaxError) as ex:
+        raise MisconfiguredError(
+            "Invalid pagination next_page_query_obj %r: %s" % (template, ex)
+        ) from ex
+    if not isinstance(parsed, dict):
+        raise MisconfiguredError(
+            "Invalid pagination next_page_query_obj %r: not a dict" % template
+        )
+    sentinels = {
+        sentinel: field for field, sentinel in _PAGINATION_FIELDS_SENTINELS.items()
+    }
+    str_sentinels = {str(sentinel): field for sentinel, field in sentinels.items()}
+
+    def substitute(value, values):
+        if isinstance(value, int) and value in sentinels:
+            return values[sentinels[value]]
+        if isinstance(value, str):
+            for str_sentinel, field in str_sentinels.items():
+                value = value.replace(str_sentinel, str(values[field]))
+            return value
+        if isinstance(value, (list, tuple)):
+            return type(value)(substitute(v, values) for v in value)
+        if isinstance(value, dict):
+            return {k: substitute(v, values) for k, v in value.items()}
+        return value
+
+    def pagination_params(items_per_page, page):
+        values = {
+            "items_per_page": items_per_page,
+            "page": page,
+            "skip": items_per_page * (page - 1),
+        }
+        return substitute(parsed, values)
+
+    return pagination_params
+
+
+class _RateLimiter(object):
+    """Limit the rate of the requests sent to an endpoint, across threads."""
+
+    def __init__(self, max_per_second):
+        self.interval = 1.0 / max_per_second  # float
+        self.next_time = 0.0  # float
+        self.lock = threading.Lock()
+
+    def wait(self):
+        """Wait until a new request can be sent."""
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+def _get_rate_limiter(endpoint, max_per_second):
+    """Get the rate limiter shared by the plugins using the same endpoint."""
+    if not max_per_second:
+        return None
+    with _rate_limiters_lock:
+        rate_limiter = _rate_limiters.get(endpoint)
+        if rate_limiter is None or rate_limiter.interval != 1.0 / max_per_second:
+            rate_limiter = _rate_limiters[endpoint] = _RateLimiter(max_per_second)
+        return rate_limiter
+
+
+class _PagedSearch(object):
+    """Mirrors a paged search is sent to, one after the other.
+
+    The search is pinned to a mirror, the one it is already pinned to if it is still
+    healthy, or the fastest healthy one, so that its pages are consistent. If the
+    mirror fails, the search is sent again to the next one, :meth:`unseen` skipping
+    the products already returned.
+
+    :param pool: The mirrors, None if no mirror is configured
+    :type pool: :class:`~eodag_sentinelsat.mirrors.MirrorPool`
+    :param key: (optional) The search key, to find the mirror it is pinned to and
+                pin it again with :meth:`pin`
+    :type key: str
+    """
+
+    #: Errors of the pinned mirror, the search being sent to the next one
+    errors = (RequestError,) + MIRROR_ERRORS
+
+    def __init__(self, pool, key=None):
+        self.pool = pool
+        self.key = key
+        if pool is None:
+            self.mirrors = [None]
+        else:
+            pinned = None if key is None else pool.pinned(key)
+            self.mirrors = [m for m in pool.ranked() if m is not pinned]
+            if pinned is not None:
+                self.mirrors.insert(0, pinned)
+        # The uuids of the products already returned, if the search can be sent again
+        self._returned = set() if len(self.mirrors) > 1 else None
+
+    def __iter__(self):
+        return iter(self.mirrors)
+
+    def unseen(self, eo_products):
+        """Skip the products already returned, before the search was sent again.
+
+        :param eo_products: The EO products of a page
+        :type eo_products: list
+        :return: The EO products not returned yet
+        :rtype: list
+        """
+        if self._returned is None:
+            return eo_products
+        eo_products = [
+            p for p in eo_products if p.properties["uuid"] not in self._returned
+        ]
+        self._returned.update(p.properties["uuid"] for p in eo_products)
+        return eo_products
+
+    def failed(self, mirror, error):
+        """Record that the search failed on a mirror, to send it to the next one.
+
+        :param mirror: The mirror
+        :type mirror: :class:`~eodag_sentinelsat.mirrors.Mirror`
+        :param error: The error of the mirror
+        :type error: Exception
+        :raises: The error, if the mirror was the last one
+        """
+        i = self.mirrors.index(mirror)
+        if i == len(self.mirrors) - 1:
+            raise error
+        logger.warning(
+            "Search failed on mirror %s, sending it again to %s: %s",
+            mirror.endpoint,
+            self.mirrors[i + 1].endpoint,
+            error,
+        )
+
+    def pin(self, mirror):
+        """Pin the search to the mirror that answered it.
+
+        :param mirror: The mirror
+        :type mirror: :class:`~eodag_sentinelsat.mirrors.Mirror`
+        """
+        if self.pool is not None and self.key is not None:
+            self.pool.pin(self.key, mirror)
 
 
 class SentinelsatAPI(Api, QueryStringSearch, Download):
@@ -81,11 +970,49 @@ class SentinelsatAPI(Api, QueryStringSearch, Download):
         """Init Sentinelsat plugin."""
         super().__init__(provider, config)
         self.api = None
+        # Opt-in search results cache, see eodag_sentinelsat.cache
+        self.query_cache = build_query_cache(getattr(self.config, "query_cache", None))
+        # Opt-in simplification of the long search geometries, see
+        # eodag_sentinelsat.footprint
+        self.footprint_simplifier = build_footprint_simplifier(
+            getattr(self.config, "footprint_simplification", None)
+        )
+        # Compiled query plans, by product type
+        self._query_plans = {}
+        # Pagination template and its compiled version, see _get_pagination_params
+        self._pagination_params = None
+        # Indexed download records stores and download journals, by outputs_prefix
+        self._download_records = StoresByDirectory(build_download_records)
+        self._download_journals = StoresByDirectory(build_download_journal)
+        # Threads running the blocking calls of the asynchronous API, see _run_blocking
+        self._async_executor = None
+        self._async_executor_lock = threading.Lock()
+        # Scheduler of the LTA orders, see get_lta_scheduler
+        self._lta_scheduler = None
+        self._lta_scheduler_lock = threading.Lock()
+        # Adaptive limit shared by the downloads, see get_download_concurrency
+        self._download_concurrency = None
+        self._download_concurrency_lock = threading.Lock()
+        # Opt-in timers and counters of the phases, see eodag_sentinelsat.metrics
+        self.metrics = build_metrics(
+            getattr(self.config, "metrics", None), self.provider
+        )
+        # Local catalog of the products found, see get_catalog
+        self._catalog = None
+        self._catalog_lock = threading.Lock()
+        # Watermarks of the incremental harvests, see harvest
+        self._harvest_watermarks = None
+        self._harvest_watermarks_lock = threading.Lock()
+        # Pool of the mirrors of the endpoint, created with the API, see _init_api
+        self.mirrors = None
 
     def query(self, items_per_page=None, page=None, count=True, **kwargs):
         """
         Query for products.
 
+        If mirrors are configured, the pages of a search are requested from the same
+        mirror while it is healthy, so that they are consistent.
+
         :param page: The page number to retur (default: 1)
         :type page: int
         :param items_per_page: The number of results that must appear in one single
@@ -93,12 +1020,28 @@ class SentinelsatAPI(Api, QueryStringSearch, Download):
         :type items_per_page: int
         :param count:  To trigger a count request (default: True)
         :type count: bool
-        :param kwargs: (dict) Metadata
+        :param kwargs: (dict) Metadata. ``lazy_storage_status`` (bool) can also be given
+                       here to override the ``lazy_storage_status`` plugin configuration:
+                       if True, the products ``storageStatus`` is only requested the first
+                       time it is read, for all the products of the page at once.
+                       If a ``query_cache`` is configured, ``use_cache=False`` bypasses it
+                       and ``invalidate_cache=True`` drops the cached results of this query
+                       before sending it again.
+                       If a ``catalog`` is configured, ``source`` tells where the products
+                       are searched: ``remote`` (the hub, the products found being added
+                       to the catalog), ``local`` (the catalog only) or ``hybrid`` (the
+                       catalog, once the date ranges it does not cover yet have been
+                       searched on the hub). Defaults to the ``source`` of the ``catalog``
+                       plugin configuration, or ``remote``.
+                       If ``footprint_simplification`` is configured, long search
+                       geometries are replaced by simpler ones covering them, the
+                       products being filtered on the original geometry: the total
+                       count is then the one of the simpler geometry.
         :return: A collection of EO products matching the criteria and the total count of products
                  available
         :rtype: tuple(:class:`~eodag.api.search_result.SearchResult`, int or None)
         """
-        eo_products = []
+        query_options = self._pop_query_options(kwargs)
 
         # Init Sentinelsat API (connect...)
         self._init_api()
@@ -106,79 +1049,1019 @@ class SentinelsatAPI(Api, QueryStringSearch, Download):
         # Modify the query parameters to be compatible with Sentinelsat query
         query_params, provider_product_type = self._update_keyword(**kwargs)
 
+        # The pages of a search are requested from the same mirror
+        search = _PagedSearch(
+            self.mirrors,
+            key=(
+                None
+                if self.mirrors is None
+                else make_cache_key(
+                    self.config.endpoint, items_per_page, **query_params
+                )
+            ),
+        )
+        for mirror in search:
+            try:
+                eo_products, total_count = self._query_page(
+                    dict(query_params),
+                    items_per_page,
+                    page,
+                    mirror=mirror,
+                    **query_options,
+                    **kwargs
+                )
+                break
+            except search.errors as ex:
+                search.failed(mirror, ex)
+        search.pin(mirror)
+        return eo_products, total_count if count else None
+
+    def iter_query(self, items_per_page=None, **kwargs):
+        """
+        Iterate over all the products matching the search criteria.
+
+        Pages of results are requested one after the other, the next page being
+        requested in the background while the products of the current one are
+        consumed. At most two pages of results are then kept in memory.
+
+        :param items_per_page: The number of results requested in each page (default:
+                               ``max_items_per_page`` pagination configuration)
+        :type items_per_page: int
+        :param kwargs: (dict) Metadata, and the same options as :meth:`query`
+        :return: The EO products matching the criteria, one by one
+        :rtype: Iterator[:class:`~eodag.api.product._product.EOProduct`]
+        """
+        query_options = self._pop_query_options(kwargs)
+        items_per_page = items_per_page or self.config.pagination.get(
+            "max_items_per_page", self.DEFAULT_ITEMS_PER_PAGE
+        )
+
+        self._init_api()
+        query_params, _ = self._update_keyword(**kwargs)
+
+        def fetch_page(page, mirror):
+            return self._query_page(
+                dict(query_params),
+                items_per_page,
+                page,
+                mirror=mirror,
+                **query_options,
+                **kwargs
+            )
+
+        for eo_products in self._iter_pages(fetch_page, items_per_page):
+            for product in eo_products:
+                yield product
+            # Release the current page before waiting for the next one
+            del eo_products
+
+    def _iter_pages(self, fetch_page, items_per_page, prefetch=True):
+        """Iterate over the pages of results of a search, all requested from the same
+        mirror.
+
+        If mirrors are configured, the fastest healthy one is pinned for the whole
+        iteration, so that the pages are consistent. If it fails, the search is
+        restarted from the first page on the next mirror, the products already
+        returned being skipped.
+
+        :param fetch_page: Function requesting a page, called with the page number
+                           and the mirror (None if no mirror is configured), and
+                           returning its EO products and the total count
+        :type fetch_page: callable
+        :param items_per_page: The number of results per page
+        :type items_per_page: int
+        :param prefetch: (optional) Request the next page in the background while
+                         the current one is consumed
+        :type prefetch: bool
+        :return: The EO products of each page
+        :rtype: Iterator[list]
+        """
+        search = _PagedSearch(self.mirrors)
+        for mirror in search:
+            try:
+                for eo_products in self._iter_mirror_pages(
+                    fetch_page, items_per_page, mirror, prefetch
+                ):
+                    yield search.unseen(eo_products)
+                return
+            except search.errors as ex:
+                search.failed(mirror, ex)
+
+    @staticmethod
+    def _iter_mirror_pages(fetch_page, items_per_page, mirror, prefetch):
+        """Iterate over the pages of results of a search requested from a mirror."""
+        if not prefetch:
+            for page in itertools.count(1):
+                eo_products, total_count = fetch_page(page, mirror)
+                yield eo_products
+                if page * items_per_page >= (total_count or 0):
+                    return
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            page = 1
+            next_page = executor.submit(fetch_page, page, mirror)
+            while next_page is not None:
+                eo_products, total_count = next_page.result()
+                if total_count and page * items_per_page < total_count:
+                    page += 1
+                    next_page = executor.submit(fetch_page, page, mirror)
+                else:
+                    next_page = None
+                yield eo_products
+                del eo_products
+
+    async def aquery(self, items_per_page=None, page=None, count=True, **kwargs):
+        """
+        Query for products, asynchronous version of :meth:`query`.
+
+        The requests are sent from the threads of the plugin asynchronous API, so that
+        many queries can run concurrently on one event loop. At most ``async_workers``
+        (plugin configuration, default: 8) blocking calls run at the same time.
+
+        :param items_per_page: The number of results that must appear in one single
+                               page
+        :type items_per_page: int
+        :param page: The page number to return (default: 1)
+        :type page: int
+        :param count: To trigger a count request (default: True)
+        :type count: bool
+        :param kwargs: (dict) Metadata, and the same options as :meth:`query`
+        :return: A collection of EO products matching the criteria and the total count of products
+                 available
+        :rtype: tuple(:class:`~eodag.api.search_result.SearchResult`, int or None)
+        """
+        return await self._run_blocking(
+            self.query, items_per_page=items_per_page, page=page, count=count, **kwargs
+        )
+
+    async def aiter_query(self, items_per_page=None, **kwargs):
+        """
+        Iterate over all the products matching the search criteria, asynchronous
+        version of :meth:`iter_query`.
+
+        As with :meth:`iter_query`, the next page of results is requested while the
+        products of the current one are consumed.
+
+        :param items_per_page: The number of results requested in each page (default:
+                               ``max_items_per_page`` pagination configuration)
+        :type items_per_page: int
+        :param kwargs: (dict) Metadata, and the same options as :meth:`query`
+        :return: The EO products matching the criteria, one by one
+        :rtype: AsyncIterator[:class:`~eodag.api.product._product.EOProduct`]
+        """
+        query_options = self._pop_query_options(kwargs)
+        items_per_page = items_per_page or self.config.pagination.get(
+            "max_items_per_page", self.DEFAULT_ITEMS_PER_PAGE
+        )
+
+        self._init_api()
+        query_params, _ = self._update_keyword(**kwargs)
+
+        def fetch_page(page, mirror):
+            return asyncio.ensure_future(
+                self._run_blocking(
+                    self._query_page,
+                    dict(query_params),
+                    items_per_page,
+                    page,
+                    mirror=mirror,
+                    **query_options,
+                    **kwargs
+                )
+            )
+
+        # Same as _iter_pages: a mirror is pinned, the search being restarted on the
+        # next one if it fails
+        search = _PagedSearch(self.mirrors)
+        for mirror in search:
+            try:
+                async for eo_products in self._aiter_mirror_pages(
+                    fetch_page, items_per_page, mirror
+                ):
+                    for product in search.unseen(eo_products):
+                        yield product
+                    # Release the current page before waiting for the next one
+                    del eo_products
+                return
+            except search.errors as ex:
+                search.failed(mirror, ex)
+
+    @staticmethod
+    async def _aiter_mirror_pages(fetch_page, items_per_page, mirror):
+        """Iterate over the pages of results of a search requested from a mirror,
+        the next page being requested while the current one is consumed."""
+        page = 1
+        next_page = fetch_page(page, mirror)
+        try:
+            while next_page is not None:
+                eo_products, total_count = await next_page
+                if total_count and page * items_per_page < total_count:
+                    page += 1
+                    next_page = fetch_page(page, mirror)
+                else:
+                    next_page = None
+                yield eo_products
+                # Release the current page before waiting for the next one
+                del eo_products
+        finally:
+            # The iteration was stopped before the last page
+            if next_page is not None:
+                next_page.cancel()
+
+    async def _run_blocking(self, func, *args, **kwargs):
+        """Run a blocking call in the threads of the asynchronous API.
+
+        :return: The result of the call
+        """
+        with self._async_executor_lock:
+            if self._async_executor is None:
+                self._async_executor = ThreadPoolExecutor(
+                    max_workers=getattr(
+                        self.config, "async_workers", DEFAULT_ASYNC_WORKERS
+                    ),
+                    thread_name_prefix="sentinelsat-async",
+                )
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._async_executor, functools.partial(func, *args, **kwargs)
+        )
+
+    def split_query(
+        self, split_period=None, split_grid=None, max_workers=None, **kwargs
+    ):
+        """
+        Query for all the products of a large search with parallel sub-queries.
+
+        The search date range is split into periods of ``split_period`` days, and its
+        geometry into the cells of a ``split_grid`` grid. The resulting sub-queries are
+        run in parallel and their results merged, without duplicates, and ordered by
+        sensing start time and uuid.
+
+        Default values of the split parameters are read from the ``query_split``
+        plugin configuration, which also accepts ``max_requests_per_second`` to
+        limit the rate of the requests sent to the endpoint.
+
+        :param split_period: Length in days of the sub-queries date ranges
+                             (default: 30)
+        :type split_period: int
+        :param split_grid: Number of columns and rows of the grid splitting the search
+                           geometry (default: not split)
+        :type split_grid: tuple(int, int)
+        :param max_workers: Maximum number of sub-queries run at the same time
+                            (default: 4)
+        :type max_workers: int
+        :param kwargs: (dict) Metadata, and the same options as :meth:`query`
+        :return: All the EO products matching the criteria and their count
+        :rtype: tuple(:class:`~eodag.api.search_result.SearchResult`, int)
+        """
+        split_config = getattr(self.config, "query_split", None) or {}
+        split_period = split_period or split_config.get("period", DEFAULT_SPLIT_PERIOD)
+        split_grid = split_grid or split_config.get("grid")
+        max_workers = max_workers or split_config.get(
+            "max_workers", DEFAULT_SPLIT_WORKERS
+        )
+        rate_limiter = _get_rate_limiter(
+            self.config.endpoint, split_config.get("max_requests_per_second")
+        )
+        items_per_page = self.config.pagination.get(
+            "max_items_per_page", self.DEFAULT_ITEMS_PER_PAGE
+        )
+        query_options = self._pop_query_options(kwargs)
+
+        self._init_api()
+        query_params, _ = self._update_keyword(**kwargs)
+        sub_queries = self._split_query_params(query_params, split_period, split_grid)
+        logger.info("Search split into %s sub-queries", len(sub_queries))
+
+        def run_sub_query(sub_query_params):
+            def fetch_page(page, mirror):
+                if rate_limiter is not None:
+                    rate_limiter.wait()
+                return self._query_page(
+                    dict(sub_query_params),
+                    items_per_page,
+                    page,
+                    mirror=mirror,
+                    **query_options,
+                    **kwargs
+                )
+
+            return [
+                product
+                for page_products in self._iter_pages(
+                    fetch_page, items_per_page, prefetch=False
+                )
+                for product in page_products
+            ]
+
+        merged = {}
+        with ThreadPoolExecutor(
+            max_workers=max(1, min(max_workers, len(sub_queries)))
+        ) as executor:
+            for products in executor.map(run_sub_query, sub_queries):
+                for product in products:
+                    merged.setdefault(product.properties["uuid"], product)
+
+        search_result = SearchResult(
+            sorted(
+                merged.values(),
+                key=lambda p: (
+                    p.properties.get("startTimeFromAscendingNode", ""),
+                    p.properties["uuid"],
+                ),
+            )
+        )
+        return search_result, len(search_result)
+
+    def harvest(self, name=None, since=None, items_per_page=None, **kwargs):
+        """
+        Iterate over the products ingested by the hub since the last run of a harvest.
+
+        The products matching the search criteria are requested by ingestion date,
+        from the watermark of the harvest: the latest ingestion date of the products
+        it found. As the hub may publish products some time after their ingestion
+        date, the products ingested during the ``overlap`` (``harvest`` plugin
+        configuration, default: 1 hour) before the watermark are requested again, the
+        ones already harvested being skipped.
+
+        The watermark is saved once all the products of a page have been consumed, so
+        that a harvest stopped before returns the products of the page again on its
+        next run.
+
+        :param name: (optional) The harvest name (default: the hash of the search
+                     criteria)
+        :type name: str
+        :param since: (optional) The ingestion date from which products are requested,
+                      instead of the watermark (default: all the products on the
+                      first run)
+        :type since: str or datetime
+        :param items_per_page: The number of results requested in each page (default:
+                               ``max_items_per_page`` pagination configuration)
+        :type items_per_page: int
+        :param kwargs: (dict) Metadata, and the same options as :meth:`query`, the
+                       products being always searched on the hub
+        :return: The EO products not harvested yet, by ingestion date
+        :rtype: Iterator[:class:`~eodag.api.product._product.EOProduct`]
+        """
+        query_options = self._pop_query_options(kwargs)
+        query_options.update(source="remote", use_cache=False)
+        items_per_page = items_per_page or self.config.pagination.get(
+            "max_items_per_page", self.DEFAULT_ITEMS_PER_PAGE
+        )
+
+        self._init_api()
+        query_params, _ = self._update_keyword(**kwargs)
+        name = name or make_cache_key(self.config.endpoint, **query_params)
+        watermarks = self.get_harvest_watermarks()
+        if since is None:
+            start = watermarks.start(name)
+        else:
+            start = isoparse(since) if isinstance(since, str) else since
+        logger.info(
+            "Harvesting the products ingested since %s", start or "the beginning"
+        )
+        query_params["ingestiondate"] = (start, "NOW")
+        query_params["order_by"] = "+ingestiondate"
+
+        def fetch_page(page, mirror):
+            return self._query_page(
+                dict(query_params),
+                items_per_page,
+                page,
+                mirror=mirror,
+                **query_options,
+                **kwargs
+            )
+
+        for eo_products in self._iter_pages(fetch_page, items_per_page):
+            harvested = watermarks.harvested(
+                name, [p.properties["uuid"] for p in eo_products]
+            )
+            for product in eo_products:
+                if product.properties["uuid"] not in harvested:
+                    yield product
+            watermarks.advance(
+                name,
+                [
+                    (p.properties["uuid"], isoparse(p.properties["ingestionDate"]))
+                    for p in eo_products
+                    if p.properties.get("ingestionDate")
+                ],
+            )
+            del eo_products
+
+    def get_harvest_watermarks(self):
+        """Get the watermarks of the harvests, created on first use.
+
+        The watermarks are configured by the ``harvest`` plugin configuration. They are
+        stored in a SQLite database, ``<outputs_prefix>/.harvest.sqlite`` by default.
+
+        :return: The watermarks store
+        :rtype: :class:`~eodag_sentinelsat.harvest.HarvestWatermarks`
+        """
+        with self._harvest_watermarks_lock:
+            if self._harvest_watermarks is None:
+                self._harvest_watermarks = build_harvest_watermarks(
+                    getattr(self.config, "harvest", None), self.config.outputs_prefix
+                )
+            return self._harvest_watermarks
+
+    @staticmethod
+    def _split_query_params(query_params, split_period, split_grid=None):
+        """Split sentinelsat query parameters by date range and by geometry.
+
+        :param query_params: sentinelsat query parameters, built by ``_update_keyword``
+        :type query_params: dict
+        :param split_period: Length in days of the sub-queries date ranges
+        :type split_period: int
+        :param split_grid: (optional) Number of columns and rows of the grid splitting
+                           the search geometry
+        :type split_grid: tuple(int, int)
+        :return: The sub-queries parameters
+        :rtype: list(dict)
+        """
+        dates = [None]
+        if "date" in query_params:
+            start, end = query_params["date"]
+            period = timedelta(days=split_period)
+            dates = []
+            while start < end:
+                dates.append((start, min(start + period, end)))
+                start += period
+            dates = dates or [query_params["date"]]
+
+        areas = [None]
+        if split_grid and "area" in query_params:
+            area = wkt.loads(query_params["area"])
+            cols, rows = split_grid
+            minx, miny, maxx, maxy = area.bounds
+            width, height = (maxx - minx) / cols, (maxy - miny) / rows
+            areas = []
+            for col, row in itertools.product(range(cols), range(rows)):
+                cell = geometry.box(
+                    minx + col * width,
+                    miny + row * height,
+                    minx + (col + 1) * width,
+                    miny + (row + 1) * height,
+                )
+                cell_area = area.intersection(cell)
+                if not cell_area.is_empty and cell_area.area > 0:
+                    areas.append(
+                        format_metadata("{area#to_rounded_wkt}", area=cell_area)
+                    )
+            areas = areas or [query_params["area"]]
+
+        sub_queries = []
+        for sub_date, sub_area in itertools.product(dates, areas):
+            sub_query_params = dict(query_params)
+            if sub_date is not None:
+                sub_query_params["date"] = sub_date
+            if sub_area is not None:
+                sub_query_params["area"] = sub_area
+            sub_queries.append(sub_query_params)
+        return sub_queries
+
+    def _pop_query_options(self, kwargs):
+        """Pop from the search kwargs the options that are not search criteria.
+
+        :param kwargs: Search kwargs, updated in place
+        :type kwargs: dict
+        :return: ``lazy_storage_status``, ``use_cache``, ``invalidate_cache`` and
+                 ``source`` options
+        :rtype: dict
+        :raises: :class:`~eodag.utils.exceptions.MisconfiguredError` if a local search
+                 is asked for without a catalog configured
+        """
+        lazy_storage_status = kwargs.pop("lazy_storage_status", None)
+        if lazy_storage_status is None:
+            lazy_storage_status = getattr(self.config, "lazy_storage_status", False)
+        catalog_config = getattr(self.config, "catalog", None)
+        source = kwargs.pop("source", None)
+        if source is None and isinstance(catalog_config, dict):
+            source = catalog_config.get("source")
+        source = source or "remote"
+        if source not in CATALOG_SOURCES:
+            raise ValueError(
+                "Invalid source: %r, expected one of %s"
+                % (source, ", ".join(CATALOG_SOURCES))
+            )
+        if source != "remote" and not catalog_config:
+            raise MisconfiguredError(
+                "A catalog must be configured to search a %s source" % source
+            )
+        return {
+            "lazy_storage_status": lazy_storage_status,
+            # Searches of the catalog are not cached
+            "use_cache": kwargs.pop("use_cache", True)
+            and self.query_cache is not None
+            and source == "remote",
+            "invalidate_cache": kwargs.pop("invalidate_cache", False),
+            "source": source,
+        }
+
+    def _query_page(
+        self,
+        query_params,
+        items_per_page,
+        page,
+        lazy_storage_status=False,
+        use_cache=False,
+        invalidate_cache=False,
+        source="remote",
+        mirror=None,
+        **kwargs
+    ):
+        """Query a page of products.
+
+        :param query_params: sentinelsat query parameters, built by ``_update_keyword``
+        :type query_params: dict
+        :param items_per_page: The number of results per page
+        :type items_per_page: int
+        :param page: The page number
+        :type page: int
+        :param mirror: (optional) The mirror the page is requested from, without
+                       failing over to the others
+        :type mirror: :class:`~eodag_sentinelsat.mirrors.Mirror`
+        :param kwargs: (dict) Search kwargs, given to the EO products
+        :return: The EO products of the page and the total count of products available
+        :rtype: tuple(list, int or None)
+        """
+        eo_products = []
+        total_count = None
+
         # add pagination
+        query_params.update(self._get_pagination_params(items_per_page, page))
+
+        # Search a simpler geometry, the results being filtered on the original one
+        area = None
+        if self.footprint_simplifier is not None and query_params.get("area"):
+            area = self.footprint_simplifier.simplify(
+                query_params["area"], query_params.get("area_relation")
+            )
+            query_params["area"] = area.wkt
+
         try:
-            pagination_params_str = self.config.pagination.get(
-                "next_page_query_obj", {}
-            ).format(
-                items_per_page=items_per_page,
-                page=page,
-                skip=items_per_page * (page - 1),
-            )
-            pagination_params = ast.literal_eval(pagination_params_str)
+            cached = None
+            if use_cache:
+                cache_key = make_cache_key(self.config.endpoint, **query_params)
+                if invalidate_cache:
+                    self.query_cache.invalidate(cache_key)
+                cached = self.query_cache.get(cache_key)
+            if cached is not None:
+                logger.info("Query results found in cache")
+                results, total_count = cached
+                results = _copy_results(results)
+            else:
+                # Query, the total count is read from the same response
+                with self._phase("query", source=source) as phase:
+                    if source == "remote":
+                        logger.info("Sending query request with `sentinelsat`")
+                        results, total_count = self._query_with_count(
+                            mirror=mirror, **query_params
+                        )
+                        self._add_to_catalog(query_params, results)
+                    else:
+                        results, total_count = self._query_catalog(
+                            query_params, update=source == "hybrid"
+                        )
+                    phase.set(products=len(results))
+                if area is not None and area.original is not None:
+                    with self._phase("footprint_filter", method=area.method) as phase:
+                        found = len(results)
+                        results = area.filter(results)
+                        phase.set(products=len(results), dropped=found - len(results))
+                if use_cache:
+                    self.query_cache.set(
+                        cache_key, (_copy_results(results), total_count)
+                    )
+
+            # Create the storage_status field
+            if not lazy_storage_status:
+                with self._phase("storage_status", products=len(results)):
+                    self._resolve_storage_status(results)
+
+            # Normalize results skeletons (using providers.yml file)
+            with self._phase("normalize", products=len(results)):
+                eo_products = self._normalize_results(
+                    results.values(), lazy_storage_status=lazy_storage_status, **kwargs
+                )
+
         except TypeError:
-            pagination_params = {}
+            import traceback as tb
+
+            # Sentinelsat api query method raises a TypeError for finding None in the json feed received
+            # as a response from the sentinel server, when looking for 'opensearch:totalResults' key.
+            # This may be interpreted as the the api not finding any result from the query.
+            # This is what is assumed here.
+            logger.debug(
+                "Something went wrong during the query with self.api api:\n %s",
+                tb.format_exc(),
+            )
+            logger.info("No results found !")
+
+        except ServerError as ex:
+            """
+            SentinelAPIError -- the parent, catch-all exception. Only used when no other more specific exception
+                                can be applied.
+            SentinelAPILTAError -- raised when retrieving a product from the Long Term Archive.
+            ServerError -- raised when the server responded in an unexpected manner, typically due to undergoing
+                            maintenance.
+            UnauthorizedError -- raised when attempting to retrieve a product with incorrect credentials.
+            QuerySyntaxError -- raised when the query string could not be parsed on the server side.
+            QueryLengthError -- raised when the query string length was excessively long.
+            InvalidKeyError -- raised when product with given key was not found on the server.
+            InvalidChecksumError -- MD5 checksum of a local file does not match the one from the server.
+            """
+            raise RequestError(ex) from ex
+
+        return eo_products, total_count
+
+    def _get_pagination_params(self, items_per_page, page):
+        """Build the sentinelsat pagination parameters of a page.
+
+        :param items_per_page: The number of results per page, no pagination is
+                               applied if None
+        :type items_per_page: int
+        :param page: The page number (default: 1)
+        :type page: int
+        :return: The pagination parameters, e.g. ``{"limit": 20, "offset": 40}``
+        :rtype: dict
+        :raises: :class:`~eodag.utils.exceptions.MisconfiguredError`
+        :raises: :class:`ValueError`
+        """
+        template = self.config.pagination.get("next_page_query_obj")
+        if items_per_page is None or not template:
+            return {}
+        page = 1 if page is None else page
+        if not isinstance(items_per_page, int) or items_per_page < 1:
+            raise ValueError("Invalid items_per_page: %r" % (items_per_page,))
+        if not isinstance(page, int) or page < 1:
+            raise ValueError("Invalid page: %r" % (page,))
+        if self._pagination_params is None or self._pagination_params[0] != template:
+            self._pagination_params = (
+                template,
+                _compile_pagination_template(template),
+            )
+        return self._pagination_params[1](items_per_page, page)
+
+    def _query_with_count(
+        self, order_by=None, limit=None, offset=0, mirror=None, **query_params
+    ):
+        """Query products and get their total count from the same OpenSearch response.
+
+        Does the same as ``sentinelsat.SentinelAPI.query`` but also returns the
+        ``opensearch:totalResults`` value of the response, which saves the additional
+        request sent by ``sentinelsat.SentinelAPI.count``.
+
+        :param order_by: Fields to order by, as accepted by ``SentinelAPI.query``
+        :type order_by: str
+        :param limit: Maximum number of products returned
+        :type limit: int
+        :param offset: The number of results to skip
+        :type offset: int
+        :param mirror: (optional) The mirror the query is sent to, without failing
+                       over to the others
+        :type mirror: :class:`~eodag_sentinelsat.mirrors.Mirror`
+        :param query_params: Other ``SentinelAPI.query`` parameters
+        :type query_params: dict
+        :return: Products properties indexed by uuid, and the total count of products
+        :rtype: tuple(dict, int)
+        """
+        query = self.api.format_query(**query_params)
+        if query.strip() == "":
+            raise ValueError("Empty query.")
+        if self.api.check_query_length(query) > 1.0:
+            logger.warning(
+                "The query string is too long and will likely cause a bad DHuS response."
+            )
+        response, total_count = self._call_api(
+            lambda api: api._load_query(
+                query, _format_order_by(order_by), limit, offset
+            ),
+            mirror=mirror,
+        )
+        return _parse_opensearch_response(response), total_count
+
+    def get_catalog(self):
+        """Get the local catalog of the products found, created on first use.
 
+        The catalog is configured by the ``catalog`` plugin configuration. It is
+        stored in a SQLite database, ``<outputs_prefix>/.catalog.sqlite`` by default.
+
+        :return: The catalog, or None if not configured
+        :rtype: :class:`~eodag_sentinelsat.catalog.SQLiteCatalog`
+        """
+        with self._catalog_lock:
+            if self._catalog is None:
+                self._catalog = build_catalog(
+                    getattr(self.config, "catalog", None), self.config.outputs_prefix
+                )
+            return self._catalog
+
+    def _add_to_catalog(self, query_params, results):
+        """Add the results of a search of the hub to the catalog, if configured."""
+        catalog = self.get_catalog()
+        if catalog is None or not results:
+            return
         try:
-            # Count
-            if count:
-                logger.info("Sending count request with `sentinelsat`")
-                total_count = self.api.count(**query_params)
+            query = CatalogQuery(self.config.endpoint, query_params)
+        except ValueError as ex:
+            logger.debug("Results not added to the catalog: %s", ex)
+            return
+        catalog.add(query, results.values())
+
+    def _query_catalog(self, query_params, update=False):
+        """Search the products of the catalog.
+
+        :param query_params: sentinelsat query parameters, with the ``limit`` and
+                             ``offset`` of the page
+        :type query_params: dict
+        :param update: (optional) Search the hub for the date ranges the catalog does
+                       not cover first
+        :type update: bool
+        :return: Products properties indexed by uuid, and the total count of products
+        :rtype: tuple(dict, int)
+        """
+        catalog = self.get_catalog()
+        query = CatalogQuery(self.config.endpoint, query_params)
+        if update:
+            for start, end in catalog.uncovered(query):
+                logger.info(
+                    "Searching the hub from %s to %s for the catalog",
+                    start or "the beginning",
+                    end,
+                )
+                self._add_to_catalog_pages(catalog, query, start, end)
+                catalog.add_coverage(query, start, end)
+        logger.info("Searching the local catalog")
+        return catalog.search(
+            query, limit=query_params.get("limit"), offset=query_params.get("offset", 0)
+        )
+
+    def _add_to_catalog_pages(self, catalog, query, start, end):
+        """Add the products found on the hub for a date range to the catalog.
+
+        The products are requested by pages of ``max_items_per_page``, sorted by
+        ingestion date so that the products ingested meanwhile do not shift the
+        pages, each page being added to the catalog once received.
+        """
+        items_per_page = self.config.pagination.get(
+            "max_items_per_page", self.DEFAULT_ITEMS_PER_PAGE
+        )
+        offset = 0
+        while True:
+            results, total_count = self._query_with_count(
+                order_by="+ingestiondate",
+                limit=items_per_page,
+                offset=offset,
+                **query.query_params(start, end)
+            )
+            catalog.add(query, results.values())
+            offset += len(results)
+            if not results or offset >= (total_count or 0):
+                return
+
+    def _resolve_storage_status(self, results):
+        """Set the ``storage_status`` field of a page of sentinelsat results.
+
+        The status is resolved for the whole page with as few requests as possible:
+
+        * first from the ``Online``/``ondemand`` fields if the OpenSearch feed already
+          provides them,
+        * then with chunked OData ``$filter`` requests on the remaining products, sent
+          through a bounded thread pool,
+        * and finally, only for products still unresolved, with ``is_online`` requests
+          sent through a bounded thread pool too.
+
+        :param results: sentinelsat query results, product properties indexed by uuid
+        :type results: dict
+        """
+        unresolved = []
+        for uuid, res in results.items():
+            if "storage_status" in res:
+                continue
+            elif "Online" in res:
+                res["storage_status"] = str(res["Online"]).lower() == "true"
+            elif "ondemand" in res:
+                res["storage_status"] = str(res["ondemand"]).lower() != "true"
             else:
-                total_count = None
+                unresolved.append(uuid)
+        if not unresolved:
+            return
 
-            # Query
-            query_params.update(pagination_params)
-            logger.info("Sending query request with `sentinelsat`")
-            results = self.api.query(**query_params)
+        statuses = self._get_online_statuses(unresolved)
 
-            # Create the storage_status field
-            for uuid, res in results.items():
-                res["storage_status"] = self.api.is_online(uuid)
+        remaining = [uuid for uuid in unresolved if uuid not in statuses]
+        if remaining:
+            logger.debug(
+                "Checking storage status of %s products one by one", len(remaining)
+            )
+            max_workers = min(
+                getattr(
+                    self.config,
+                    "storage_status_workers",
+                    DEFAULT_STORAGE_STATUS_WORKERS,
+                ),
+                len(remaining),
+            )
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                statuses.update(
+                    zip(remaining, executor.map(self._is_online, remaining))
+                )
 
-            # Normalize results skeletons (using providers.yml file)
-            eo_products = self._normalize_results(results.values(), **kwargs)
+        for uuid in unresolved:
+            results[uuid]["storage_status"] = statuses[uuid]
+
+    def _is_online(self, uuid):
+        """Whether a product is online, asking the mirrors if configured."""
+        return self._call_api(lambda api: api.is_online(uuid))
+
+    def _get_online_statuses(self, uuids):
+        """Get the ``Online`` OData attribute of several products at once.
+
+        Products are requested by chunks using a ``$filter`` on their ids, sent at the
+        same time through a bounded thread pool. Chunks that could not be resolved are
+        left out of the returned dict.
+
+        :param uuids: ids of the products to check
+        :type uuids: list
+        :return: ``Online`` attribute of the products, indexed by uuid
+        :rtype: dict
+        """
+        # Some DHuS versions do not set the Online attribute, products are then always online
+        if not getattr(self.api, "_online_attribute_used", True):
+            return {uuid: True for uuid in uuids}
+
+        statuses = {}
+        for chunk, entries, error in self._request_odata_chunks(uuids, "Id,Online"):
+            if isinstance(error, SentinelAPIError):
+                if "Could not find property with name: 'Online'" in error.msg:
+                    self.api._online_attribute_used = False
+                    statuses.update({uuid: True for uuid in uuids})
+                    return statuses
+                logger.debug(
+                    "Could not get storage status of %s products with OData: %s",
+                    len(chunk),
+                    error,
+                )
+                continue
+            elif error is not None:
+                logger.debug("Unexpected OData storage status response: %s", error)
+                continue
+            statuses.update(
+                {
+                    entry["Id"]: entry.get("Online", True)
+                    for entry in entries
+                    if "Id" in entry
+                }
+            )
+        return statuses
+
+    def _get_product_checksums(self, uuids):
+        """Get the ``Checksum`` OData attribute of several products at once.
+
+        Products are requested by chunks like in :meth:`_get_online_statuses`. Chunks
+        that could not be resolved are left out of the returned dict.
+
+        :param uuids: ids of the products
+        :type uuids: list
+        :return: Checksums of the products as ``<algorithm>:<hex digest>``, indexed by
+                 uuid
+        :rtype: dict
+        """
+        checksums = {}
+        for chunk, entries, error in self._request_odata_chunks(uuids, "Id,Checksum"):
+            if isinstance(error, SentinelAPIError):
+                logger.debug(
+                    "Could not get checksums of %s products with OData: %s",
+                    len(chunk),
+                    error,
+                )
+                continue
+            elif error is not None:
+                logger.debug("Unexpected OData checksums response: %s", error)
+                continue
+            for entry in entries:
+                checksum = entry.get("Checksum") or {}
+                if (
+                    "Id" in entry
+                    and checksum.get("Algorithm")
+                    and checksum.get("Value")
+                ):
+                    checksums[entry["Id"]] = "%s:%s" % (
+                        checksum["Algorithm"].lower().replace("-", "_"),
+                        checksum["Value"].lower(),
+                    )
+        return checksums
+
+    def _request_odata_chunks(self, uuids, select):
+        """Request OData attributes of products, by chunks of ids.
+
+        The chunks of ``storage_status_chunk_size`` products (plugin configuration,
+        default: 20) are requested at the same time by at most
+        ``storage_status_workers`` threads (plugin configuration, default: 4).
+
+        :param uuids: ids of the products
+        :type uuids: list
+        :param select: The attributes requested, separated by commas
+        :type select: str
+        :return: The chunks of ids, with the OData entries of their products found, or
+                 the error of their request
+        :rtype: list(tuple(list, list or None, Exception or None))
+        :raises: :class:`~sentinelsat.exceptions.UnauthorizedError`
+        """
+        chunk_size = getattr(
+            self.config,
+            "storage_status_chunk_size",
+            DEFAULT_STORAGE_STATUS_CHUNK_SIZE,
+        )
+        chunks = []
+        for i in range(0, len(uuids), chunk_size):
+            chunk_end = i + chunk_size
+            chunks.append(uuids[i:chunk_end])
+
+        def request(chunk):
+            try:
+                return chunk, self._request_odata_products(chunk, select), None
+            except UnauthorizedError:
+                raise
+            except (SentinelAPIError, KeyError, TypeError, ValueError) as ex:
+                return chunk, None, ex
+
+        max_workers = min(
+            getattr(
+                self.config, "storage_status_workers", DEFAULT_STORAGE_STATUS_WORKERS
+            ),
+            len(chunks),
+        )
+        if max_workers <= 1:
+            return [request(chunk) for chunk in chunks]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(request, chunks))
 
-        except TypeError:
-            import traceback as tb
+    def _request_odata_products(self, uuids, select):
+        """Request OData attributes of products, using a ``$filter`` on their ids.
 
-            # Sentinelsat api query method raises a TypeError for finding None in the json feed received
-            # as a response from the sentinel server, when looking for 'opensearch:totalResults' key.
-            # This may be interpreted as the the api not finding any result from the query.
-            # This is what is assumed here.
-            logger.debug(
-                "Something went wrong during the query with self.api api:\n %s",
-                tb.format_exc(),
-            )
-            logger.info("No results found !")
+        :param uuids: ids of the products
+        :type uuids: list
+        :param select: The attributes requested, separated by commas
+        :type select: str
+        :return: The OData entries of the products found
+        :rtype: list
+        """
+        params = {
+            "$format": "json",
+            "$select": select,
+            "$top": len(uuids),
+            "$filter": " or ".join("Id eq '%s'" % uuid for uuid in uuids),
+        }
 
-        except ServerError as ex:
-            """
-            SentinelAPIError -- the parent, catch-all exception. Only used when no other more specific exception
-                                can be applied.
-            SentinelAPILTAError -- raised when retrieving a product from the Long Term Archive.
-            ServerError -- raised when the server responded in an unexpected manner, typically due to undergoing
-                            maintenance.
-            UnauthorizedError -- raised when attempting to retrieve a product with incorrect credentials.
-            QuerySyntaxError -- raised when the query string could not be parsed on the server side.
-            QueryLengthError -- raised when the query string length was excessively long.
-            InvalidKeyError -- raised when product with given key was not found on the server.
-            InvalidChecksumError -- MD5 checksum of a local file does not match the one from the server.
-            """
-            raise RequestError(ex) from ex
+        def request(api):
+            with api.dl_limit_semaphore:
+                response = api.session.get(
+                    api.api_url + "odata/v1/Products", params=params
+                )
+            api._check_scihub_response(response)
+            return response.json()["d"]["results"]
 
-        return eo_products, total_count
+        return self._call_api(request)
 
-    def _normalize_results(self, results, **kwargs):
-        """Extend the base QueryStringSearch.normalize_results method.
+    def _normalize_results(self, results, lazy_storage_status=False, **kwargs):
+        """Build EOProducts from sentinelsat results, like QueryStringSearch.normalize_results.
 
         Convert Python date/datetime objects returned by sentinelsat into their ISO format.
+        If ``lazy_storage_status`` is True, results have no ``storage_status`` yet and the
+        products ``storageStatus`` is resolved for all of them the first time it is read.
         """
-        products = super().normalize_results(results, **kwargs)
-        for product in products:
-            for pname, pvalue in product.properties.items():
-                if isinstance(pvalue, (date, datetime)):
-                    product.properties[pname] = pvalue.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+        metadata_mapping = self.config.metadata_mapping
+        if lazy_storage_status:
+            metadata_mapping = {
+                k: v for k, v in metadata_mapping.items() if k != "storageStatus"
+            }
+            resolver = _StorageStatusResolver(self)
+        discover_metadata = getattr(self.config, "discover_metadata", {})
+        extractor = MetadataExtractor(
+            metadata_mapping,
+            discovery_pattern=discover_metadata.get("metadata_pattern", None),
+            discovery_path=discover_metadata.get("metadata_path", "null"),
+        )
+        product_type_config = {
+            k: format_temporal(v)
+            for k, v in getattr(self.config, "product_type_config", {}).items()
+        }
+
+        logger.debug(
+            "Adapting %s plugin results to eodag product representation" % len(results)
+        )
+        products = []
+        for result in results:
+            product = EOProduct(self.provider, extractor.extract(result), **kwargs)
+            # use product_type_config as default properties
+            product.properties = dict(product_type_config, **product.properties)
+            if lazy_storage_status:
+                product.properties = _LazyStorageStatusProperties(
+                    product.properties, resolver
+                )
+            products.append(product)
         return products
 
     def _prepare_downloads(self, search_result, **kwargs):
@@ -188,22 +2071,140 @@ class SentinelsatAPI(Api, QueryStringSearch, Download):
         for creating a file path and a record filename by calling
         ``eodag.plugins.download.base.Download._prepare_download``,
         which allows to check whether this product has already been downloaded or not.
+
+        If an indexed download records store is configured, the records of all the
+        products are looked up at once instead, see
+        :func:`~eodag_sentinelsat.records.prepare_recorded_download`.
+
+        If a download journal is configured, the downloads interrupted by a crash are
+        resumed from the last stage they reached, see :meth:`_resume_download`.
         """
+        journal = self._get_download_journal(kwargs.get("outputs_prefix"))
+        if journal is not None:
+            journaled = journal.lookup(
+                product.properties["uuid"] for product in search_result
+            )
+            extract = kwargs.get("extract")
+            if extract is None:
+                extract = getattr(self.config, "extract", True)
+            for stage, path, _ in journaled.values():
+                if stage in (VERIFIED, MOVED):
+                    remove_partial_extraction(
+                        path, extract, kwargs.get("outputs_extension", ".zip")
+                    )
+
+        records = self._get_download_records(kwargs.get("outputs_prefix"))
+        if records is not None:
+            recorded = records.lookup(
+                record_key(product.remote_location)
+                for product in search_result
+                if product.remote_location
+            )
+            stale_keys = []
+
         prepared = []
         for product in search_result:
             pm = _ProductManager(uuid=product.properties["uuid"], product=product)
-            pm.fs_path, pm.record_filename = self._prepare_download(product, **kwargs)
+            if records is None:
+                pm.fs_path, pm.record_filename = self._prepare_download(
+                    product, **kwargs
+                )
+                record = pm.record_filename
+            else:
+                pm.fs_path, pm.record_key = prepare_recorded_download(
+                    self, product, recorded, stale_keys, **kwargs
+                )
+                record = pm.record_key
             # Do not try to download this product
-            if not pm.fs_path or not pm.record_filename:
+            if not pm.fs_path or not record:
                 if pm.fs_path:
                     product.location = path_to_uri(pm.fs_path)
                 pm.to_download = False
             else:
                 pm.to_download = True
+                if journal is not None and pm.uuid in journaled:
+                    self._resume_download(pm, *journaled[pm.uuid], **kwargs)
 
             prepared.append(pm)
+
+        if records is not None and stale_keys:
+            records.remove(stale_keys)
+        if journal is not None:
+            journal.set_many(
+                [
+                    (pm.uuid, QUEUED, pm.fs_path, None)
+                    for pm in prepared
+                    if pm.to_download and pm.uuid not in journaled
+                ]
+            )
+            # Recorded products have been extracted again if needed
+            journal.remove(
+                [
+                    pm.uuid
+                    for pm in prepared
+                    if not pm.to_download and pm.fs_path and pm.uuid in journaled
+                ]
+            )
         return prepared
 
+    def _resume_download(
+        self, product_manager, stage, path, downloaded_bytes, **kwargs
+    ):
+        """Skip the stages of a product download completed before a crash.
+
+        Products whose download ended are not downloaded again, they are only extracted
+        (or recorded) by :meth:`_finalize_downloads`.
+        """
+        if stage in (VERIFIED, MOVED) and os.path.exists(path):
+            logger.info(
+                "Resuming the interrupted download of %s after its download", path
+            )
+            product_manager.downloaded_by_sentinelsat = True
+            product_manager.fs_path = self._move_to_eodag_path(
+                product_manager, path, **kwargs
+            )
+        elif stage == EXTRACTED and os.path.exists(path):
+            logger.info(
+                "Resuming the interrupted download of %s after its extraction", path
+            )
+            product_manager.downloaded_by_sentinelsat = True
+            product_manager.finalize_future = Future()
+            product_manager.finalize_future.set_result(path)
+        elif stage == DOWNLOADING and downloaded_bytes:
+            logger.info(
+                "Resuming the interrupted download of %s from byte %s",
+                path,
+                downloaded_bytes,
+            )
+
+    def _get_download_journal(self, outputs_prefix=None):
+        """Get the download journal of a download directory.
+
+        :param outputs_prefix: (optional) The download directory, defaults to the
+                               ``outputs_prefix`` plugin configuration
+        :type outputs_prefix: str
+        :return: The journal, or None if downloads are not journaled
+        :rtype: :class:`~eodag_sentinelsat.journal.DownloadJournal`
+        """
+        return self._download_journals.get(
+            getattr(self.config, "download_journal", None),
+            outputs_prefix or self.config.outputs_prefix,
+        )
+
+    def _get_download_records(self, outputs_prefix=None):
+        """Get the indexed download records store of a download directory.
+
+        :param outputs_prefix: (optional) The download directory, defaults to the
+                               ``outputs_prefix`` plugin configuration
+        :type outputs_prefix: str
+        :return: The records store, or None if eodag record files are used
+        :rtype: :class:`~eodag_sentinelsat.records.SQLiteDownloadRecords`
+        """
+        return self._download_records.get(
+            getattr(self.config, "download_records", None),
+            outputs_prefix or self.config.outputs_prefix,
+        )
+
     def _finalize_downloads(self, product_managers, **kwargs):
         """Finalize the downloads.
 
@@ -214,28 +2215,79 @@ class SentinelsatAPI(Api, QueryStringSearch, Download):
         * By calling ``eodag.plugins.download.base.Download._prepare_download`` it
           takes care of extracting the products if required.
         * It also saves a record file by downloaded product to check later if it needs
-          to be downloaded again.
+          to be downloaded again, or records all of them at once in the indexed
+          download records store if one is configured, with the checksum computed
+          while they were downloaded.
         * It updates product.location
+        * It removes the download journal entries of the products finalized
+
+        :raises: :class:`~eodag.utils.exceptions.DownloadError` if some products could
+                 not be extracted, once all the others are finalized
         """
+        # Record the downloaded products, to detect later in another session if they
+        # have already been downloaded or not.
+        record_downloads(
+            self._get_download_records(kwargs.get("outputs_prefix")),
+            [
+                (
+                    pm.product.remote_location,
+                    pm.fs_path,
+                    pm.checksum,
+                    pm.record_filename,
+                )
+                for pm in product_managers
+                if pm.downloaded_by_sentinelsat
+                and (pm.record_key or pm.record_filename)
+            ],
+        )
+
         product_paths = []
+        finalized = []
+        failed = []
         for pm in product_managers:
             # fs_path is obtained from _prepare_download which can return None
             if pm.to_download is False and pm.fs_path is not None:
                 product_path = pm.fs_path
             elif pm.downloaded_by_sentinelsat:
-                # Save the record file for this product, to detect later in another session
-                # if it has already been downloaded or not.
-                with open(pm.record_filename, "w") as fh:
-                    fh.write(pm.product.remote_location)
-                logger.debug("Download recorded in %s", pm.record_filename)
-                # Call _finalize to extract the product if required and return the right path.
-                product_path = self._finalize(pm.fs_path, **kwargs)
-                # Update the product.location to the product's filepath URI (file://...)
-                pm.product.location = path_to_uri(product_path)
+                # Wait for the product extraction started once it was downloaded, or
+                # call _finalize to extract the product if required and return the right path.
+                try:
+                    if pm.finalize_future is not None:
+                        product_path = pm.finalize_future.result()
+                    else:
+                        product_path = self._finalize_journaled(
+                            pm, pm.fs_path, **kwargs
+                        )
+                except Exception as ex:
+                    # The archive is kept and recorded, its extraction will be tried
+                    # again by the next download
+                    logger.error("Could not extract %s: %s", pm.fs_path, ex)
+                    failed.append((pm, ex))
+                    product_path = None
+                else:
+                    # Update the product.location to the product's filepath URI (file://...)
+                    pm.product.location = path_to_uri(product_path)
+                    finalized.append(pm.uuid)
             else:
                 product_path = None
             if product_path is not None:
                 product_paths.append(product_path)
+
+        journal = self._get_download_journal(kwargs.get("outputs_prefix"))
+        if journal is not None and finalized:
+            journal.remove(finalized)
+        if failed:
+            raise DownloadError(
+                "%s of %s products downloaded could not be extracted: %s"
+                % (
+                    len(failed),
+                    len(failed) + len(product_paths),
+                    ", ".join(
+                        "%s (%s)" % (pm.product.properties["title"], ex)
+                        for pm, ex in failed
+                    ),
+                )
+            ) from failed[0][1]
         return product_paths
 
     def download(
@@ -310,14 +2362,26 @@ class SentinelsatAPI(Api, QueryStringSearch, Download):
                             configuration file or with environment variables.
                             ``checksum``, ``max_attempts``, ``n_concurrent_dl``, ``fail_fast``
                             and ``node_filter`` can be passed to ``sentinelsat.download_all`` directly.
+                            ``extract_workers`` (int) overrides the number of products
+                            extracted at the same time, as soon as they are downloaded.
+                            ``stream_extract`` (bool) extracts zip archives while they
+                            are downloaded, without writing them to disk.
         :return: A collection of absolute paths to the downloaded products
         :rtype: list
+        :raises: :class:`~eodag.utils.exceptions.DownloadError` if some downloaded
+                 products could not be extracted, the location of the other ones
+                 being updated
         """
         # Init Sentinelsat API if needed (connect...)
         self._init_api()
 
+        extract_workers, stream_extract = self._pop_extract_options(kwargs)
         product_managers = self._prepare_downloads(search_result, **kwargs)
-        uuids_to_download = [pm.uuid for pm in product_managers if pm.to_download]
+        uuids_to_download = [
+            pm.uuid
+            for pm in product_managers
+            if pm.to_download and not pm.downloaded_by_sentinelsat
+        ]
 
         # If a progress_callback is passed, use its disable attribute.
         # First, backup logging settings, then change them temporally to disable/enable progress bars
@@ -334,40 +2398,9 @@ class SentinelsatAPI(Api, QueryStringSearch, Download):
 
         if uuids_to_download:
             outputs_prefix = kwargs.get("outputs_prefix") or self.config.outputs_prefix
-            sentinelsat_kwargs = {
-                k: kwargs.pop(k)
-                for k in list(kwargs)
-                if k
-                in [
-                    "max_attempts",
-                    "checksum",
-                    "n_concurrent_dl",
-                    "fail_fast",
-                    "nodefilter",
-                ]
-            }
-
-            if progress_callback is None:
-                create_sentinelsat_pbar = ProgressCallback
-            else:
-                create_sentinelsat_pbar = progress_callback.copy
-
-            # Use eodag progress bars and avoid duplicates
-            self.api.pbar_count = 0
-
-            def _tqdm(self, **kwargs):
-                """sentinelsat progressbar wrapper"""
-                if self.api.pbar_count == 0 and progress_callback is not None:
-                    pbar = progress_callback
-                    for k in kwargs.keys():
-                        setattr(pbar, k, kwargs[k])
-                        pbar.refresh()
-                else:
-                    pbar = create_sentinelsat_pbar(**kwargs)
-                self.api.pbar_count += 1
-                return pbar
-
-            self.api.downloader._tqdm = types.MethodType(_tqdm, self.api.downloader)
+            downloader = self._create_downloader(
+                kwargs, progress_callback, wait, timeout
+            )
 
             # another output for notebooks
             nb_info = NotebookWidgets()
@@ -382,35 +2415,64 @@ class SentinelsatAPI(Api, QueryStringSearch, Download):
             )
             nb_info.display_html(retry_info)
 
-            self.api.lta_timeout = timeout * 60
+            # Extract each product in the background as soon as it is downloaded
+            managers_by_uuid = {
+                pm.uuid: pm
+                for pm in product_managers
+                if pm.to_download and not pm.downloaded_by_sentinelsat
+            }
+            extract_executor = ThreadPoolExecutor(
+                max_workers=extract_workers, thread_name_prefix="extract"
+            )
+            extract_lock = threading.Lock()
+
+            def on_downloaded(product_info):
+                pm = managers_by_uuid.get(product_info["id"])
+                if pm is None:
+                    return
+                with extract_lock:
+                    if pm.finalize_future is not None:
+                        return
+                    pm.finalize_future = extract_executor.submit(
+                        self._finalize_download, pm, product_info["path"], **kwargs
+                    )
+
+            downloader.on_downloaded = on_downloaded
+            downloader.stream_extract = stream_extract
+            # Download products straight to the path expected by EODAG
+            downloader.target_paths = {
+                uuid: pm.fs_path for uuid, pm in managers_by_uuid.items()
+            }
 
             # Download all products
-            # Three dicts returned by sentinelsat.download_all, their key is the uuid:
-            # 1. Product information from get_product_info() as well as the path on disk.
-            # 2. Product information for products successfully triggered for retrieval
-            # from the long term archive but not downloaded.
-            # 3. Product information of products where either downloading or triggering failed
-            success, _, _ = self.api.download_all(
-                uuids_to_download,
-                directory_path=outputs_prefix,
-                lta_retry_delay=wait * 60,
-                **sentinelsat_kwargs
-            )
+            # Three dicts returned by the sentinelsat downloader, their key is the uuid:
+            # 1. The download status of the products.
+            # 2. The exceptions of the products where either downloading or triggering failed.
+            # 3. Product information from get_product_info() as well as the path on disk.
+            try:
+                with self._phase("download_all", products=len(uuids_to_download)):
+                    statuses, _, product_infos = downloader.download_all(
+                        uuids_to_download, outputs_prefix
+                    )
+            finally:
+                # Pending extractions still run
+                extract_executor.shutdown(wait=False)
+            if downloader.concurrency is not None:
+                self._log_download_concurrency(downloader.concurrency)
+            success = {
+                uuid: product_infos[uuid]
+                for uuid, status in statuses.items()
+                if status == DownloadStatus.DOWNLOADED
+            }
 
             for pm in product_managers:
                 if pm.uuid in success:
                     pm.downloaded_by_sentinelsat = True
-                    # EODAG and sentinelsat may have different ways of determining the download
-                    # file name. The logic below makes sure that EODAG's way is applied.
-                    sentinelsat_path = success[pm.uuid]["path"]
-                    if sentinelsat_path != pm.fs_path:
-                        logger.debug(
-                            "sentinelsat product path (%s) is different from EODAG's (%s),"
-                            "file or directory moved to EODAG's path.",
-                            sentinelsat_path,
-                            pm.fs_path,
+                    pm.checksum = success[pm.uuid].get("checksum")
+                    if pm.finalize_future is None:
+                        pm.fs_path = self._move_to_eodag_path(
+                            pm, success[pm.uuid]["path"], **kwargs
                         )
-                        shutil.move(sentinelsat_path, pm.fs_path)
 
         # restore logging settings
         if eodag_logging_verbose is not None:
@@ -422,46 +2484,691 @@ class SentinelsatAPI(Api, QueryStringSearch, Download):
         paths = self._finalize_downloads(product_managers, **kwargs)
         return paths
 
+    def _pop_extract_options(self, kwargs):
+        """Pop the extraction options of the download methods from their kwargs.
+
+        :return: The number of products extracted at the same time, and whether zip
+                 archives are extracted while they are downloaded
+        :rtype: tuple(int, bool)
+        """
+        extract_workers = kwargs.pop("extract_workers", None) or getattr(
+            self.config, "extract_workers", DEFAULT_EXTRACT_WORKERS
+        )
+        stream_extract = kwargs.pop("stream_extract", None)
+        if stream_extract is None:
+            stream_extract = getattr(self.config, "stream_extract", False)
+        extract = kwargs.get("extract")
+        if extract is None:
+            extract = getattr(self.config, "extract", True)
+        return extract_workers, bool(stream_extract and extract)
+
+    def _create_downloader(self, kwargs, progress_callback, wait, timeout):
+        """Create the downloader of a download call.
+
+        The downloader holds the settings of this call, the API and its sessions
+        being shared with other plugins and threads. The options passed to
+        sentinelsat are popped from ``kwargs``.
+
+        :return: The downloader
+        :rtype: :class:`_ProductDownloader`
+        """
+        sentinelsat_kwargs = {
+            k: kwargs.pop(k)
+            for k in list(kwargs)
+            if k
+            in [
+                "max_attempts",
+                "checksum",
+                "n_concurrent_dl",
+                "fail_fast",
+                "nodefilter",
+            ]
+        }
+
+        if progress_callback is None:
+            create_sentinelsat_pbar = ProgressCallback
+        else:
+            create_sentinelsat_pbar = progress_callback.copy
+
+        # With an adaptive concurrency, n_concurrent_dl is only the number of threads
+        # waiting for a slot of the limit
+        concurrency = self.get_download_concurrency()
+        n_concurrent_dl = sentinelsat_kwargs.get("n_concurrent_dl")
+        if concurrency is not None and not n_concurrent_dl:
+            n_concurrent_dl = concurrency.max_concurrency
+
+        downloader = _ProductDownloader(
+            self.api,
+            node_filter=sentinelsat_kwargs.get("nodefilter"),
+            verify_checksum=sentinelsat_kwargs.get("checksum", True),
+            fail_fast=sentinelsat_kwargs.get("fail_fast", False),
+            n_concurrent_dl=n_concurrent_dl,
+            max_attempts=sentinelsat_kwargs.get("max_attempts", 10),
+            lta_retry_delay=wait * 60,
+            lta_timeout=timeout * 60,
+        )
+
+        # Use eodag progress bars and avoid duplicates
+        pbar_count = itertools.count()
+
+        def _tqdm(**kwargs):
+            """sentinelsat progressbar wrapper"""
+            if next(pbar_count) == 0 and progress_callback is not None:
+                pbar = progress_callback
+                for k in kwargs.keys():
+                    setattr(pbar, k, kwargs[k])
+                    pbar.refresh()
+            else:
+                pbar = create_sentinelsat_pbar(**kwargs)
+            return pbar
+
+        downloader._tqdm = _tqdm
+        downloader.journal = self._get_download_journal(kwargs.get("outputs_prefix"))
+        downloader.concurrency = concurrency
+        downloader.metrics = self.metrics
+        downloader.mirrors = self.mirrors
+        return downloader
+
+    @staticmethod
+    def _log_download_concurrency(concurrency):
+        stats = concurrency.stats()
+        if stats["throughput"] is None:
+            return
+        logger.info(
+            "Download concurrency: %s, throughput: %.1f MB/s",
+            stats["limit"],
+            stats["throughput"] / 1e6,
+        )
+
+    def get_download_concurrency(self):
+        """Get the adaptive limit of the concurrent downloads, created on first use.
+
+        The limit is configured by the ``adaptive_concurrency`` plugin configuration,
+        and shared by all the downloads of the plugin. Its current value and the
+        measured throughput are given by
+        :meth:`~eodag_sentinelsat.concurrency.AdaptiveConcurrency.stats`.
+
+        :return: The limit, or None if the number of concurrent downloads is fixed
+        :rtype: :class:`~eodag_sentinelsat.concurrency.AdaptiveConcurrency`
+        """
+        concurrency_config = getattr(self.config, "adaptive_concurrency", None)
+        if not concurrency_config:
+            return None
+        with self._download_concurrency_lock:
+            if self._download_concurrency is None:
+                concurrency = build_adaptive_concurrency(concurrency_config)
+                if self.metrics is not None:
+                    self.metrics.gauge(
+                        "download_concurrency", lambda: concurrency.stats()["limit"]
+                    )
+                    self.metrics.gauge(
+                        "download_throughput_bytes",
+                        lambda: concurrency.stats()["throughput"],
+                    )
+                self._download_concurrency = concurrency
+            return self._download_concurrency
+
+    def order_all(self, search_result, **kwargs):
+        """
+        Download all products in the background, OFFLINE products being ordered from
+        the Long Term Archive.
+
+        Unlike :meth:`download_all`, this does not block until the OFFLINE products are
+        restored: the products are queued in the LTA scheduler of the plugin (see
+        :meth:`get_lta_scheduler`), and a future is returned for each of them.
+
+        :param search_result: A collection of EO products resulting from a search
+        :type search_result: :class:`~eodag.api.search_result.SearchResult`
+        :param dict kwargs: The same options as :meth:`download_all`, used once the
+                            products are ONLINE
+        :return: The futures of the paths to the downloaded products, in the same order
+                 as the products
+        :rtype: list
+        """
+        return self.get_lta_scheduler().submit_all(search_result, **kwargs)
+
+    def get_lta_scheduler(self):
+        """Get the LTA scheduler of the plugin, created on first use.
+
+        The scheduler is configured by the ``lta_scheduler`` plugin configuration. Its
+        queue is persisted in a SQLite database, ``<outputs_prefix>/.lta_queue.sqlite``
+        by default: the orders pending when the process stopped are loaded and resumed
+        when the scheduler is created, their futures being given by
+        :meth:`~eodag_sentinelsat.lta.LTAScheduler.pending`. A new scheduler is created
+        once the previous one has been closed.
+
+        :return: The scheduler
+        :rtype: :class:`~eodag_sentinelsat.lta.LTAScheduler`
+        """
+        with self._lta_scheduler_lock:
+            if self._lta_scheduler is None or self._lta_scheduler.closed:
+                self._lta_scheduler = build_lta_scheduler(
+                    self,
+                    getattr(self.config, "lta_scheduler", None),
+                    self.config.outputs_prefix,
+                )
+                self._lta_scheduler.start()
+            return self._lta_scheduler
+
+    def check_downloads(self, search_result, **kwargs):
+        """
+        Check the downloaded products against the checksums of the provider.
+
+        The checksums computed while the products were downloaded are kept in the
+        indexed download records store, and compared to the provider ones without
+        reading the products again. Only the archives recorded without a checksum
+        are hashed, their checksum being recorded for the next checks. Extracted
+        products recorded without a checksum can not be checked.
+
+        The corrupted products, archive and extracted directory, and their records are
+        removed, so that :meth:`download_all` downloads them again.
+
+        :param search_result: A collection of EO products resulting from a search
+        :type search_result: :class:`~eodag.api.search_result.SearchResult`
+        :param dict kwargs: ``outputs_prefix`` (str) the download directory,
+                            ``outputs_extension`` (str) the archives extension
+        :return: The products whose download is corrupted
+        :rtype: list
+        :raises: :class:`~eodag.utils.exceptions.MisconfiguredError` if no indexed
+                 download records store is configured
+        """
+        records = self._get_download_records(kwargs.get("outputs_prefix"))
+        if records is None:
+            raise MisconfiguredError(
+                "Checking downloads needs an indexed download records store, "
+                "see the download_records configuration"
+            )
+        self._init_api()
+
+        products = {
+            record_key(product.remote_location): product
+            for product in search_result
+            if product.remote_location
+        }
+        recorded = records.lookup(products)
+        checksums = records.checksums(recorded)
+        provider_checksums = self._get_product_checksums(
+            [products[key].properties["uuid"] for key in recorded]
+        )
+
+        corrupted = []
+        computed = {}
+        for key, (_, fs_path) in recorded.items():
+            product = products[key]
+            provider_checksum = provider_checksums.get(product.properties["uuid"])
+            if provider_checksum is None:
+                logger.debug("No checksum found for %s", product)
+                continue
+            algorithm = provider_checksum.split(":", 1)[0]
+            checksum = checksums.get(key)
+            if checksum is None or not checksum.startswith(algorithm + ":"):
+                if not fs_path or not os.path.isfile(fs_path):
+                    logger.debug("%s can not be checked, no recorded checksum", product)
+                    continue
+                try:
+                    algo = hashlib.new(algorithm)
+                except ValueError:
+                    logger.debug("Unsupported checksum algorithm %s", algorithm)
+                    continue
+                _hash_file(fs_path, algo)
+                checksum = computed[key] = _format_checksum(algo)
+            if checksum != provider_checksum:
+                logger.warning("Download of %s is corrupted: %s", product, fs_path)
+                corrupted.append(product)
+                self._remove_download(fs_path, **kwargs)
+
+        corrupted_keys = [record_key(product.remote_location) for product in corrupted]
+        if computed:
+            records.set_checksums(
+                {k: v for k, v in computed.items() if k not in corrupted_keys}
+            )
+        if corrupted_keys:
+            records.remove(corrupted_keys)
+        return corrupted
+
+    @staticmethod
+    def _remove_download(fs_path, **kwargs):
+        """Remove a downloaded archive and the directory where it was extracted."""
+        if not fs_path:
+            return
+        if os.path.isfile(fs_path):
+            os.remove(fs_path)
+        outputs_extension = kwargs.get("outputs_extension", ".zip")
+        if outputs_extension in fs_path:
+            product_path = fs_path[: fs_path.index(outputs_extension)]
+            if os.path.isdir(product_path):
+                shutil.rmtree(product_path)
+
+    async def adownload_all(
+        self,
+        search_result,
+        auth=None,
+        progress_callback=None,
+        wait=DEFAULT_DOWNLOAD_WAIT,
+        timeout=DEFAULT_DOWNLOAD_TIMEOUT,
+        **kwargs
+    ):
+        """
+        Download all products, asynchronous version of :meth:`download_all`.
+
+        Each product is downloaded as soon as it is online: OFFLINE products are
+        ordered from the Long Term Archive and their storage status is checked every
+        ``wait`` minutes, without holding any thread while waiting. Downloads and
+        extractions run in the threads of the asynchronous API (see :meth:`aquery`).
+
+        :param search_result: A collection of EO products resulting from a search
+        :type search_result: :class:`~eodag.api.search_result.SearchResult`
+        :param auth: Not used, just here for compatibility reasons
+        :param progress_callback: Not used, just here for compatibility reasons
+        :param wait: Wait time in minutes between two checks of the storage status of
+            an OFFLINE product
+        :type wait: int, optional
+        :param timeout: Maximum time in minutes to wait for an OFFLINE product to be
+            ONLINE
+        :type timeout: int, optional
+        :param dict kwargs: The same options as :meth:`download_all`.
+                            ``max_concurrency`` (int) limits the number of products
+                            downloaded at the same time (default: ``n_concurrent_dl``,
+                            or the concurrent downloads limit of the sentinelsat API).
+        :return: A collection of absolute paths to the downloaded products
+        :rtype: list
+        """
+        self._init_api()
+
+        max_concurrency = kwargs.pop("max_concurrency", None)
+        _, stream_extract = self._pop_extract_options(kwargs)
+        product_managers = await self._run_blocking(
+            self._prepare_downloads, search_result, **kwargs
+        )
+        to_download = [
+            pm
+            for pm in product_managers
+            if pm.to_download and not pm.downloaded_by_sentinelsat
+        ]
+
+        if to_download:
+            outputs_prefix = kwargs.get("outputs_prefix") or self.config.outputs_prefix
+            downloader = self._create_downloader(
+                kwargs, progress_callback, wait, timeout
+            )
+            downloader.stream_extract = stream_extract
+            downloader.target_paths = {pm.uuid: pm.fs_path for pm in to_download}
+            dl_semaphore = asyncio.Semaphore(
+                max_concurrency or downloader.n_concurrent_dl
+            )
+            lta_semaphore = asyncio.Semaphore(self.api.concurrent_lta_trigger_limit)
+
+            tasks = [
+                asyncio.ensure_future(
+                    self._adownload_product(
+                        pm,
+                        downloader,
+                        outputs_prefix,
+                        dl_semaphore,
+                        lta_semaphore,
+                        wait,
+                        timeout,
+                        **kwargs
+                    )
+                )
+                for pm in to_download
+            ]
+            try:
+                with self._phase("download_all", products=len(to_download)):
+                    await asyncio.gather(*tasks)
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+                raise
+            if downloader.concurrency is not None:
+                self._log_download_concurrency(downloader.concurrency)
+
+        return await self._run_blocking(
+            self._finalize_downloads, product_managers, **kwargs
+        )
+
+    async def _adownload_product(
+        self,
+        product_manager,
+        downloader,
+        directory,
+        dl_semaphore,
+        lta_semaphore,
+        wait,
+        timeout,
+        **kwargs
+    ):
+        """Download a product once it is online, and extract it if required."""
+        uuid = product_manager.uuid
+        online = await self._await_online(
+            uuid, downloader, lta_semaphore, wait, timeout
+        )
+        if not online:
+            logger.error(
+                "%s failed: LTA retrieval timed out (timeout=%s minutes)", uuid, timeout
+            )
+            return
+
+        async with dl_semaphore:
+            statuses, _, product_infos = await self._run_blocking(
+                downloader.download_all, [uuid], directory
+            )
+        if statuses.get(uuid) != DownloadStatus.DOWNLOADED:
+            # The error has already been logged by the downloader
+            return
+
+        product_manager.downloaded_by_sentinelsat = True
+        product_manager.checksum = product_infos[uuid].get("checksum")
+        product_manager.finalize_future = asyncio.ensure_future(
+            self._run_blocking(
+                self._finalize_download,
+                product_manager,
+                product_infos[uuid]["path"],
+                **kwargs
+            )
+        )
+        # The extraction errors are handled by _finalize_downloads
+        await asyncio.wait([product_manager.finalize_future])
+
+    async def _await_online(self, uuid, downloader, lta_semaphore, wait, timeout):
+        """Order an OFFLINE product from the Long Term Archive and wait until it is ONLINE.
+
+        The asynchronous version of ``sentinelsat.download.Downloader._trigger_and_wait``.
+        ``lta_semaphore`` is only held while the product is ordered, so that products
+        waiting for their retrieval do not delay the ONLINE ones.
+
+        :return: True if the product is ONLINE, False if it is still OFFLINE after
+                 ``timeout`` minutes
+        :rtype: bool
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout * 60
+        triggered = False
+        while True:
+            try:
+                if await self._run_blocking(downloader.api.is_online, uuid):
+                    return True
+                if not triggered:
+                    async with lta_semaphore:
+                        triggered = await self._run_blocking(
+                            downloader.trigger_offline_retrieval, uuid
+                        )
+                    if not triggered:
+                        # The product is online
+                        return True
+                    logger.info(
+                        "%s accepted for retrieval, waiting for it to come online...",
+                        uuid,
+                    )
+            except (LTAError, ServerError) as ex:
+                logger.info(
+                    "%s retrieval was not accepted: %s. Retrying in %s minutes",
+                    uuid,
+                    ex.msg,
+                    wait,
+                )
+            if loop.time() + wait * 60 > deadline:
+                return False
+            await asyncio.sleep(wait * 60)
+
+    def _move_to_eodag_path(self, product_manager, sentinelsat_path, **kwargs):
+        """Move a product downloaded by sentinelsat to the path expected by EODAG.
+
+        EODAG and sentinelsat may have different ways of determining the download
+        file name. This makes sure that EODAG's way is applied. Archives extracted while
+        downloaded are moved to the directory where EODAG would have extracted them.
+
+        :return: The EODAG path of the product
+        :rtype: str
+        """
+        fs_path = product_manager.fs_path
+        if os.path.isdir(sentinelsat_path):
+            fs_path = fs_path.replace(kwargs.get("outputs_extension", ".zip"), "")
+        if sentinelsat_path != fs_path:
+            logger.debug(
+                "sentinelsat product path (%s) is different from EODAG's (%s),"
+                "file or directory moved to EODAG's path.",
+                sentinelsat_path,
+                fs_path,
+            )
+            start = time.monotonic()
+            with self._phase("move"):
+                shutil.move(sentinelsat_path, fs_path)
+            logger.debug("%s moved in %.1fs", fs_path, time.monotonic() - start)
+        journal = self._get_download_journal(kwargs.get("outputs_prefix"))
+        if journal is not None:
+            journal.set(product_manager.uuid, MOVED, fs_path)
+        return fs_path
+
+    def _finalize_download(self, product_manager, sentinelsat_path, **kwargs):
+        """Move a downloaded product to EODAG's path and extract it if required.
+
+        Run in the extraction pool of ``download_all`` as soon as the product is downloaded.
+
+        :return: The path to the product
+        :rtype: str
+        """
+        fs_path = self._move_to_eodag_path(product_manager, sentinelsat_path, **kwargs)
+        return self._finalize_journaled(product_manager, fs_path, **kwargs)
+
+    def _finalize_journaled(self, product_manager, fs_path, **kwargs):
+        """Call ``_finalize``, journaling the product once extracted.
+
+        :return: The path to the product
+        :rtype: str
+        """
+        with self._phase("extract"):
+            product_path = self._finalize(fs_path, **kwargs)
+        journal = self._get_download_journal(kwargs.get("outputs_prefix"))
+        if journal is not None:
+            journal.set(product_manager.uuid, EXTRACTED, product_path)
+        return product_path
+
+    def _phase(self, name, **attributes):
+        """Context manager timing a phase, doing nothing if metrics are disabled.
+
+        :param name: The phase name, see :mod:`eodag_sentinelsat.metrics`
+        :type name: str
+        :return: The context manager
+        """
+        if self.metrics is None:
+            return NULL_PHASE
+        return self.metrics.phase(name, **attributes)
+
     def _init_api(self) -> None:
         """Initialize Sentinelsat API if needed (connection and link)."""
         if not self.api:
             try:
                 logger.debug("Initializing Sentinelsat API")
-                self.api = SentinelAPI(
-                    getattr(self.config, "credentials", {}).get("username", ""),
-                    getattr(self.config, "credentials", {}).get("password", ""),
-                    self.config.endpoint,
-                )
-                # Use eodag progress bar which can be globally disabled
-                self.api._tqdm = ProgressCallback
+                with self._phase("init_api"):
+                    self.api = _get_sentinel_api(
+                        self.config.endpoint,
+                        getattr(self.config, "credentials", {}).get("username", ""),
+                        getattr(self.config, "credentials", {}).get("password", ""),
+                        pool_size=getattr(
+                            self.config, "http_pool_size", DEFAULT_HTTP_POOL_SIZE
+                        ),
+                    )
+                    self.mirrors = self._build_mirror_pool()
             except KeyError as ex:
                 raise MisconfiguredError(ex) from ex
         else:
             logger.debug("Sentinelsat API already initialized")
 
+    def _build_mirror_pool(self):
+        """Create the pool of the mirrors described by the ``mirrors`` configuration.
+
+        The configured endpoint is the first mirror of the pool. Mirrors use the
+        plugin credentials unless they have their own ones.
+
+        :return: The pool, or None if no mirror is configured
+        :rtype: :class:`~eodag_sentinelsat.mirrors.MirrorPool`
+        """
+        mirrors_config = getattr(self.config, "mirrors", None)
+        if not mirrors_config:
+            return None
+        credentials = getattr(self.config, "credentials", {})
+        apis = [self.api]
+        for mirror in mirrors_config.get("endpoints", []):
+            if isinstance(mirror, str):
+                mirror = {"endpoint": mirror}
+            mirror_credentials = mirror.get("credentials", credentials)
+            apis.append(
+                _get_sentinel_api(
+                    mirror["endpoint"],
+                    mirror_credentials.get("username", ""),
+                    mirror_credentials.get("password", ""),
+                    pool_size=getattr(
+                        self.config, "http_pool_size", DEFAULT_HTTP_POOL_SIZE
+                    ),
+                )
+            )
+        logger.debug("Using %s mirrors of %s", len(apis), self.config.endpoint)
+        return MirrorPool(
+            apis, cooldown=mirrors_config.get("cooldown", DEFAULT_MIRROR_COOLDOWN)
+        )
+
+    def _call_api(self, func, mirror=None):
+        """Call a function sending requests with the sentinelsat API.
+
+        If mirrors are configured, the API of the fastest healthy mirror is given,
+        the function being called again with the next mirrors if it fails.
+
+        :param func: Function sending requests with the given sentinelsat API
+        :type func: callable
+        :param mirror: (optional) The only mirror whose API is given
+        :type mirror: :class:`~eodag_sentinelsat.mirrors.Mirror`
+        :return: The result of the function
+        """
+        if self.mirrors is None:
+            return func(self.api)
+        return self.mirrors.call(func, mirror=mirror)
+
+    def _get_query_plan(self, product_type, **kwargs):
+        """Get the query plan of a product type, compiled once and then cached.
+
+        The cached plans are dropped when the plugin configuration is updated with
+        :meth:`update_config`, or by :meth:`clear_query_plans` after the
+        configuration has been edited in place.
+
+        :param product_type: The eodag product type
+        :type product_type: str
+        :param kwargs: Search criteria, only used for product types missing from the
+                       plugin configuration, whose plan is not cached
+        :type kwargs: dict
+        :return: The query plan
+        :rtype: :class:`_QueryPlan`
+        """
+        products = self.config.products
+        metadata_mapping = self.config.metadata_mapping
+        cacheable = product_type in products
+        plan = self._query_plans.get(product_type) if cacheable else None
+        if plan is not None:
+            return plan
+
+        provider_product_type = self.map_product_type(product_type, **kwargs)
+        product_type_def_params = self.get_product_type_def_params(
+            product_type, **kwargs
+        )
+        default_params = {
+            k: v
+            for k, v in product_type_def_params.items()
+            if k in metadata_mapping and isinstance(metadata_mapping[k], list)
+        }
+        queryables = {}
+        for key, mapping in metadata_mapping.items():
+            if not isinstance(mapping, list) or mapping[0] is None:
+                continue
+            search_param = mapping[0]
+            if not self.COMPLEX_QS_REGEX.match(search_param):
+                queryables[key] = (search_param, None)
+                continue
+            parts = search_param.split("=")
+            if len(parts) != 2:
+                # Not handled here, let build_query_string do it
+                queryables = None
+                break
+            queryables[key] = tuple(parts)
+
+        plan = _QueryPlan(provider_product_type, default_params, queryables)
+        if cacheable:
+            self._query_plans[product_type] = plan
+        return plan
+
+    def update_config(self, mapping):
+        """Update the plugin configuration, and drop the query plans compiled from it.
+
+        :param mapping: The configuration parameters to update, merged into the
+                        current ones as done by ``PluginConfig.update``
+        :type mapping: dict
+        """
+        self.config.update(mapping)
+        self.clear_query_plans()
+
+    def clear_query_plans(self):
+        """Drop the cached query plans, to be called after the configuration has been
+        edited in place instead of being updated with :meth:`update_config`."""
+        self._query_plans.clear()
+
+    def _bind_query_plan(self, plan, product_type, keywords):
+        """Build the query parameters from a query plan and the search criteria.
+
+        Gives the same result as ``QueryStringSearch.build_query_string``, which is
+        used instead if some criteria or configuration cannot be handled by the plan.
+
+        :return: The query parameters and query string
+        :rtype: tuple(dict, str)
+        """
+        keywords.pop("raise_errors", None)
+        metadata_mapping = self.config.metadata_mapping
+        if plan.queryables is None or not all(k in metadata_mapping for k in keywords):
+            return self.build_query_string(product_type, **keywords)
+
+        query_params = {}
+        for key, value in keywords.items():
+            queryable = plan.queryables.get(key)
+            if queryable is None:
+                continue
+            provider_search_key, template = queryable
+            if template is None:
+                query_params[provider_search_key] = value
+            else:
+                query_params.setdefault(provider_search_key, []).append(
+                    format_metadata(template, product_type, **keywords)
+                )
+
+        literal_search_params = getattr(self.config, "literal_search_params", {})
+        if not isinstance(literal_search_params, dict):
+            literal_search_params = {}
+        literal_search_params = dict(
+            literal_search_params, **self.format_free_text_search(**keywords)
+        )
+        for provider_search_key, provider_value in literal_search_params.items():
+            if isinstance(provider_value, list):
+                query_params.setdefault(provider_search_key, []).extend(provider_value)
+            else:
+                query_params.setdefault(provider_search_key, []).append(provider_value)
+
+        return (
+            query_params,
+            urlencode(
+                query_params, doseq=True, quote_via=lambda x, *_args, **_kwargs: x
+            ),
+        )
+
     def _update_keyword(self, **kwargs):
         """Update keywords for SentinelSat API."""
         product_type = kwargs.get("productType", None)
-        provider_product_type = self.map_product_type(product_type, **kwargs)
+        plan = self._get_query_plan(product_type, **kwargs)
+        provider_product_type = plan.provider_product_type
         keywords = {k: v for k, v in kwargs.items() if k != "auth" and v is not None}
         keywords["productType"] = provider_product_type
 
         # Add to the query, the queryable parameters set in the provider product type definition
-        product_type_def_params = self.get_product_type_def_params(
-            product_type, **kwargs
-        )
         keywords.update(
-            {
-                k: v
-                for k, v in product_type_def_params.items()
-                if (
-                    k not in keywords.keys()
-                    and k in self.config.metadata_mapping.keys()
-                    and isinstance(self.config.metadata_mapping[k], list)
-                )
-            }
+            {k: v for k, v in plan.default_params.items() if k not in keywords}
         )
-        qp, qs = self.build_query_string(product_type, **keywords)
+        qp, qs = self._bind_query_plan(plan, product_type, keywords)
 
         # If we were not able to build query params but have search criteria, this means
         # the provider does not support the search criteria given. If so, stop searching
@@ -488,6 +3195,18 @@ class SentinelsatAPI(Api, QueryStringSearch, Download):
         # Footprint
         if "area" in qp and isinstance(qp["area"], list):
             qp["area"] = qp["area"][0]
+        # eodag shortens the long geometries by simplifying them, which misses the
+        # products near their boundaries: the simplifier searches a geometry covering
+        # the original one instead, see _query_page
+        geom = kwargs.get("geometry")
+        if (
+            self.footprint_simplifier is not None
+            and "area" in qp
+            and isinstance(geom, BaseGeometry)
+        ):
+            area = self.footprint_simplifier.dumps(geom)
+            if self.footprint_simplifier.replaces(area, qp.get("area_relation")):
+                qp["area"] = area
 
         # id
         if "filename" in qp:
@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+# eodag-sentinelsat, a plugin for searching and downloading products from Copernicus Scihub
+#     Copyright 2021, CS GROUP - France, https://www.csgroup.eu/
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""Simplification of the search geometries sent to the hub.
+
+Detailed geometries, like administrative boundaries, make long query strings that
+are slow to process on the hub, or rejected. When the WKT of a search geometry is
+longer than ``max_length``, a simpler geometry covering it is searched instead:
+
+1. the geometry without its redundant vertices, its coordinates being rounded,
+2. the geometry enlarged then simplified with a growing tolerance,
+3. its convex hull,
+4. its bounding box, rounded outwards.
+
+A candidate is only searched if, once its coordinates are rounded, it still covers the
+original geometry.
+
+As the simpler geometry covers the original one, the hub returns all the products
+matching the search, and some others: the results are filtered on the client against
+the original geometry. The simplified geometries are cached by geometry hash.
+"""
+
+import hashlib
+import logging as py_logging
+import math
+import threading
+from collections import OrderedDict
+
+from shapely import wkt
+from shapely.geometry import box
+from shapely.prepared import prep
+
+logger = py_logging.getLogger("eodag.plugins.apis.sentinelsat")
+
+# Length of the WKT of a search geometry above which it is simplified, in characters
+DEFAULT_MAX_AREA_LENGTH = 2000
+# First tolerance of the simplification, in degrees, doubled until the WKT is short
+DEFAULT_SIMPLIFY_TOLERANCE = 0.001
+# Number of times the tolerance is doubled before falling back to the convex hull
+DEFAULT_SIMPLIFY_STEPS = 8
+# Decimals of the coordinates of the simplified geometries
+DEFAULT_AREA_PRECISION = 6
+DEFAULT_SIMPLIFY_CACHE_SIZE = 128  # entries
+# Mitre joins, which do not add vertices at the corners of the enlarged geometries
+_MITRE_JOIN = 2
+
+# Predicates of the sentinelsat area relations for which searching a larger
+# geometry returns a superset of the results, between the original geometry
+# (prepared) and a footprint
+_FILTER_RELATIONS = {
+    "intersects": lambda area, footprint: area.intersects(footprint),
+    "iswithin": lambda area, footprint: area.contains(footprint),
+}
+
+
+class SimplifiedArea(object):
+    """A search geometry, and the one sent to the hub instead.
+
+    :param wkt: WKT of the geometry sent to the hub
+    :type wkt: str
+    :param method: How the geometry was simplified: ``none`` (unchanged),
+                   ``vertices``, ``simplify``, ``convex_hull`` or ``envelope``
+    :type method: str
+    :param original: (optional) The original geometry, to filter the results on.
+                     None if the geometry is unchanged
+    :type original: :class:`shapely.geometry.base.BaseGeometry`
+    :param relation: (optional) The sentinelsat area relation of the search
+    :type relation: str
+    """
+
+    def __init__(self, wkt, method, original=None, relation="Intersects"):
+        self.wkt = wkt
+        self.method = method
+        self.original = original
+        self._predicate = None
+        if original is not None:
+            prepared = prep(original)
+            predicate = _FILTER_RELATIONS[relation.lower()]
+            self._predicate = lambda footprint: predicate(prepared, footprint)
+
+    def filter(self, results):
+        """Keep the results matching the original geometry.
+
+        :param results: sentinelsat products properties indexed by uuid
+        :type results: dict
+        :return: The results whose ``footprint`` matches the original geometry, and
+                 those without footprint
+        :rtype: dict
+        """
+        if self._predicate is None:
+            return results
+        return {
+            uuid: result
+            for uuid, result in results.items()
+            if not result.get("footprint")
+            or self._predicate(wkt.loads(result["footprint"]))
+        }
+
+
+class FootprintSimplifier(object):
+    """Simplifier of the search geometries, with a LRU cache by geometry hash.
+
+    :param max_length: (optional) Length of the WKT above which a geometry is
+                       simplified, in characters
+    :type max_length: int
+    :param tolerance: (optional) First tolerance of the simplification, in degrees
+    :type tolerance: float
+    :param steps: (optional) Number of times the tolerance is doubled before falling
+                  back to the convex hull
+    :type steps: int
+    :param precision: (optional) Decimals of the coordinates of the simplified
+                      geometries
+    :type precision: int
+    :param cache_size: (optional) Maximum number of simplified geometries kept
+    :type cache_size: int
+    """
+
+    def __init__(
+        self,
+        max_length=DEFAULT_MAX_AREA_LENGTH,
+        tolerance=DEFAULT_SIMPLIFY_TOLERANCE,
+        steps=DEFAULT_SIMPLIFY_STEPS,
+        precision=DEFAULT_AREA_PRECISION,
+        cache_size=DEFAULT_SIMPLIFY_CACHE_SIZE,
+    ):
+        self.max_length = max_length
+        self.tolerance = tolerance
+        self.steps = steps
+        self.precision = precision
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def simplify(self, area, relation=None):
+        """Get the geometry to send to the hub instead of a search geometry.
+
+        :param area: WKT of the search geometry
+        :type area: str
+        :param relation: (optional) The sentinelsat area relation of the search
+                         (default: ``Intersects``). Geometries searched with the
+                         ``Contains`` relation are not simplified, as a larger
+                         geometry would miss results
+        :type relation: str
+        :return: The geometry to send
+        :rtype: :class:`SimplifiedArea`
+        """
+        relation = relation or "Intersects"
+        if not self.replaces(area, relation):
+            return SimplifiedArea(area, "none")
+        key = hashlib.sha256(("%s|%s" % (relation, area)).encode("utf-8")).hexdigest()
+        with self._lock:
+            simplified = self._cache.get(key)
+            if simplified is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return simplified
+            self.misses += 1
+        original = wkt.loads(area)
+        simplified_wkt, method = self._simplify(original)
+        simplified = SimplifiedArea(
+            simplified_wkt, method, original=original, relation=relation
+        )
+        logger.debug(
+            "Search geometry simplified (%s) from %s to %s characters",
+            method,
+            len(area),
+            len(simplified.wkt),
+        )
+        with self._lock:
+            self._cache[key] = simplified
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return simplified
+
+    def replaces(self, area, relation=None):
+        """Whether a search geometry is replaced by a simpler one.
+
+        :param area: WKT of the search geometry
+        :type area: str
+        :param relation: (optional) The sentinelsat area relation of the search
+                         (default: ``Intersects``)
+        :type relation: str
+        :return: True if :meth:`simplify` searches another geometry
+        :rtype: bool
+        """
+        relation = relation or "Intersects"
+        return len(area) > self.max_length and relation.lower() in _FILTER_RELATIONS
+
+    def _simplify(self, geom):
+        """Find a geometry covering the given one, with a WKT short enough.
+
+        :return: The WKT of the geometry, and how it was simplified
+        :rtype: tuple
+        """
+        for method, candidate in self._candidates(geom):
+            area = self.dumps(candidate)
+            # Rounded coordinates may leave parts of the original geometry out
+            if len(area) <= self.max_length and wkt.loads(area).covers(geom):
+                return area, method
+        return self.dumps(self._envelope(geom)), "envelope"
+
+    def _candidates(self, geom):
+        """The simpler geometries tried, with how they were simplified."""
+        yield "vertices", geom.simplify(0)
+        tolerance = self.tolerance
+        for _ in range(self.steps):
+            yield "simplify", geom.buffer(tolerance, join_style=_MITRE_JOIN).simplify(
+                tolerance
+            )
+            tolerance *= 2
+        yield "convex_hull", geom.convex_hull
+
+    def _envelope(self, geom):
+        """The bounding box of a geometry, its coordinates being rounded outwards."""
+        factor = 10**self.precision
+        minx, miny, maxx, maxy = geom.bounds
+        return box(
+            math.floor(minx * factor) / factor,
+            math.floor(miny * factor) / factor,
+            math.ceil(maxx * factor) / factor,
+            math.ceil(maxy * factor) / factor,
+        )
+
+    def dumps(self, geom):
+        """Get the WKT of a geometry, its coordinates being rounded to ``precision``.
+
+        :param geom: The geometry
+        :type geom: :class:`shapely.geometry.base.BaseGeometry`
+        :return: The WKT
+        :rtype: str
+        """
+        return wkt.dumps(geom, rounding_precision=self.precision, trim=True)
+
+    def stats(self):
+        """Cache usage statistics.
+
+        :return: The number of hits and misses
+        :rtype: dict
+        """
+        return {"hits": self.hits, "misses": self.misses}
+
+
+def build_footprint_simplifier(simplify_config):
+    """Create the geometry simplifier described by a plugin configuration.
+
+    :param simplify_config: ``footprint_simplification`` plugin configuration, with
+                            the optional keys ``max_length``, ``tolerance``,
+                            ``steps``, ``precision`` and ``cache_size``
+    :type simplify_config: dict
+    :return: The simplifier, or None if no configuration is given
+    :rtype: :class:`FootprintSimplifier`
+    """
+    if not simplify_config:
+        return None
+    if simplify_config is True:
+        simplify_config = {}
+    return FootprintSimplifier(
+        max_length=simplify_config.get("max_length", DEFAULT_MAX_AREA_LENGTH),
+        tolerance=simplify_config.get("tolerance", DEFAULT_SIMPLIFY_TOLERANCE),
+        steps=simplify_config.get("steps", DEFAULT_SIMPLIFY_STEPS),
+        precision=simplify_config.get("precision", DEFAULT_AREA_PRECISION),
+        cache_size=simplify_config.get("cache_size", DEFAULT_SIMPLIFY_CACHE_SIZE),
+    )
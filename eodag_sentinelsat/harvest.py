@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+# eodag-sentinelsat, a plugin for searching and downloading products from Copernicus Scihub
+#     Copyright 2021, CS GROUP - France, https://www.csgroup.eu/
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""Watermarks of the incremental harvests of the Sentinelsat plugin.
+
+A harvest searches the products ingested by the hub since its last run. Its
+watermark is the latest ingestion date of the products it found. As products may be
+published by the hub some time after their ingestion date, each run searches again
+the products ingested during an ``overlap`` before the watermark: the uuids of the
+products harvested during this overlap are kept, so that they are not returned twice.
+"""
+
+import logging as py_logging
+import time
+from datetime import timedelta
+
+from eodag_sentinelsat.store import (
+    SQLiteStore,
+    format_date,
+    parse_date,
+    store_options,
+    store_path,
+)
+
+logger = py_logging.getLogger("eodag.plugins.apis.sentinelsat")
+
+# Name of the database created in the outputs_prefix directory by default
+DEFAULT_HARVEST_DB = ".harvest.sqlite"
+# Seconds before the watermark searched again, for the products published late
+DEFAULT_HARVEST_OVERLAP = 3600
+
+
+class HarvestWatermarks(SQLiteStore):
+    """Watermarks of the harvests, stored in a SQLite database.
+
+    :param path: Path to the database file, created if needed
+    :type path: str
+    :param overlap: (optional) Seconds before the watermark searched again
+    :type overlap: float
+    """
+
+    def __init__(self, path, overlap=DEFAULT_HARVEST_OVERLAP):
+        self.overlap = timedelta(seconds=overlap)
+        super().__init__(path)
+
+    def _create_tables(self):
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS watermarks ("
+            "name TEXT PRIMARY KEY, "
+            "watermark TEXT, "
+            "updated_at REAL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS harvested ("
+            "name TEXT, "
+            "uuid TEXT, "
+            "ingestiondate TEXT, "
+            "PRIMARY KEY (name, uuid)) WITHOUT ROWID"
+        )
+
+    def get(self, name):
+        """Get the watermark of a harvest.
+
+        :param name: The harvest name
+        :type name: str
+        :return: The latest ingestion date of the products harvested, None if the
+                 harvest never ran
+        :rtype: datetime
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT watermark FROM watermarks WHERE name = ?", (name,)
+            ).fetchone()
+        return parse_date(row[0]) if row else None
+
+    def start(self, name):
+        """The ingestion date from which the next run of a harvest searches products.
+
+        :param name: The harvest name
+        :type name: str
+        :return: The watermark minus the overlap, None if the harvest never ran
+        :rtype: datetime
+        """
+        watermark = self.get(name)
+        return None if watermark is None else watermark - self.overlap
+
+    def harvested(self, name, uuids):
+        """Get the products already harvested among the given ones.
+
+        Only the products ingested during the overlap before the watermark are known.
+
+        :param name: The harvest name
+        :type name: str
+        :param uuids: Products uuids
+        :type uuids: list
+        :return: The uuids of the products already harvested
+        :rtype: set
+        """
+        rows = self._select_in(
+            "SELECT uuid FROM harvested WHERE name = ? AND uuid IN (%s)",
+            uuids,
+            params=(name,),
+        )
+        return {row[0] for row in rows}
+
+    def advance(self, name, products):
+        """Record harvested products, and move the watermark to their ingestion dates.
+
+        The watermark never goes back. The products ingested before the overlap are
+        forgotten, in the same transaction.
+
+        :param name: The harvest name
+        :type name: str
+        :param products: ``(uuid, ingestion date)`` of the products harvested
+        :type products: list(tuple)
+        """
+        rows = [(name, uuid, format_date(date)) for uuid, date in products]
+        if not rows:
+            return
+        latest = max(row[2] for row in rows)
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO harvested VALUES (?, ?, ?)", rows
+            )
+            self._conn.execute(
+                "INSERT OR IGNORE INTO watermarks VALUES (?, ?, ?)",
+                (name, latest, time.time()),
+            )
+            self._conn.execute(
+                "UPDATE watermarks SET watermark = max(watermark, ?), updated_at = ? "
+                "WHERE name = ?",
+                (latest, time.time(), name),
+            )
+            watermark = self._conn.execute(
+                "SELECT watermark FROM watermarks WHERE name = ?", (name,)
+            ).fetchone()[0]
+            horizon = parse_date(watermark) - self.overlap
+            self._conn.execute(
+                "DELETE FROM harvested WHERE name = ? AND ingestiondate < ?",
+                (name, format_date(horizon)),
+            )
+
+    def reset(self, name):
+        """Forget a harvest, its next run searching all the products again.
+
+        :param name: The harvest name
+        :type name: str
+        """
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM watermarks WHERE name = ?", (name,))
+            self._conn.execute("DELETE FROM harvested WHERE name = ?", (name,))
+
+
+def build_harvest_watermarks(harvest_config, outputs_prefix):
+    """Create the harvest watermarks store described by a plugin configuration.
+
+    :param harvest_config: ``harvest`` plugin configuration, a dict with the optional
+                           ``path`` of the database and the ``overlap`` in seconds
+    :type harvest_config: dict
+    :param outputs_prefix: The directory where the database is created by default
+    :type outputs_prefix: str
+    :return: The watermarks store
+    :rtype: :class:`HarvestWatermarks`
+    """
+    options = store_options(harvest_config)
+    return HarvestWatermarks(
+        store_path(options, outputs_prefix, DEFAULT_HARVEST_DB),
+        overlap=options.get("overlap", DEFAULT_HARVEST_OVERLAP),
+    )
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+# eodag-sentinelsat, a plugin for searching and downloading products from Copernicus Scihub
+#     Copyright 2021, CS GROUP - France, https://www.csgroup.eu/
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""Journal of the downloads in progress, to resume them after a crash.
+
+Each product of a download is journaled with the last stage it reached, and the path
+of its data at that stage:
+
+* ``queued``: to be downloaded to the path
+* ``downloading``: partially downloaded, sentinelsat resumes the download of the
+  ``<path>.incomplete`` file with an HTTP range request
+* ``verified``: fully downloaded to the path and its checksum checked
+* ``moved``: moved to the path expected by eodag
+* ``extracted``: extracted, the path being the one returned by eodag
+
+The journal entries are removed once the download of the products is recorded.
+"""
+
+import logging as py_logging
+import os
+import shutil
+import time
+
+from eodag_sentinelsat.store import SQLiteStore, store_options, store_path
+
+logger = py_logging.getLogger("eodag.plugins.apis.sentinelsat")
+
+# Name of the database created in the outputs_prefix directory by default
+DEFAULT_JOURNAL_DB = ".download_journal.sqlite"
+
+QUEUED = "queued"
+DOWNLOADING = "downloading"
+VERIFIED = "verified"
+MOVED = "moved"
+EXTRACTED = "extracted"
+
+
+class DownloadJournal(SQLiteStore):
+    """Download journal stored in a SQLite database.
+
+    Every stage change is committed at once, and synced to disk with the default
+    ``synchronous`` pragma of SQLite, so that the journal survives a crash.
+
+    :param path: Path to the database file, created if needed
+    :type path: str
+    """
+
+    synchronous = None
+
+    def _create_tables(self):
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS journal ("
+            "uuid TEXT PRIMARY KEY, "
+            "stage TEXT, "
+            "path TEXT, "
+            "bytes INTEGER, "
+            "updated_at REAL)"
+        )
+
+    def lookup(self, uuids):
+        """Get the journal entries among the given products.
+
+        :param uuids: Product uuids
+        :type uuids: list
+        :return: The entries found, as a dict of uuid to ``(stage, path, bytes)``
+        :rtype: dict
+        """
+        rows = self._select_in(
+            "SELECT uuid, stage, path, bytes FROM journal WHERE uuid IN (%s)", uuids
+        )
+        return {uuid: (stage, path, nbytes) for uuid, stage, path, nbytes in rows}
+
+    def set(self, uuid, stage, path, nbytes=None):
+        """Journal the stage reached by a product.
+
+        :param uuid: The product uuid
+        :type uuid: str
+        :param stage: The stage reached
+        :type stage: str
+        :param path: The path of the product data at this stage
+        :type path: str
+        :param nbytes: (optional) The number of bytes already downloaded
+        :type nbytes: int
+        """
+        self.set_many([(uuid, stage, path, nbytes)])
+
+    def set_many(self, entries):
+        """Journal the stages reached by several products, in a single transaction.
+
+        :param entries: ``(uuid, stage, path, bytes)`` tuples
+        :type entries: list
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO journal VALUES (?, ?, ?, ?, ?)",
+                [entry + (now,) for entry in entries],
+            )
+
+    def remove(self, uuids):
+        """Remove the entries of products, in a single transaction.
+
+        :param uuids: Product uuids
+        :type uuids: list
+        """
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM journal WHERE uuid = ?", [(uuid,) for uuid in uuids]
+            )
+
+
+def build_download_journal(journal_config, outputs_prefix):
+    """Create the download journal described by a plugin configuration.
+
+    :param journal_config: ``download_journal`` plugin configuration, either ``true``
+                           or a dict with the optional ``path`` of the database
+    :type journal_config: bool or dict
+    :param outputs_prefix: The directory where products are downloaded
+    :type outputs_prefix: str
+    :return: The journal, or None if downloads are not journaled
+    :rtype: :class:`DownloadJournal`
+    """
+    if not journal_config:
+        return None
+    return DownloadJournal(
+        store_path(store_options(journal_config), outputs_prefix, DEFAULT_JOURNAL_DB)
+    )
+
+
+def remove_partial_extraction(fs_path, extract=True, outputs_extension=".zip"):
+    """Remove what may have been extracted from an archive before a crash.
+
+    eodag does not extract again a product whose destination directory is not
+    empty: the directory is removed if the download journal shows that the
+    extraction of the archive did not end.
+
+    :param fs_path: The path of the downloaded archive
+    :type fs_path: str
+    :param extract: (optional) Whether the archive is extracted
+    :type extract: bool
+    :param outputs_extension: (optional) The archive extension
+    :type outputs_extension: str
+    """
+    if not extract or not fs_path or not os.path.isfile(fs_path):
+        return
+    if outputs_extension not in fs_path:
+        return
+    product_path = fs_path[: fs_path.index(outputs_extension)]
+    if os.path.isdir(product_path):
+        logger.info("Remove partially extracted product: %s", product_path)
+        shutil.rmtree(product_path)
@@ -0,0 +1,487 @@
+# -*- coding: utf-8 -*-
+# eodag-sentinelsat, a plugin for searching and downloading products from Copernicus Scihub
+#     Copyright 2021, CS GROUP - France, https://www.csgroup.eu/
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""Scheduler of the orders of OFFLINE products from the Long Term Archive (LTA).
+
+Instead of blocking until the OFFLINE products of a download are restored, products
+are queued in the scheduler which returns a future per product. A background thread
+orders OFFLINE products without exceeding the per-user quota of the provider, polls
+the storage status of all the pending products at once, and downloads each product
+as soon as it is ONLINE.
+
+The queue is kept in a SQLite database, so that pending orders survive process
+restarts: they are loaded again when the scheduler is created.
+"""
+
+import json
+import logging as py_logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import requests
+from eodag.api.product import EOProduct
+from eodag.api.search_result import SearchResult
+from eodag.utils.exceptions import DownloadError
+from sentinelsat.exceptions import (
+    InvalidKeyError,
+    LTAError,
+    SentinelAPIError,
+    ServerError,
+)
+from shapely import geometry
+
+from eodag_sentinelsat.store import SQLiteStore
+
+logger = py_logging.getLogger("eodag.plugins.apis.sentinelsat")
+
+# Name of the queue database created in the outputs_prefix directory by default
+DEFAULT_LTA_QUEUE = ".lta_queue.sqlite"
+# Seconds between two checks of the storage status of the pending products
+DEFAULT_LTA_POLL_INTERVAL = 60
+# Number of products downloaded at the same time once ONLINE
+DEFAULT_LTA_DOWNLOAD_WORKERS = 4
+# Number of failed downloads of a product after which it is given up
+DEFAULT_LTA_MAX_ATTEMPTS = 3
+
+QUEUED = "queued"
+ORDERED = "ordered"
+DOWNLOADING = "downloading"
+
+
+def _product_to_json(product):
+    """Serialize a product, to be stored in the queue."""
+    feature = product.as_dict()
+    return json.dumps(feature, default=str)
+
+
+def _product_from_json(data):
+    """Build a product stored in the queue, like ``EOProduct.from_geojson``."""
+    feature = json.loads(data)
+    properties = feature["properties"]
+    properties["geometry"] = feature["geometry"]
+    properties["id"] = feature["id"]
+    product = EOProduct(
+        properties["eodag_provider"],
+        properties,
+        productType=properties["eodag_product_type"],
+    )
+    if properties.get("eodag_search_intersection") is not None:
+        product.search_intersection = geometry.shape(
+            properties["eodag_search_intersection"]
+        )
+    return product
+
+
+class _Order(object):
+    """A product in the queue of the scheduler."""
+
+    def __init__(
+        self,
+        uuid,
+        product,
+        download_kwargs,
+        status=QUEUED,
+        ordered_at=None,
+        attempts=0,
+    ):
+        self.uuid = uuid
+        self.product = product
+        self.download_kwargs = download_kwargs
+        self.status = status
+        self.ordered_at = ordered_at
+        # Failed downloads
+        self.attempts = attempts
+        self.future = Future()
+
+
+class LTAScheduler(SQLiteStore):
+    """Order OFFLINE products from the LTA and download all products once ONLINE.
+
+    The lock of the queue database also guards the orders held in memory.
+
+    :param plugin: The plugin used to check the storage status of the products and to
+                   download them
+    :type plugin: :class:`~eodag_sentinelsat.eodag_sentinelsat.SentinelsatAPI`
+    :param queue_path: Path to the queue database, created if needed
+    :type queue_path: str
+    :param max_orders: (optional) Maximum number of products ordered and not yet
+                       ONLINE at the same time (default: the concurrent LTA
+                       retrievals limit of the sentinelsat API)
+    :type max_orders: int
+    :param poll_interval: (optional) Seconds between two checks of the storage status
+                          of the pending products
+    :type poll_interval: float
+    :param download_workers: (optional) Number of products downloaded at the same time
+    :type download_workers: int
+    :param timeout: (optional) Minutes after which an ordered product still OFFLINE is
+                    given up, never by default
+    :type timeout: float
+    :param max_attempts: (optional) Number of failed downloads of a product after which
+                         it is given up. A product is queued again after each failure
+                         before that
+    :type max_attempts: int
+    """
+
+    # Pending orders must survive a power loss
+    synchronous = None
+
+    def __init__(
+        self,
+        plugin,
+        queue_path,
+        max_orders=None,
+        poll_interval=DEFAULT_LTA_POLL_INTERVAL,
+        download_workers=DEFAULT_LTA_DOWNLOAD_WORKERS,
+        timeout=None,
+        max_attempts=DEFAULT_LTA_MAX_ATTEMPTS,
+    ):
+        self.plugin = plugin
+        self.max_orders = max_orders
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self._orders = {}
+        self._wakeup = threading.Event()
+        self._closed = threading.Event()
+        self._thread = None
+        self._download_executor = ThreadPoolExecutor(
+            max_workers=download_workers, thread_name_prefix="lta-download"
+        )
+
+        super().__init__(queue_path)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT uuid, product, download_kwargs, status, ordered_at, attempts "
+                "FROM orders"
+            ).fetchall()
+        for uuid, product, download_kwargs, status, ordered_at, attempts in rows:
+            self._orders[uuid] = _Order(
+                uuid,
+                _product_from_json(product),
+                json.loads(download_kwargs),
+                status=status,
+                ordered_at=ordered_at,
+                attempts=attempts or 0,
+            )
+        if rows:
+            logger.info("%s pending LTA orders loaded from %s", len(rows), queue_path)
+
+    def _create_tables(self):
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS orders ("
+            "uuid TEXT PRIMARY KEY, "
+            "product TEXT, "
+            "download_kwargs TEXT, "
+            "status TEXT, "
+            "ordered_at REAL, "
+            "attempts INTEGER DEFAULT 0)"
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(orders)")]
+        if "attempts" not in columns:
+            # Queue created by a previous version
+            self._conn.execute(
+                "ALTER TABLE orders ADD COLUMN attempts INTEGER DEFAULT 0"
+            )
+
+    @property
+    def closed(self):
+        """Whether the scheduler has been closed."""
+        return self._closed.is_set()
+
+    def submit(self, product, **kwargs):
+        """Queue a product, to be downloaded once ONLINE.
+
+        A product already in the queue is not queued twice, the future of the pending
+        order is returned instead.
+
+        :param product: The product to download
+        :type product: :class:`~eodag.api.product._product.EOProduct`
+        :param kwargs: Download options, as given to ``download_all``. They must be
+                       JSON serializable to be kept in the queue, except
+                       ``progress_callback`` which is ignored.
+        :return: The future of the path to the downloaded product
+        :rtype: :class:`concurrent.futures.Future`
+        :raises: :class:`ValueError` if the download options can not be serialized
+        :raises: :class:`RuntimeError` if the scheduler is closed
+        """
+        return self.submit_all([product], **kwargs)[0]
+
+    def submit_all(self, products, **kwargs):
+        """Queue several products, to be downloaded once ONLINE.
+
+        :param products: The products to download
+        :type products: list
+        :param kwargs: Download options, as given to ``download_all``, see
+                       :meth:`submit`
+        :return: The futures of the paths to the downloaded products, in the same order
+        :rtype: list
+        :raises: :class:`ValueError` if the download options can not be serialized
+        :raises: :class:`RuntimeError` if the scheduler is closed
+        """
+        kwargs = dict(kwargs)
+        if kwargs.pop("progress_callback", None) is not None:
+            logger.debug("progress_callback ignored by the LTA scheduler downloads")
+        try:
+            download_kwargs = json.dumps(kwargs)
+        except (TypeError, ValueError) as ex:
+            raise ValueError(
+                "LTA scheduler download options must be JSON serializable: %s" % ex
+            )
+        # The queue is updated with the decoded options, like the restored orders
+        kwargs = json.loads(download_kwargs)
+
+        futures = []
+        rows = []
+        with self._lock:
+            if self.closed:
+                raise RuntimeError("The LTA scheduler is closed")
+            for product in products:
+                uuid = product.properties["uuid"]
+                order = self._orders.get(uuid)
+                if order is None:
+                    order = _Order(uuid, product, kwargs)
+                    self._orders[uuid] = order
+                    rows.append(
+                        (uuid, _product_to_json(product), download_kwargs, QUEUED)
+                    )
+                futures.append(order.future)
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO orders VALUES (?, ?, ?, ?, NULL, 0)", rows
+                )
+        self.start()
+        self._wakeup.set()
+        return futures
+
+    def pending(self):
+        """The products queued and not downloaded yet, including restored orders.
+
+        :return: The futures of the paths to the downloaded products, by uuid
+        :rtype: dict
+        """
+        with self._lock:
+            return {uuid: order.future for uuid, order in self._orders.items()}
+
+    def start(self):
+        """Start the scheduler thread, if not already started."""
+        with self._lock:
+            if self._thread is None and not self._closed.is_set():
+                self._thread = threading.Thread(
+                    target=self._run, name="lta-scheduler", daemon=True
+                )
+                self._thread.start()
+
+    def close(self, wait=True):
+        """Stop the scheduler. Pending orders are kept in the queue.
+
+        :param wait: (optional) Wait for the downloads in progress to end
+        :type wait: bool
+        """
+        self._closed.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._download_executor.shutdown(wait=wait)
+        super().close()
+
+    def _run(self):
+        while not self._closed.is_set():
+            try:
+                self.poll()
+            except Exception as ex:
+                logger.error("LTA scheduler: %s", ex)
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def poll(self):
+        """Check the storage status of all the pending products at once, download
+        ONLINE products and order OFFLINE ones, within the quota.
+
+        Called periodically by the scheduler thread.
+        """
+        with self._lock:
+            waiting = [o for o in self._orders.values() if o.status != DOWNLOADING]
+        if not waiting:
+            return
+
+        self.plugin._init_api()
+        # Orders are sent to the first healthy mirror, if configured
+        api = (
+            self.plugin.api if self.plugin.mirrors is None else self.plugin.mirrors.api
+        )
+        statuses = self._get_online_statuses(waiting)
+        waiting = [o for o in waiting if not o.future.done()]
+        for order in waiting:
+            if statuses.get(order.uuid):
+                self._download(order)
+
+        now = time.time()
+        ordered = [o for o in waiting if o.status == ORDERED]
+        for order in ordered:
+            if self.timeout is not None and now - order.ordered_at > self.timeout * 60:
+                self._fail(
+                    order,
+                    LTAError(
+                        "LTA retrieval for %s timed out (timeout=%s minutes)"
+                        % (order.uuid, self.timeout)
+                    ),
+                )
+
+        max_orders = self.max_orders or api.concurrent_lta_trigger_limit
+        available = max_orders - len([o for o in ordered if not o.future.done()])
+        to_order = [
+            o for o in waiting if o.status == QUEUED and statuses.get(o.uuid) is False
+        ]
+        for order in to_order[:available]:
+            try:
+                triggered = api.trigger_offline_retrieval(order.uuid)
+            except (LTAError, ServerError) as ex:
+                # Quota exceeded or server overloaded, retry at the next poll
+                logger.info(
+                    "%s retrieval was not accepted: %s. Retrying in %s seconds",
+                    order.uuid,
+                    ex.msg,
+                    self.poll_interval,
+                )
+                break
+            if triggered:
+                logger.info("%s accepted for retrieval", order.uuid)
+                self._set_status(order, ORDERED, ordered_at=time.time())
+            else:
+                # Online in the meantime
+                self._download(order)
+
+    def _get_online_statuses(self, orders):
+        """Storage status of the ordered products, checked one by one when OData fails.
+
+        Products whose status is still unknown are left out, to be checked again at
+        the next poll. The orders of the products unknown to the provider fail.
+        """
+        statuses = self.plugin._get_online_statuses([o.uuid for o in orders])
+        for order in orders:
+            if order.uuid in statuses:
+                continue
+            try:
+                statuses[order.uuid] = self.plugin._is_online(order.uuid)
+            except InvalidKeyError as ex:
+                self._fail(order, ex)
+            except (SentinelAPIError, requests.RequestException) as ex:
+                logger.warning(
+                    "Storage status of %s unknown, checked again in %s seconds: %s",
+                    order.uuid,
+                    self.poll_interval,
+                    ex,
+                )
+        return statuses
+
+    def _download(self, order):
+        self._set_status(order, DOWNLOADING)
+        self._download_executor.submit(self._download_order, order)
+
+    def _download_order(self, order):
+        kwargs = dict(order.download_kwargs)
+        # The product is ONLINE, do not wait for it if it went OFFLINE in the meantime
+        kwargs.setdefault("timeout", self.poll_interval / 60)
+        kwargs.setdefault("wait", self.poll_interval / 60)
+        try:
+            paths = self.plugin.download_all(SearchResult([order.product]), **kwargs)
+        except Exception as ex:
+            self._fail(order, ex)
+            return
+        if not paths:
+            # The error has already been logged by download_all
+            attempts = order.attempts + 1
+            if attempts >= self.max_attempts:
+                self._fail(
+                    order,
+                    DownloadError(
+                        "%s could not be downloaded after %s attempts"
+                        % (order.uuid, attempts)
+                    ),
+                )
+                return
+            # Probably OFFLINE again, it will be ordered again
+            logger.warning(
+                "%s could not be downloaded, queued again (attempt %s of %s)",
+                order.uuid,
+                attempts,
+                self.max_attempts,
+            )
+            self._set_status(order, QUEUED, ordered_at=None, attempts=attempts)
+            self._wakeup.set()
+            return
+        self._remove(order)
+        order.future.set_result(paths[0])
+
+    def _fail(self, order, exception):
+        logger.error("%s failed: %s", order.uuid, exception)
+        self._remove(order)
+        order.future.set_exception(exception)
+
+    def _set_status(self, order, status, **columns):
+        with self._lock:
+            order.status = status
+            if "ordered_at" in columns:
+                order.ordered_at = columns["ordered_at"]
+            if "attempts" in columns:
+                order.attempts = columns["attempts"]
+            if self._closed.is_set():
+                return
+            with self._conn:
+                # Downloads in progress are restarted from the queued state
+                self._conn.execute(
+                    "UPDATE orders SET status = ?, ordered_at = ?, attempts = ? "
+                    "WHERE uuid = ?",
+                    (
+                        ORDERED if order.ordered_at is not None else QUEUED,
+                        order.ordered_at,
+                        order.attempts,
+                        order.uuid,
+                    ),
+                )
+
+    def _remove(self, order):
+        with self._lock:
+            self._orders.pop(order.uuid, None)
+            if self._closed.is_set():
+                return
+            with self._conn:
+                self._conn.execute("DELETE FROM orders WHERE uuid = ?", (order.uuid,))
+
+
+def build_lta_scheduler(plugin, scheduler_config, outputs_prefix):
+    """Create the LTA scheduler described by a plugin configuration.
+
+    :param plugin: The plugin used by the scheduler
+    :type plugin: :class:`~eodag_sentinelsat.eodag_sentinelsat.SentinelsatAPI`
+    :param scheduler_config: ``lta_scheduler`` plugin configuration, with the optional
+                             keys ``queue`` (path of the queue database),
+                             ``max_orders``, ``poll_interval``, ``download_workers``,
+                             ``timeout`` and ``max_attempts``
+    :type scheduler_config: dict
+    :param outputs_prefix: The directory where products are downloaded, where the
+                           queue database is created by default
+    :type outputs_prefix: str
+    :return: The scheduler
+    :rtype: :class:`LTAScheduler`
+    """
+    scheduler_config = dict(scheduler_config or {})
+    queue_path = scheduler_config.pop("queue", None) or os.path.join(
+        os.path.abspath(outputs_prefix), DEFAULT_LTA_QUEUE
+    )
+    return LTAScheduler(plugin, os.path.expanduser(queue_path), **scheduler_config)
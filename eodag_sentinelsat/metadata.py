@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+# eodag-sentinelsat, a plugin for searching and downloading products from Copernicus Scihub
+#     Copyright 2021, CS GROUP - France, https://www.csgroup.eu/
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""Extraction of the product properties from sentinelsat results."""
+
+import ast
+import re
+from datetime import date
+
+from eodag.api.product.metadata_mapping import (
+    NOT_AVAILABLE,
+    SEP,
+    format_metadata,
+    properties_from_json,
+)
+from jsonpath_ng.jsonpath import Child, Fields, Root
+
+# Templates in metadata mapping values, as detected by properties_from_json
+_TEMPLATE_PATTERN = re.compile(r"({[^{}]+})+")
+# First characters of the strings that ast.literal_eval may parse
+_LITERAL_FIRST_CHARS = frozenset("0123456789.+-'\"[({")
+
+
+def may_be_literal(value):
+    """Whether ``ast.literal_eval`` may succeed on a string, checked without parsing it.
+
+    Most sentinelsat values (titles, identifiers, WKT, ...) can not be Python
+    literals, and telling it from their first character is much cheaper than
+    compiling them.
+    """
+    stripped = value.lstrip()
+    if not stripped:
+        return False
+    first = stripped[0]
+    if first in _LITERAL_FIRST_CHARS:
+        return True
+    if first.isalpha():
+        # Constant names, set() or prefixed strings like r"..."
+        return (
+            stripped.rstrip() in ("True", "False", "None")
+            or stripped.startswith("set")
+            or "'" in stripped[:3]
+            or '"' in stripped[:3]
+        )
+    return False
+
+
+def format_temporal(value):
+    """Format date/datetime objects returned by sentinelsat like the other eodag dates."""
+    if isinstance(value, date):
+        return value.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+    return value
+
+
+class MetadataExtractor(object):
+    """Extract product properties from sentinelsat results in a single pass.
+
+    Equivalent to ``properties_from_json`` followed by the conversion of the
+    date/datetime values, but the metadata mapping is analysed once for a whole page
+    of results: sentinelsat results are flat dicts, so mapped jsonpaths like
+    ``$.title`` become plain key lookups, constants are evaluated once and converters
+    are only called once per distinct value. Mappings using other jsonpaths fall back
+    to ``properties_from_json``.
+
+    :param metadata_mapping: The provider metadata mapping
+    :type metadata_mapping: dict
+    :param discovery_pattern: (optional) Regex of the discovered metadata keys
+    :type discovery_pattern: str
+    :param discovery_path: (optional) jsonpath of the discovered metadata
+    :type discovery_path: str
+    """
+
+    def __init__(self, metadata_mapping, discovery_pattern=None, discovery_path=None):
+        self.metadata_mapping = metadata_mapping
+        self.discovery_pattern = discovery_pattern
+        self.discovery_path = discovery_path
+        # (metadata, result key, conversion format or None, constant value)
+        self.steps = []
+        self.templates = {}
+        self.supported = True
+        self._conversions = {}
+        for metadata, value in metadata_mapping.items():
+            if isinstance(value, list):
+                conversion, path_or_text = value[1]
+            else:
+                conversion, path_or_text = value
+            if isinstance(path_or_text, str):
+                if _TEMPLATE_PATTERN.search(path_or_text):
+                    self.templates[metadata] = path_or_text
+                else:
+                    constant = path_or_text
+                    if may_be_literal(constant):
+                        try:
+                            constant = ast.literal_eval(constant)
+                        except Exception:
+                            pass
+                    self.steps.append((metadata, None, None, constant))
+                continue
+            key = self._path_key(path_or_text)
+            if key is None:
+                self.supported = False
+                return
+            if conversion is not None:
+                if (
+                    isinstance(conversion, list)
+                    and len(conversion) > 1
+                    and conversion[1] is not None
+                ):
+                    conversion = "%s(%s)" % (conversion[0], conversion[1])
+                elif isinstance(conversion, list):
+                    conversion = conversion[0]
+            self.steps.append((metadata, key, conversion, None))
+        self.discovery_regex = None
+        if discovery_pattern and discovery_path:
+            if discovery_path != "$.*":
+                self.supported = False
+                return
+            self.discovery_regex = re.compile(discovery_pattern)
+
+    @staticmethod
+    def _path_key(path):
+        """The result key a jsonpath like ``$.key`` points to, None for other paths."""
+        if (
+            isinstance(path, Child)
+            and isinstance(path.left, Root)
+            and isinstance(path.right, Fields)
+            and len(path.right.fields) == 1
+            and path.right.fields[0] != "*"
+        ):
+            return path.right.fields[0]
+        return None
+
+    def _convert(self, metadata, conversion, value, properties):
+        if _TEMPLATE_PATTERN.search(conversion):
+            conversion = conversion.format(**properties)
+        metadata_format = "{%s%s%s}" % (metadata, SEP, conversion)
+        try:
+            return self._conversions[(metadata_format, value)]
+        except KeyError:
+            pass
+        except TypeError:
+            # Unhashable value
+            return format_metadata(metadata_format, **{metadata: value})
+        converted = format_metadata(metadata_format, **{metadata: value})
+        self._conversions[(metadata_format, value)] = converted
+        return converted
+
+    def extract(self, result):
+        """Extract the properties of a sentinelsat result.
+
+        :param result: A sentinelsat result
+        :type result: dict
+        :return: The product properties
+        :rtype: dict
+        """
+        if not self.supported:
+            properties = properties_from_json(
+                result,
+                self.metadata_mapping,
+                discovery_pattern=self.discovery_pattern,
+                discovery_path=self.discovery_path,
+            )
+            return {k: format_temporal(v) for k, v in properties.items()}
+
+        properties = {}
+        used_keys = set()
+        for metadata, key, conversion, constant in self.steps:
+            if key is None:
+                properties[metadata] = constant
+                continue
+            if key in result:
+                value = result[key]
+                used_keys.add(key)
+            elif conversion is None:
+                properties[metadata] = NOT_AVAILABLE
+                continue
+            else:
+                value = NOT_AVAILABLE
+            if value is None:
+                properties[metadata] = None
+                continue
+            if conversion is not None:
+                value = self._convert(metadata, conversion, value, properties)
+            elif isinstance(value, date):
+                properties[metadata] = format_temporal(value)
+                continue
+            # properties as python objects when possible, like properties_from_json
+            if isinstance(value, str) and may_be_literal(value):
+                try:
+                    value = ast.literal_eval(value)
+                except Exception:
+                    pass
+            properties[metadata] = value
+
+        for metadata, template in self.templates.items():
+            properties[metadata] = template.format(**properties)
+
+        if self.discovery_regex is not None:
+            for key, value in result.items():
+                if (
+                    key not in properties
+                    and key not in used_keys
+                    and self.discovery_regex.match(key)
+                ):
+                    properties[key] = format_temporal(value)
+        return properties
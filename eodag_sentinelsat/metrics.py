@@ -0,0 +1,515 @@
+# -*- coding: utf-8 -*-
+# eodag-sentinelsat, a plugin for searching and downloading products from Copernicus Scihub
+#     Copyright 2021, CS GROUP - France, https://www.csgroup.eu/
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""Timers and counters of the phases of the Sentinelsat plugin searches and downloads.
+
+The phases timed are:
+
+* ``init_api``: creation of the sentinelsat API and its HTTP session
+* ``query``: OpenSearch request, the total count being read from the same response
+* ``footprint_filter``: filtering of a page of results on the original search
+  geometry, when a simpler one was searched
+* ``storage_status``: storage status requests of a page of results
+* ``normalize``: conversion of the results to EO products
+* ``download_all``: a whole ``download_all`` call
+* ``download``: transfer of a product, once ONLINE
+* ``move``: move of a product to the path expected by eodag
+* ``extract``: extraction of a product, and its recording
+
+Each phase ended is passed to the hooks of :class:`Metrics` as a :class:`PhaseRecord`,
+see :func:`opentelemetry_hook` to turn them into OpenTelemetry spans. The aggregated
+metrics are exported in the Prometheus text format by :meth:`Metrics.prometheus_text`,
+and served over HTTP by :meth:`Metrics.serve_prometheus`. A single server is started by
+port in a process, serving the metrics of all the plugins using this port: their
+samples are told apart by the constant ``labels`` of their metrics, the provider of the
+plugin by default.
+"""
+
+import logging as py_logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+logger = py_logging.getLogger("eodag.plugins.apis.sentinelsat")
+
+# Prefix of the names of the metrics exported
+DEFAULT_METRICS_PREFIX = "eodag_sentinelsat"
+# Address the Prometheus metrics are served on, local only by default
+DEFAULT_PROMETHEUS_ADDR = "127.0.0.1"
+
+# Prometheus servers started in the process, by address and port
+_prometheus_servers = {}
+_prometheus_lock = threading.Lock()
+
+
+class PhaseRecord(object):
+    """A phase ended, passed to the hooks.
+
+    :param name: The phase name
+    :type name: str
+    :param start: When the phase started, in seconds since the epoch
+    :type start: float
+    :param duration: The phase duration, in seconds
+    :type duration: float
+    :param attributes: Attributes of the phase, like the number of bytes downloaded
+    :type attributes: dict
+    :param error: The exception raised by the phase, if any
+    :type error: Exception
+    """
+
+    __slots__ = ("name", "start", "duration", "attributes", "error")
+
+    def __init__(self, name, start, duration, attributes, error=None):
+        self.name = name
+        self.start = start
+        self.duration = duration
+        self.attributes = attributes
+        self.error = error
+
+    def __repr__(self):
+        return "PhaseRecord(%r, duration=%.6f, attributes=%r, error=%r)" % (
+            self.name,
+            self.duration,
+            self.attributes,
+            self.error,
+        )
+
+
+class _NullPhase(object):
+    """Phase of disabled metrics, doing nothing."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+
+NULL_PHASE = _NullPhase()
+
+
+class _Phase(object):
+    def __init__(self, metrics, name, attributes):
+        self._metrics = metrics
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self):
+        self._start = time.time()
+        self._counter_start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        duration = time.perf_counter() - self._counter_start
+        self._metrics._end_phase(
+            PhaseRecord(self.name, self._start, duration, self.attributes, exc_value)
+        )
+        return False
+
+    def set(self, **attributes):
+        """Set attributes of the phase, known once it started."""
+        self.attributes.update(attributes)
+
+
+class Metrics(object):
+    """Thread-safe timers and counters of the plugin phases.
+
+    :param hooks: (optional) Callables called with the :class:`PhaseRecord` of each
+                  phase ended
+    :type hooks: list
+    :param prefix: (optional) Prefix of the names of the metrics exported
+    :type prefix: str
+    :param prometheus_port: (optional) Port the metrics are served on, the server
+                            being started when the first phase ends
+    :type prometheus_port: int
+    :param prometheus_addr: (optional) Address the metrics are served on
+    :type prometheus_addr: str
+    :param labels: (optional) Labels added to all the exported samples, like the
+                   provider of the plugin
+    :type labels: dict
+    """
+
+    def __init__(
+        self,
+        hooks=(),
+        prefix=DEFAULT_METRICS_PREFIX,
+        prometheus_port=None,
+        prometheus_addr=DEFAULT_PROMETHEUS_ADDR,
+        labels=None,
+    ):
+        self.prefix = prefix
+        self.labels = dict(labels or {})
+        self.prometheus_port = prometheus_port
+        self.prometheus_addr = prometheus_addr
+        self._hooks = list(hooks)
+        self._lock = threading.Lock()
+        self._prometheus_pending = prometheus_port is not None
+        # name -> [count, seconds, errors]
+        self._phases = {}
+        self._counters = {}
+        self._gauges = {}
+
+    def add_hook(self, hook):
+        """Call a hook with the :class:`PhaseRecord` of each phase ended.
+
+        Hooks are called in the thread of the phase, and should be quick. Their
+        exceptions are logged and ignored.
+
+        :param hook: A callable
+        :type hook: callable
+        """
+        self._hooks.append(hook)
+
+    def phase(self, name, **attributes):
+        """Context manager timing a phase.
+
+        :param name: The phase name
+        :type name: str
+        :param attributes: Attributes of the phase, also settable with the ``set``
+                           method of the context manager
+        :return: The context manager
+        """
+        return _Phase(self, name, attributes)
+
+    def add(self, name, value=1):
+        """Increase a counter.
+
+        :param name: The counter name, like ``downloaded_bytes``
+        :type name: str
+        :param value: (optional) The increment
+        :type value: int
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def gauge(self, name, getter):
+        """Export a value read when the metrics are collected.
+
+        :param name: The gauge name
+        :type name: str
+        :param getter: Callable returning the value, or None if unknown
+        :type getter: callable
+        """
+        with self._lock:
+            self._gauges[name] = getter
+
+    def snapshot(self):
+        """The metrics collected so far.
+
+        Download rates are computed from the duration of the ``download_all`` phases.
+
+        :return: ``phases`` (``count``, ``seconds`` and ``errors`` by phase name),
+                 ``counters``, ``gauges`` and ``rates`` (``downloaded_bytes`` and
+                 ``downloaded_products`` per second)
+        :rtype: dict
+        """
+        with self._lock:
+            phases = {
+                name: {"count": count, "seconds": seconds, "errors": errors}
+                for name, (count, seconds, errors) in self._phases.items()
+            }
+            counters = dict(self._counters)
+            getters = dict(self._gauges)
+        gauges = {}
+        for name, getter in getters.items():
+            try:
+                value = getter()
+            except Exception as ex:
+                logger.debug("Could not read gauge %s: %s", name, ex)
+                continue
+            if value is not None:
+                gauges[name] = value
+        rates = {}
+        download_seconds = phases.get("download_all", {}).get("seconds")
+        if download_seconds:
+            for name in ("downloaded_bytes", "downloaded_products"):
+                rates[name] = counters.get(name, 0) / download_seconds
+        return {
+            "phases": phases,
+            "counters": counters,
+            "gauges": gauges,
+            "rates": rates,
+        }
+
+    def prometheus_text(self):
+        """The metrics in the Prometheus text exposition format.
+
+        :return: The metrics
+        :rtype: str
+        """
+        return prometheus_text([self])
+
+    def _prometheus_families(self):
+        """The metric families exported, as ``(name, help, type, samples)`` tuples.
+
+        Samples are ``(suffix, labels, value)`` tuples, the constant labels first.
+        """
+        snapshot = self.snapshot()
+        prefix = self.prefix
+        families = []
+        if snapshot["phases"]:
+            samples = []
+            for phase, values in sorted(snapshot["phases"].items()):
+                labels = dict(self.labels, phase=phase)
+                samples.append(("_count", labels, values["count"]))
+                samples.append(("_sum", labels, float(values["seconds"])))
+            families.append(
+                (
+                    "%s_phase_seconds" % prefix,
+                    "Time spent in each phase",
+                    "summary",
+                    samples,
+                )
+            )
+            samples = [
+                ("", dict(self.labels, phase=phase), values["errors"])
+                for phase, values in sorted(snapshot["phases"].items())
+            ]
+            families.append(
+                (
+                    "%s_phase_errors_total" % prefix,
+                    "Phases ended by an error",
+                    "counter",
+                    samples,
+                )
+            )
+        for counter, value in sorted(snapshot["counters"].items()):
+            families.append(
+                (
+                    "%s_%s_total" % (prefix, counter),
+                    None,
+                    "counter",
+                    [("", self.labels, value)],
+                )
+            )
+        for gauge, value in sorted(snapshot["gauges"].items()):
+            families.append(
+                (
+                    "%s_%s" % (prefix, gauge),
+                    None,
+                    "gauge",
+                    [("", self.labels, float(value))],
+                )
+            )
+        return families
+
+    def write_prometheus(self, path):
+        """Write the metrics to a file, for the textfile collector of node_exporter.
+
+        The file is replaced atomically.
+
+        :param path: The file path
+        :type path: str
+        """
+        temp_path = "%s.%s.tmp" % (path, os.getpid())
+        with open(temp_path, "w") as fh:
+            fh.write(self.prometheus_text())
+        os.replace(temp_path, path)
+
+    def serve_prometheus(self, port, addr=DEFAULT_PROMETHEUS_ADDR):
+        """Serve the metrics over HTTP in a background thread, to be scraped.
+
+        If a server was already started on this address and port in the process, it
+        is reused and also serves these metrics.
+
+        :param port: The port to listen on, 0 for a free one
+        :type port: int
+        :param addr: (optional) The address to listen on (default: ``127.0.0.1``,
+                     ``""`` for all)
+        :type addr: str
+        :return: The HTTP server, whose ``shutdown`` method stops it
+        :rtype: :class:`http.server.HTTPServer`
+        :raises: :class:`OSError` if the port cannot be bound
+        """
+        with _prometheus_lock:
+            server = _prometheus_servers.get((addr, port)) if port else None
+            if server is not None:
+                if self not in server.metrics:
+                    server.metrics.append(self)
+                return server
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    body = prometheus_text(list(server.metrics)).encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, *args):
+                    pass
+
+            server = _ThreadingHTTPServer((addr, port), Handler)
+            server.metrics = [self]
+            server.key = (addr, server.server_address[1])
+            _prometheus_servers[server.key] = server
+        thread = threading.Thread(
+            target=server.serve_forever, name="prometheus-metrics", daemon=True
+        )
+        thread.start()
+        logger.info("Serving Prometheus metrics on port %s", server.server_address[1])
+        return server
+
+    def _start_prometheus(self):
+        """Serve the metrics on the configured port, logging bind errors."""
+        with self._lock:
+            if not self._prometheus_pending:
+                return
+            self._prometheus_pending = False
+        try:
+            self.serve_prometheus(self.prometheus_port, self.prometheus_addr)
+        except OSError as ex:
+            logger.warning(
+                "Could not serve Prometheus metrics on %s:%s: %s",
+                self.prometheus_addr,
+                self.prometheus_port,
+                ex,
+            )
+
+    def _end_phase(self, record):
+        if self._prometheus_pending:
+            self._start_prometheus()
+        with self._lock:
+            values = self._phases.setdefault(record.name, [0, 0.0, 0])
+            values[0] += 1
+            values[1] += record.duration
+            if record.error is not None:
+                values[2] += 1
+        for hook in self._hooks:
+            try:
+                hook(record)
+            except Exception:
+                logger.exception("Metrics hook %r failed", hook)
+
+
+def prometheus_text(metrics_list):
+    """The metrics of several plugins in the Prometheus text exposition format.
+
+    The samples of the metric families shared by several plugins are merged, under a
+    single ``HELP`` and ``TYPE`` line.
+
+    :param metrics_list: The metrics of the plugins
+    :type metrics_list: list
+    :return: The metrics
+    :rtype: str
+    """
+    families = {}
+    for metrics in metrics_list:
+        for name, help_text, metric_type, samples in metrics._prometheus_families():
+            family = families.setdefault(name, (help_text, metric_type, []))
+            family[2].extend(samples)
+    lines = []
+    for name, (help_text, metric_type, samples) in families.items():
+        if help_text is not None:
+            lines.append("# HELP %s %s" % (name, help_text))
+        lines.append("# TYPE %s %s" % (name, metric_type))
+        for suffix, labels, value in samples:
+            lines.append(
+                "%s%s%s %s"
+                % (
+                    name,
+                    suffix,
+                    _format_labels(labels),
+                    repr(value) if isinstance(value, float) else value,
+                )
+            )
+    return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels):
+    """Format the labels of a sample, escaped as the Prometheus text format requires."""
+    if not labels:
+        return ""
+    return "{%s}" % ",".join(
+        '%s="%s"'
+        % (
+            name,
+            str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for name, value in labels.items()
+    )
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    # Address and port the server is registered with, set once it is bound
+    key = None
+
+    def server_close(self):
+        if self.key is not None:
+            with _prometheus_lock:
+                if _prometheus_servers.get(self.key) is self:
+                    del _prometheus_servers[self.key]
+        super().server_close()
+
+
+def opentelemetry_hook(tracer):
+    """A hook turning the phases into OpenTelemetry spans.
+
+    :param tracer: An OpenTelemetry tracer, like the one returned by
+                   ``opentelemetry.trace.get_tracer(__name__)``
+    :return: The hook, to be given to :meth:`Metrics.add_hook`
+    :rtype: callable
+    """
+
+    def hook(record):
+        start = int(record.start * 1e9)
+        span = tracer.start_span(
+            "sentinelsat.%s" % record.name,
+            start_time=start,
+            attributes=record.attributes,
+        )
+        if record.error is not None:
+            span.record_exception(record.error)
+        span.end(end_time=start + int(record.duration * 1e9))
+
+    return hook
+
+
+def build_metrics(metrics_config, provider=None):
+    """Create the metrics described by a plugin configuration.
+
+    :param metrics_config: ``metrics`` plugin configuration, either ``true`` or a
+                           dict with the optional ``prefix`` of the metrics names,
+                           ``prometheus_port`` and ``prometheus_addr`` to serve
+                           them on once the first phase ends, and ``labels`` added
+                           to the exported samples
+    :type metrics_config: bool or dict
+    :param provider: (optional) The provider of the plugin, exported as the
+                     ``provider`` label unless ``labels`` replaces it
+    :type provider: str
+    :return: The metrics, or None if the plugin is not instrumented
+    :rtype: :class:`Metrics`
+    """
+    if not metrics_config:
+        return None
+    if metrics_config is True:
+        metrics_config = {}
+    return Metrics(
+        prefix=metrics_config.get("prefix", DEFAULT_METRICS_PREFIX),
+        prometheus_port=metrics_config.get("prometheus_port"),
+        prometheus_addr=metrics_config.get("prometheus_addr", DEFAULT_PROMETHEUS_ADDR),
+        labels=metrics_config.get(
+            "labels", {"provider": provider} if provider is not None else None
+        ),
+    )
@@ -0,0 +1,378 @@
+# -*- coding: utf-8 -*-
+# eodag-sentinelsat, a plugin for searching and downloading products from Copernicus Scihub
+#     Copyright 2021, CS GROUP - France, https://www.csgroup.eu/
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""Pool of DHuS mirrors, like the national collaborative hubs, used by the plugin.
+
+Requests are sent to the fastest healthy mirror, the latency of each mirror being
+measured on the requests it answers. A mirror failing is not used for a cooldown
+period, doubled after each new failure, the request being sent to the next mirror.
+Downloads are spread over the healthy mirrors, each product being downloaded from the
+mirror with the fewest transfers in progress. The product information requests and
+LTA retrievals of the downloads go through :class:`MirroredAPI`, to the first healthy
+mirror in the configured order.
+"""
+
+import logging as py_logging
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from sentinelsat.exceptions import ServerError, UnauthorizedError
+
+logger = py_logging.getLogger("eodag.plugins.apis.sentinelsat")
+
+# Seconds during which a failing mirror is not used, doubled after each new failure
+DEFAULT_MIRROR_COOLDOWN = 30
+# Maximum cooldown of a mirror, in seconds
+MAX_MIRROR_COOLDOWN = 600
+# Weight of the last request in the latency of a mirror
+DEFAULT_LATENCY_WEIGHT = 0.3
+# Number of searches whose mirror is remembered, see MirrorPool.pin
+MAX_PINNED_SEARCHES = 256
+# Number of products whose mirror is remembered, see MirroredAPI.found_online
+MAX_ONLINE_PRODUCTS = 1024
+
+# Errors of a mirror, the other mirrors being tried instead
+MIRROR_ERRORS = (ServerError, UnauthorizedError, requests.RequestException)
+
+
+class Mirror(object):
+    """A DHuS mirror and its health.
+
+    :param api: The sentinelsat API of the mirror
+    :type api: :class:`~sentinelsat.SentinelAPI`
+    """
+
+    def __init__(self, api):
+        self.api = api
+        # Moving average of the requests durations, in seconds
+        self.latency = None
+        self.failures = 0
+        # When the mirror can be used again, on the pool clock
+        self.down_until = 0
+        # Downloads in progress
+        self.transfers = 0
+
+    @property
+    def endpoint(self):
+        return self.api.api_url
+
+    def __repr__(self):
+        return "Mirror(%r)" % self.endpoint
+
+
+class MirrorPool(object):
+    """Mirrors of a DHuS, and their health and latency.
+
+    :param apis: The sentinelsat APIs of the mirrors, the first one being preferred
+                 until the latency of the others is known
+    :type apis: list
+    :param cooldown: (optional) Seconds during which a failing mirror is not used,
+                     doubled after each new failure
+    :type cooldown: float
+    :param latency_weight: (optional) Weight of the last request in the latency of
+                           a mirror
+    :type latency_weight: float
+    :param clock: (optional) Function giving the current time in seconds
+    :type clock: callable
+    """
+
+    def __init__(
+        self,
+        apis,
+        cooldown=DEFAULT_MIRROR_COOLDOWN,
+        latency_weight=DEFAULT_LATENCY_WEIGHT,
+        clock=time.monotonic,
+    ):
+        self.mirrors = [Mirror(api) for api in apis]
+        self.cooldown = cooldown
+        self.latency_weight = latency_weight
+        self._clock = clock
+        self._lock = threading.Lock()
+        # Mirror of the last searches, least recently used first
+        self._pinned = OrderedDict()
+        #: API of the first mirror whose product information requests fail over
+        self.api = MirroredAPI(self)
+
+    def ranked(self, by_latency=True):
+        """The mirrors, healthy ones first, by increasing latency.
+
+        Mirrors whose latency is unknown come first, so that they are measured. The
+        unhealthy mirrors are sorted by the end of their cooldown.
+
+        :param by_latency: (optional) Sort the healthy mirrors by latency, or keep
+                           them in the configured order
+        :type by_latency: bool
+        :return: The mirrors
+        :rtype: list(:class:`Mirror`)
+        """
+        now = self._clock()
+        with self._lock:
+            healthy = [m for m in self.mirrors if m.down_until <= now]
+            down = [m for m in self.mirrors if m.down_until > now]
+            if by_latency:
+                healthy.sort(key=lambda m: m.latency or 0)
+            down.sort(key=lambda m: m.down_until)
+        return healthy + down
+
+    def pinned(self, key):
+        """The mirror a search is pinned to, if it is healthy.
+
+        :param key: The search key, see :meth:`pin`
+        :type key: str
+        :return: The mirror, None if the search is not pinned or if its mirror is
+                 unhealthy
+        :rtype: :class:`Mirror`
+        """
+        now = self._clock()
+        with self._lock:
+            mirror = self._pinned.get(key)
+            if mirror is None:
+                return None
+            self._pinned.move_to_end(key)
+            return mirror if mirror.down_until <= now else None
+
+    def pin(self, key, mirror):
+        """Pin a search to a mirror, for its next pages to be requested from it.
+
+        Only the last :data:`MAX_PINNED_SEARCHES` searches are remembered.
+
+        :param key: The search key, built from its parameters
+        :type key: str
+        :param mirror: The mirror
+        :type mirror: :class:`Mirror`
+        """
+        with self._lock:
+            self._pinned[key] = mirror
+            self._pinned.move_to_end(key)
+            if len(self._pinned) > MAX_PINNED_SEARCHES:
+                self._pinned.popitem(last=False)
+
+    def call(self, func, mirror=None):
+        """Call a function with the API of the fastest healthy mirror, failing over to
+        the next mirrors on errors.
+
+        :param func: Function sending requests with the given sentinelsat API
+        :type func: callable
+        :param mirror: (optional) The only mirror to call the function with, its
+                       failure being recorded and raised
+        :type mirror: :class:`Mirror`
+        :return: The result of the function
+        :raises: The error of the last mirror, if all of them failed
+        """
+        return self._call(func, self.ranked() if mirror is None else [mirror])
+
+    def failover(self, func):
+        """Call a function with the API of the first healthy mirror in the configured
+        order, failing over to the next mirrors on errors.
+
+        :param func: Function sending requests with the given sentinelsat API
+        :type func: callable
+        :return: The result of the function
+        :raises: The error of the last mirror, if all of them failed
+        """
+        return self._call(func, self.ranked(by_latency=False))
+
+    def _call(self, func, mirrors):
+        error = None
+        for mirror in mirrors:
+            start = self._clock()
+            try:
+                result = func(mirror.api)
+            except MIRROR_ERRORS as ex:
+                self.record_failure(mirror, ex)
+                error = ex
+                continue
+            self.record_success(mirror, self._clock() - start)
+            return result
+        raise error
+
+    def acquire_download(self, has_product=None):
+        """Choose the mirror of a download, and count it as in progress there.
+
+        :param has_product: (optional) Function telling if the product can be
+                            downloaded from a mirror, the mirrors without it being
+                            skipped. The errors it raises are failures of the mirror
+        :type has_product: callable
+        :return: The mirror with the fewest transfers in progress, then the fastest
+                 one, among the healthy ones holding the product. Falls back to the
+                 first mirror if none is found
+        :rtype: :class:`Mirror`
+        """
+        ranked = self.ranked()
+        now = self._clock()
+        with self._lock:
+            candidates = sorted(
+                (m for m in ranked if m.down_until <= now),
+                key=lambda m: (m.transfers, m.latency or 0),
+            )
+        for mirror in candidates:
+            # Counted while checked, for the concurrent downloads to choose other mirrors
+            with self._lock:
+                mirror.transfers += 1
+            try:
+                if has_product is None or has_product(mirror.api):
+                    return mirror
+            except MIRROR_ERRORS as ex:
+                self.record_failure(mirror, ex)
+            with self._lock:
+                mirror.transfers -= 1
+        with self._lock:
+            self.mirrors[0].transfers += 1
+        return self.mirrors[0]
+
+    def release_download(self, mirror, error=None):
+        """Count a download as ended.
+
+        :param mirror: The mirror of the download
+        :type mirror: :class:`Mirror`
+        :param error: (optional) The error that ended the download, a failure of the
+                      mirror if it is one of :data:`MIRROR_ERRORS`
+        :type error: Exception
+        """
+        with self._lock:
+            mirror.transfers -= 1
+        if isinstance(error, MIRROR_ERRORS):
+            self.record_failure(mirror, error)
+        elif error is None:
+            with self._lock:
+                mirror.failures = 0
+
+    def record_success(self, mirror, seconds):
+        """Record a request answered by a mirror, and its duration.
+
+        :param mirror: The mirror
+        :type mirror: :class:`Mirror`
+        :param seconds: The request duration
+        :type seconds: float
+        """
+        with self._lock:
+            if mirror.latency is None:
+                mirror.latency = seconds
+            else:
+                mirror.latency += self.latency_weight * (seconds - mirror.latency)
+            mirror.failures = 0
+
+    def record_failure(self, mirror, error):
+        """Record a failure of a mirror, which is not used during its cooldown.
+
+        :param mirror: The mirror
+        :type mirror: :class:`Mirror`
+        :param error: The error
+        :type error: Exception
+        """
+        with self._lock:
+            mirror.failures += 1
+            cooldown = min(
+                self.cooldown * 2 ** (mirror.failures - 1), MAX_MIRROR_COOLDOWN
+            )
+            mirror.down_until = self._clock() + cooldown
+        logger.warning(
+            "Mirror %s failed, not used for %ss: %s",
+            mirror.endpoint,
+            cooldown,
+            str(error) or type(error).__name__,
+        )
+
+    def stats(self):
+        """The health and latency of the mirrors.
+
+        :return: ``endpoint``, ``healthy``, ``latency`` (seconds, None if unknown),
+                 ``failures`` and ``transfers`` of each mirror
+        :rtype: list(dict)
+        """
+        now = self._clock()
+        with self._lock:
+            return [
+                {
+                    "endpoint": m.endpoint,
+                    "healthy": m.down_until <= now,
+                    "latency": m.latency,
+                    "failures": m.failures,
+                    "transfers": m.transfers,
+                }
+                for m in self.mirrors
+            ]
+
+
+class MirroredAPI(object):
+    """sentinelsat API of the first mirror of a pool, failing over to the others.
+
+    ``get_product_odata``, ``is_online`` and ``trigger_offline_retrieval`` are called
+    with the first healthy mirror, see :meth:`MirrorPool.failover`, so that products
+    are seen as the preferred mirror sees them while it is healthy. The other
+    attributes are the ones of the API of the first mirror.
+
+    :param pool: The mirrors
+    :type pool: :class:`MirrorPool`
+    """
+
+    def __init__(self, pool):
+        self._pool = pool
+        # API of the mirror that last found each product online, least recently
+        # checked first
+        self._online_on = OrderedDict()
+        self._online_on_lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self._pool.mirrors[0].api, name)
+
+    def get_product_odata(self, id, full=False):
+        return self._pool.failover(lambda api: api.get_product_odata(id, full=full))
+
+    def is_online(self, id):
+        def is_online(api):
+            online = api.is_online(id)
+            with self._online_on_lock:
+                if online:
+                    self._online_on[id] = api
+                    self._online_on.move_to_end(id)
+                    if len(self._online_on) > MAX_ONLINE_PRODUCTS:
+                        self._online_on.popitem(last=False)
+                else:
+                    self._online_on.pop(id, None)
+            return online
+
+        return self._pool.failover(is_online)
+
+    def trigger_offline_retrieval(self, uuid):
+        return self._pool.failover(lambda api: api.trigger_offline_retrieval(uuid))
+
+    def found_online(self, id, api):
+        """Whether the last ``is_online`` request of a product found it online on a
+        mirror.
+
+        Only the last :data:`MAX_ONLINE_PRODUCTS` products found online are
+        remembered, the others being checked again before their download.
+
+        :param id: The product uuid
+        :type id: str
+        :param api: The sentinelsat API of the mirror
+        :type api: :class:`~sentinelsat.SentinelAPI`
+        :rtype: bool
+        """
+        with self._online_on_lock:
+            return self._online_on.get(id) is api
+
+    def forget_online(self, id):
+        """Forget the mirror on which a product was last found online.
+
+        :param id: The product uuid
+        :type id: str
+        """
+        with self._online_on_lock:
+            self._online_on.pop(id, None)
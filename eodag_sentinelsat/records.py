@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+# eodag-sentinelsat, a plugin for searching and downloading products from Copernicus Scihub
+#     Copyright 2021, CS GROUP - France, https://www.csgroup.eu/
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""Indexed store of the download records used by the Sentinelsat plugin.
+
+By default eodag records each downloaded product in its own file of the
+``<outputs_prefix>/.downloaded`` directory, named by the MD5 hash of the product
+remote location. This module keeps the same records in a single SQLite database,
+looked up and updated in bulk for a whole search result. The checksum of the
+downloaded archives, computed while they were downloaded, is kept with them.
+
+Existing record files can be imported with::
+
+    python -m eodag_sentinelsat.records <outputs_prefix>
+"""
+
+import argparse
+import hashlib
+import logging as py_logging
+import os
+import time
+
+from eodag_sentinelsat.store import SQLiteStore, store_options, store_path
+
+logger = py_logging.getLogger("eodag.plugins.apis.sentinelsat")
+
+# Name of the database created in the outputs_prefix directory by default
+DEFAULT_RECORDS_DB = ".downloaded.sqlite"
+# Name of the directory of the eodag record files
+RECORDS_DIR = ".downloaded"
+
+
+def record_key(remote_location):
+    """Key of the download record of a product, as used by eodag record files.
+
+    :param remote_location: The product remote location
+    :type remote_location: str
+    :return: The MD5 hash of the remote location
+    :rtype: str
+    """
+    return hashlib.md5(remote_location.encode("utf-8")).hexdigest()
+
+
+class SQLiteDownloadRecords(SQLiteStore):
+    """Download records stored in a SQLite database.
+
+    :param path: Path to the database file, created if needed
+    :type path: str
+    """
+
+    def _create_tables(self):
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS records ("
+            "key TEXT PRIMARY KEY, "
+            "remote_location TEXT, "
+            "fs_path TEXT, "
+            "recorded_at REAL, "
+            "checksum TEXT)"
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(records)")]
+        if "checksum" not in columns:
+            # Database created by a previous version
+            self._conn.execute("ALTER TABLE records ADD COLUMN checksum TEXT")
+
+    def lookup(self, keys):
+        """Get the records among the given keys.
+
+        :param keys: Record keys
+        :type keys: list
+        :return: The records found, as a dict of key to ``(remote_location, fs_path)``
+        :rtype: dict
+        """
+        rows = self._select_in(
+            "SELECT key, remote_location, fs_path FROM records WHERE key IN (%s)", keys
+        )
+        return {
+            key: (remote_location, fs_path) for key, remote_location, fs_path in rows
+        }
+
+    def add(self, records):
+        """Add or replace records, in a single transaction.
+
+        :param records: ``(remote_location, fs_path)`` or
+                        ``(remote_location, fs_path, checksum)`` tuples
+        :type records: list
+        """
+        now = time.time()
+        rows = []
+        for record in records:
+            remote_location, fs_path = record[:2]
+            checksum = record[2] if len(record) > 2 else None
+            rows.append(
+                (record_key(remote_location), remote_location, fs_path, now, checksum)
+            )
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?)", rows
+            )
+
+    def checksums(self, keys):
+        """Get the checksums of the products downloaded among the given keys.
+
+        :param keys: Record keys
+        :type keys: list
+        :return: The checksums found, as a dict of key to ``<algorithm>:<hex digest>``
+        :rtype: dict
+        """
+        return dict(
+            self._select_in(
+                "SELECT key, checksum FROM records "
+                "WHERE checksum IS NOT NULL AND key IN (%s)",
+                keys,
+            )
+        )
+
+    def set_checksums(self, checksums):
+        """Set the checksums of recorded products, in a single transaction.
+
+        :param checksums: Checksums by record key
+        :type checksums: dict
+        """
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE records SET checksum = ? WHERE key = ?",
+                [(checksum, key) for key, checksum in checksums.items()],
+            )
+
+    def remove(self, keys):
+        """Remove records, in a single transaction.
+
+        :param keys: Record keys
+        :type keys: list
+        """
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM records WHERE key = ?", [(key,) for key in keys]
+            )
+
+    def import_record_files(self, records_dir, remove=False):
+        """Import eodag record files, as written in ``<outputs_prefix>/.downloaded``.
+
+        :param records_dir: The directory of the record files
+        :type records_dir: str
+        :param remove: (optional) Remove the record files once imported
+        :type remove: bool
+        :return: The number of records imported
+        :rtype: int
+        """
+        rows = []
+        imported_files = []
+        with os.scandir(records_dir) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                with open(entry.path) as fh:
+                    remote_location = fh.read()
+                if record_key(remote_location) != entry.name:
+                    logger.warning(
+                        "Skipping %s, its name is not the hash of its content",
+                        entry.path,
+                    )
+                    continue
+                rows.append(
+                    (entry.name, remote_location, None, entry.stat().st_mtime, None)
+                )
+                imported_files.append(entry.path)
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO records VALUES (?, ?, ?, ?, ?)", rows
+            )
+        logger.info("%s download records imported from %s", len(rows), records_dir)
+        if remove:
+            for path in imported_files:
+                os.remove(path)
+        return len(rows)
+
+
+def build_download_records(records_config, outputs_prefix):
+    """Create the download records store described by a plugin configuration.
+
+    :param records_config: ``download_records`` plugin configuration, either
+                           ``sqlite`` or a dict with the optional ``path`` of the
+                           database
+    :type records_config: str or dict
+    :param outputs_prefix: The directory where products are downloaded
+    :type outputs_prefix: str
+    :return: The records store, or None if eodag record files are used
+    :rtype: :class:`SQLiteDownloadRecords`
+    """
+    if not records_config or records_config == "files":
+        return None
+    return SQLiteDownloadRecords(
+        store_path(store_options(records_config), outputs_prefix, DEFAULT_RECORDS_DB)
+    )
+
+
+def prepare_recorded_download(download_plugin, product, recorded, stale_keys, **kwargs):
+    """Check if a product has already been downloaded, from the indexed records.
+
+    Calls ``eodag.plugins.download.base.Download._prepare_download``, which names
+    the download path and still finds the products downloaded with an eodag record
+    file, then looks the product up in the download records, already fetched for
+    the whole search result.
+
+    :param download_plugin: The download plugin
+    :type download_plugin: :class:`~eodag.plugins.download.base.Download`
+    :param product: The EO product to download
+    :type product: :class:`~eodag.api.product._product.EOProduct`
+    :param recorded: The download records found, by record key
+    :type recorded: dict
+    :param stale_keys: Where the keys of the records whose product is missing from
+                       the filesystem are added, to be removed
+    :type stale_keys: list
+    :return: fs_path, record_key
+    :rtype: tuple
+    """
+    fs_path, record_filename = download_plugin._prepare_download(product, **kwargs)
+    if record_filename is None:
+        # Already on this platform or downloaded, or without download url
+        return fs_path, None
+    fs_dir_path = fs_path.replace(kwargs.get("outputs_extension", ".zip"), "")
+
+    key = record_key(product.remote_location)
+    if key in recorded:
+        if os.path.isfile(fs_path):
+            logger.info("Product already downloaded: %s", fs_path)
+            return download_plugin._finalize(fs_path, **kwargs), None
+        elif os.path.isdir(fs_dir_path):
+            logger.info("Product already downloaded: %s", fs_dir_path)
+            return download_plugin._finalize(fs_dir_path, **kwargs), None
+        # The product was deleted while its record was not
+        logger.debug(
+            "Download record found for %s but not the actual file",
+            product.remote_location,
+        )
+        stale_keys.append(key)
+    return fs_path, key
+
+
+def record_downloads(records, downloads):
+    """Record downloaded products, to detect later if they need to be downloaded again.
+
+    :param records: The indexed download records store, or None to save an eodag
+                    record file by product
+    :type records: :class:`SQLiteDownloadRecords`
+    :param downloads: ``(remote_location, fs_path, checksum, record_filename)`` tuples
+    :type downloads: list
+    """
+    if not downloads:
+        return
+    if records is not None:
+        records.add([download[:3] for download in downloads])
+        logger.debug("%s downloads recorded in %s", len(downloads), records.path)
+        return
+    for remote_location, _, _, record_filename in downloads:
+        with open(record_filename, "w") as fh:
+            fh.write(remote_location)
+        logger.debug("Download recorded in %s", record_filename)
+
+
+def main(args=None):
+    """Import the eodag record files of a download directory in its records database."""
+    parser = argparse.ArgumentParser(
+        description="Import the eodag download record files of OUTPUTS_PREFIX/%s "
+        "in a SQLite database" % RECORDS_DIR
+    )
+    parser.add_argument("outputs_prefix", help="the products download directory")
+    parser.add_argument(
+        "--db",
+        help="the database path (default: OUTPUTS_PREFIX/%s)" % DEFAULT_RECORDS_DB,
+    )
+    parser.add_argument(
+        "--remove",
+        action="store_true",
+        help="remove the record files once imported",
+    )
+    options = parser.parse_args(args)
+    py_logging.basicConfig(level=py_logging.INFO)
+
+    records = build_download_records({"path": options.db}, options.outputs_prefix)
+    try:
+        records.import_record_files(
+            os.path.join(options.outputs_prefix, RECORDS_DIR), remove=options.remove
+        )
+    finally:
+        records.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+# eodag-sentinelsat, a plugin for searching and downloading products from Copernicus Scihub
+#     Copyright 2021, CS GROUP - France, https://www.csgroup.eu/
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""Base of the stores of the Sentinelsat plugin kept in SQLite databases."""
+
+import abc
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+# Number of values bound to a single SQL statement, below SQLite default limit
+SQL_CHUNK_SIZE = 500
+_DATE_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+
+
+def format_date(value):
+    """Format a datetime as a sortable UTC string, "" if None."""
+    if value is None:
+        return ""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.strftime(_DATE_FORMAT)
+
+
+def parse_date(value):
+    """Parse a date formatted by :func:`format_date`, None if empty."""
+    return datetime.strptime(value, _DATE_FORMAT) if value else None
+
+
+def store_options(store_config):
+    """Options of a store, from its plugin configuration.
+
+    :param store_config: Plugin configuration of the store, a dict of options, or
+                         ``true`` (or another shorthand) for the default ones
+    :type store_config: bool or str or dict
+    :return: The options
+    :rtype: dict
+    """
+    return store_config if isinstance(store_config, dict) else {}
+
+
+def store_path(options, outputs_prefix, default_name):
+    """Path of the database of a store.
+
+    :param options: Options of the store, with the optional ``path`` of the database
+    :type options: dict
+    :param outputs_prefix: The directory where the database is created by default
+    :type outputs_prefix: str
+    :param default_name: Name of the database created in ``outputs_prefix``
+    :type default_name: str
+    :return: The database path
+    :rtype: str
+    """
+    path = options.get("path") or os.path.join(
+        os.path.abspath(outputs_prefix), default_name
+    )
+    return os.path.expanduser(path)
+
+
+class SQLiteStore(abc.ABC):
+    """Store kept in a SQLite database, in WAL mode.
+
+    The database can be shared by several processes. A single connection is used by
+    instance, protected by a lock so that it can be shared between threads.
+
+    :param path: Path to the database file, created if needed
+    :type path: str
+    """
+
+    #: ``synchronous`` pragma of the connection, None for the SQLite default
+    synchronous = "NORMAL"
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            if self.synchronous is not None:
+                self._conn.execute("PRAGMA synchronous=%s" % self.synchronous)
+            self._create_tables()
+
+    @abc.abstractmethod
+    def _create_tables(self):
+        """Create the tables of the store if needed, in the opening transaction."""
+
+    def _select_in(self, sql, values, params=()):
+        """Run a query whose ``%s`` placeholder is replaced by bound values, by chunks.
+
+        :param sql: The query, like ``SELECT ... WHERE key IN (%s)``
+        :type sql: str
+        :param values: The values bound to the placeholder
+        :type values: list
+        :param params: (optional) The parameters bound before the values
+        :type params: tuple
+        :return: The rows of all the chunks
+        :rtype: list
+        """
+        values = list(values)
+        rows = []
+        with self._lock:
+            for i in range(0, len(values), SQL_CHUNK_SIZE):
+                chunk_end = i + SQL_CHUNK_SIZE
+                chunk = values[i:chunk_end]
+                rows.extend(
+                    self._conn.execute(
+                        sql % ",".join("?" * len(chunk)), list(params) + chunk
+                    )
+                )
+        return rows
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+
+
+class StoresByDirectory:
+    """Stores of the download directories, created the first time they are used.
+
+    :param build: Factory of the store of a download directory, called with the
+                  plugin configuration of the store and the directory, returning
+                  None if the store is not configured
+    :type build: callable
+    """
+
+    def __init__(self, build):
+        self._build = build
+        self._stores = {}
+        self._lock = threading.Lock()
+
+    def get(self, store_config, outputs_prefix):
+        """Get the store of a download directory.
+
+        :param store_config: Plugin configuration of the store
+        :type store_config: bool or str or dict
+        :param outputs_prefix: The download directory
+        :type outputs_prefix: str
+        :return: The store, or None if it is not configured
+        :rtype: :class:`SQLiteStore`
+        """
+        if not store_config:
+            return None
+        with self._lock:
+            if outputs_prefix not in self._stores:
+                self._stores[outputs_prefix] = self._build(store_config, outputs_prefix)
+            return self._stores[outputs_prefix]
+
+    def clear(self):
+        """Close the stores created, the next ones being created again."""
+        with self._lock:
+            for store in self._stores.values():
+                if store is not None:
+                    store.close()
+            self._stores.clear()
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+# eodag-sentinelsat, a plugin for searching and downloading products from Copernicus Scihub
+#     Copyright 2021, CS GROUP - France, https://www.csgroup.eu/
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""Extraction of zip archives on the fly, while they are downloaded.
+
+Zip archives can be read sequentially thanks to the local header written before
+the data of each entry: the central directory at the end of the archive is not
+needed. Stored and deflated entries are supported, with sizes given either in their
+local header or, for deflated entries, in a data descriptor following their data.
+"""
+
+import os
+import struct
+import zlib
+
+# Local file header, data descriptor and central directory signatures
+_LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+_DATA_DESCRIPTOR_SIGNATURE = b"PK\x07\x08"
+_CENTRAL_DIRECTORY_SIGNATURES = (b"PK\x01\x02", b"PK\x05\x06", b"PK\x06\x06")
+_LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+_ZIP64_EXTRA_ID = 0x0001
+
+_FLAG_ENCRYPTED = 0x01
+_FLAG_DATA_DESCRIPTOR = 0x08
+_STORED = 0
+_DEFLATED = 8
+
+
+class StreamExtractError(Exception):
+    """The archive cannot be extracted while it is downloaded."""
+
+
+class ZipStreamExtractor(object):
+    """Extract a zip archive from the successive chunks of its content.
+
+    :param directory: Where the archive entries are extracted
+    :type directory: str
+    """
+
+    def __init__(self, directory):
+        self.directory = os.path.abspath(directory)
+        self.entries = 0
+        self._buffer = b""
+        self._step = self._read_header
+        self._entry = None
+
+    def feed(self, data):
+        """Extract the entries of the next chunk of the archive.
+
+        :param data: The next chunk of the archive
+        :type data: bytes
+        :raises: :class:`StreamExtractError`
+        """
+        self._buffer += data
+        # Each step consumes the buffer, and returns False if it needs more data
+        while self._step is not None and self._step():
+            pass
+
+    def close(self):
+        """Check that the whole archive has been extracted.
+
+        :raises: :class:`StreamExtractError`
+        """
+        self.close_file()
+        if self._step is not None:
+            raise StreamExtractError("Truncated archive")
+
+    def close_file(self):
+        """Close the file of the entry being extracted, if any."""
+        if self._entry is not None:
+            if self._entry["file"] is not None:
+                self._entry["file"].close()
+            self._entry = None
+
+    def _read_header(self):
+        if len(self._buffer) < 4:
+            return False
+        signature = self._buffer[:4]
+        if signature in _CENTRAL_DIRECTORY_SIGNATURES:
+            # All the entries have been extracted, the rest is not needed
+            self._buffer = b""
+            self._step = None
+            return False
+        if signature != _LOCAL_HEADER_SIGNATURE:
+            raise StreamExtractError("Invalid local file header")
+        if len(self._buffer) < _LOCAL_HEADER.size:
+            return False
+        (
+            _,
+            _,
+            _,
+            flags,
+            method,
+            _,
+            _,
+            crc,
+            compress_size,
+            file_size,
+            name_length,
+            extra_length,
+        ) = _LOCAL_HEADER.unpack_from(self._buffer)
+        name_start = _LOCAL_HEADER.size
+        name_end = name_start + name_length
+        header_end = name_end + extra_length
+        if len(self._buffer) < header_end:
+            return False
+        name = self._buffer[name_start:name_end]
+        extra = self._buffer[name_end:header_end]
+        self._buffer = self._buffer[header_end:]
+
+        zip64_sizes = self._zip64_sizes(extra)
+        if compress_size == 0xFFFFFFFF or file_size == 0xFFFFFFFF:
+            if zip64_sizes is None:
+                raise StreamExtractError("Missing zip64 entry sizes")
+            file_size, compress_size = zip64_sizes
+        if flags & _FLAG_ENCRYPTED:
+            raise StreamExtractError("Encrypted entries are not supported")
+        if method not in (_STORED, _DEFLATED):
+            raise StreamExtractError("Compression method %s not supported" % method)
+        data_descriptor = bool(flags & _FLAG_DATA_DESCRIPTOR)
+        if data_descriptor and method == _STORED:
+            raise StreamExtractError("Stored entries of unknown size are not supported")
+
+        path = self._entry_path(name.decode("utf-8" if flags & 0x800 else "cp437"))
+        if path.endswith(os.sep):
+            # Directories have no content, but may have an empty compressed stream
+            os.makedirs(path, exist_ok=True)
+            fh = None
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fh = open(path, "wb")
+        self._entry = {
+            "path": path,
+            "file": fh,
+            "crc": crc,
+            "remaining": None if data_descriptor else compress_size,
+            "data_descriptor": data_descriptor,
+            "zip64": zip64_sizes is not None,
+            "decompressor": zlib.decompressobj(-15) if method == _DEFLATED else None,
+            "computed_crc": 0,
+        }
+        self._step = self._read_data
+        return True
+
+    @staticmethod
+    def _zip64_sizes(extra):
+        """The entry sizes of the zip64 extra field, None if there is no such field."""
+        offset = 0
+        while offset + 4 <= len(extra):
+            header_id, size = struct.unpack_from("<2H", extra, offset)
+            if header_id == _ZIP64_EXTRA_ID:
+                if size < 16:
+                    return (0, 0)
+                return struct.unpack_from("<2Q", extra, offset + 4)
+            offset += 4 + size
+        return None
+
+    def _entry_path(self, name):
+        """The path where an entry is extracted, checked to be in the directory."""
+        is_dir = name.endswith("/")
+        parts = [p for p in name.replace("\\", "/").split("/") if p not in ("", ".")]
+        if not parts or ".." in parts:
+            raise StreamExtractError("Invalid entry name: %s" % name)
+        path = os.path.join(self.directory, *parts)
+        return path + os.sep if is_dir else path
+
+    def _read_data(self):
+        entry = self._entry
+        if not self._buffer and entry["remaining"] != 0:
+            return False
+        data = self._buffer
+        if entry["remaining"] is not None:
+            data = data[: entry["remaining"]]
+            entry["remaining"] -= len(data)
+        decompressor = entry["decompressor"]
+        if decompressor is not None:
+            output = decompressor.decompress(data)
+            end_of_entry = decompressor.eof
+            unused = decompressor.unused_data
+        else:
+            output = data
+            end_of_entry = entry["remaining"] == 0
+            unused = b""
+        consumed = len(data)
+        self._buffer = unused + self._buffer[consumed:]
+        if entry["file"] is not None:
+            entry["file"].write(output)
+        entry["computed_crc"] = zlib.crc32(output, entry["computed_crc"])
+        if not end_of_entry:
+            if entry["remaining"] == 0:
+                raise StreamExtractError("Truncated entry data")
+            return bool(self._buffer)
+        if entry["data_descriptor"]:
+            self._step = self._read_data_descriptor
+        else:
+            self._end_entry(entry["crc"])
+        return True
+
+    def _read_data_descriptor(self):
+        sizes_length = 16 if self._entry["zip64"] else 8
+        if len(self._buffer) < 4 + 4 + sizes_length:
+            return False
+        offset = 4 if self._buffer[:4] == _DATA_DESCRIPTOR_SIGNATURE else 0
+        (crc,) = struct.unpack_from("<L", self._buffer, offset)
+        descriptor_end = offset + 4 + sizes_length
+        self._buffer = self._buffer[descriptor_end:]
+        self._end_entry(crc)
+        return True
+
+    def _end_entry(self, crc):
+        entry = self._entry
+        self.close_file()
+        if entry["computed_crc"] != crc:
+            raise StreamExtractError("Bad CRC-32 for %s" % entry["path"])
+        if entry["file"] is not None:
+            self.entries += 1
+        self._step = self._read_header
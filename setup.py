@@ -34,8 +34,11 @@ setup(
     url="https://github.com/CS-SI/eodag-sentinelsat",
     license="GPLv3",
     packages=find_packages(),
+    python_requires=">=3.7",
     install_requires=[
-        "sentinelsat >= 1.1.0",
+        # _ProductDownloader overrides internals of sentinelsat 1.2, see
+        # tests/test_plugin.py::test_sentinelsat_internals
+        "sentinelsat >= 1.2.1, < 1.3",
         "eodag >= 2.3.0b1",
         "python-dateutil",
     ],
@@ -43,7 +46,9 @@ setup(
         "dev": [
             "pre-commit",
             "tox",
-            "pytest",
+            # pythonpath option of pytest.ini
+            "pytest >= 7",
+            "pytest-benchmark",
         ]
     },
     entry_points={
@@ -65,7 +70,6 @@ setup(
         "Operating System :: Microsoft :: Windows",
         "Operating System :: POSIX :: Linux",
         "Programming Language :: Python :: 3",
-        "Programming Language :: Python :: 3.6",
         "Programming Language :: Python :: 3.7",
         "Programming Language :: Python :: 3.8",
         "Programming Language :: Python :: 3.9",
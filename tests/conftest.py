@@ -1,9 +1,23 @@
+import asyncio
 import os
 import tempfile
 from pathlib import Path
 
 import pytest
 from eodag import setup_logging
+from eodag.config import load_default_config
+from eodag.plugins.manager import PluginManager
+
+from tests.mock_dhus import MockDHuS
+
+
+def run_async(coroutine):
+    """Run a coroutine in a new event loop"""
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
 
 
 @pytest.fixture(scope="session", autouse=True)
@@ -26,3 +40,29 @@ def logging_debug():
     setup_logging(3)
     yield
     setup_logging(1)
+
+
+@pytest.fixture
+def mock_dhus():
+    """Start a mock DHuS server, given the archive content of its products."""
+    servers = []
+
+    def start(products, **kwargs):
+        server = MockDHuS(products, **kwargs).__enter__()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.__exit__()
+
+
+@pytest.fixture
+def plugin_api(tmp_path):
+    """The Sentinelsat plugin, downloading products to a temporary directory."""
+    providers_config = load_default_config()
+    plugins_manager = PluginManager(providers_config)
+    plugin = next(plugins_manager.get_search_plugins(provider="scihub"))
+    plugin.config.outputs_prefix = str(tmp_path)
+
+    yield plugin
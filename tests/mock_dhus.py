@@ -0,0 +1,593 @@
+# -*- coding: utf-8 -*-
+# eodag-sentinelsat, a plugin for searching and downloading products from Copernicus Scihub
+#     Copyright 2021, CS GROUP - France, https://www.csgroup.eu/
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""Local DHuS server, answering the OpenSearch and OData requests of sentinelsat.
+
+Used by the tests and benchmarks of the plugin, it can also be started alone from the
+root of the repository to try eodag without SciHub credentials::
+
+    python -m tests.mock_dhus --products 100 --latency 0.1 --port 8080
+
+The plugin ``endpoint`` is then ``http://127.0.0.1:8080/``.
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import logging as py_logging
+import os
+import re
+import socketserver
+import threading
+import time
+import zipfile
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from dateutil.parser import isoparse
+from shapely import wkt
+from shapely.geometry import box
+
+logger = py_logging.getLogger("eodag.plugins.apis.sentinelsat")
+
+# Maximum number of results of an OpenSearch page accepted by DHuS
+DEFAULT_MAX_ROWS = 100
+DEFAULT_FOOTPRINT = "POLYGON ((1 43, 1 44, 2 44, 2 43, 1 43))"
+DEFAULT_DATE = "2020-05-01T10:30:00.000Z"
+DEFAULT_PRODUCT_TYPE = "S2MSI1C"
+
+_RANGE_TERM = re.compile(r'(\w+):\[\s*"?([^"\]]*?)"?\s+TO\s+"?([^"\]]*?)"?\s*\]')
+_VALUE_TERM = re.compile(r'(\w+):"([^"]*)"')
+_INTERSECTS = re.compile(r"Intersects\((.*)\)$", re.IGNORECASE)
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def safe_archive(title, size=300, files=3):
+    """A zip archive like the ones of Sentinel products, with random data files.
+
+    :param title: The product title, name of the ``.SAFE`` directory
+    :type title: str
+    :param size: (optional) Number of bytes of the data files, split between them
+    :type size: int
+    :param files: (optional) Number of data files
+    :type files: int
+    :return: The archive content
+    :rtype: bytes
+    """
+    archive = io.BytesIO()
+    file_size = max(size // files, 1)
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_STORED) as zfile:
+        zfile.writestr("%s.SAFE/manifest.safe" % title, b"<xfdu:XFDU/>")
+        for i in range(files):
+            zfile.writestr(
+                "%s.SAFE/GRANULE/IMG_DATA/B%02d.jp2" % (title, i), os.urandom(file_size)
+            )
+    return archive.getvalue()
+
+
+def synthetic_products(
+    count,
+    size=300,
+    start=datetime(2020, 5, 1, 10, 30, tzinfo=timezone.utc),
+    interval=timedelta(hours=1),
+    grid=(1, 43, 11, 53),
+    archives=True,
+):
+    """Synthetic products, with different dates and footprints.
+
+    The products are sensed every ``interval`` from ``start``, and their footprints are
+    the 1x1 degree tiles of ``grid``, one after the other.
+
+    :param count: Number of products
+    :type count: int
+    :param size: (optional) Size of their data files, in bytes
+    :type size: int
+    :param start: (optional) Sensing date of the first product
+    :type start: datetime
+    :param interval: (optional) Time between two products
+    :type interval: timedelta
+    :param grid: (optional) Bounds (lonmin, latmin, lonmax, latmax) of the tiles
+    :type grid: tuple
+    :param archives: (optional) If False, the content of the products is random
+                     instead of being a zip archive
+    :type archives: bool
+    :return: The products content and properties, by uuid, to be given to
+             :class:`MockDHuS`
+    :rtype: tuple(dict, dict)
+    """
+    lonmin, latmin, lonmax, latmax = grid
+    columns = max(int(lonmax - lonmin), 1)
+    rows = max(int(latmax - latmin), 1)
+    products = {}
+    properties = {}
+    for i in range(count):
+        uuid = "uuid-%06d" % i
+        title = "S2A_MSIL1C_%s" % uuid
+        tile = i % (columns * rows)
+        lon = lonmin + tile % columns
+        lat = latmin + tile // columns
+        products[uuid] = safe_archive(title, size) if archives else os.urandom(size)
+        properties[uuid] = {
+            "date": (start + i * interval).strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+            "footprint": box(lon, lat, lon + 1, lat + 1).wkt,
+            "cloudcoverpercentage": float(i % 100),
+        }
+    return products, properties
+
+
+class MockDHuS(object):
+    """Minimal DHuS server, answering the OpenSearch and OData requests of sentinelsat.
+
+    ``products`` maps uuids to the archive content of the products, ``properties``
+    optionally gives their ``date``, ``ingestiondate`` (the sensing date by default),
+    ``footprint`` (WKT), ``producttype`` or ``cloudcoverpercentage``. OpenSearch queries
+    are filtered on these properties, other search terms being ignored.
+
+    Every request is answered after ``latency`` seconds, and pages of more than
+    ``max_rows`` results are refused like DHuS does.
+
+    OFFLINE products become ONLINE once ordered, after ``lta_checks`` checks of their
+    storage status. ``max_ordered`` is the maximum number of products ordered at the
+    same time. Orders beyond ``lta_quota`` products being restored are refused with a
+    403 error.
+
+    The first download of the products in ``interrupt`` is interrupted after the given
+    number of bytes. Range requests are supported, and kept in ``ranges``.
+    The first download of the products in ``throttle`` is answered with a 429 error.
+    ``max_transfers`` is the maximum number of products sent at the same time, each
+    of them at ``rate`` bytes per second if given. The products in ``corrupt`` are
+    sent with their first byte changed, so that their checksum does not match.
+
+    While ``maintenance`` is True, all the requests are answered with a 503 error.
+    """
+
+    def __init__(
+        self,
+        products,
+        offline=(),
+        lta_checks=1,
+        interrupt=None,
+        throttle=(),
+        properties=None,
+        latency=0,
+        max_rows=DEFAULT_MAX_ROWS,
+        lta_quota=None,
+        rate=None,
+        port=0,
+    ):
+        self.products = products
+        self.properties = properties or {}
+        self.offline = set(offline)
+        self.lta_checks = lta_checks
+        self.lta_quota = lta_quota
+        self.interrupt = dict(interrupt or {})
+        self.throttle = set(throttle)
+        self.latency = latency
+        self.max_rows = max_rows
+        self.rate = rate
+        self.transfers = 0
+        self.max_transfers = 0
+        self.ranges = []
+        self.ordered = {}
+        self.max_ordered = 0
+        self.requests = []
+        self.maintenance = False
+        self.corrupt = set()
+        self._lock = threading.Lock()
+        self._filters = {}
+        self.server = _ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.url = "http://127.0.0.1:%s/" % self.server.server_address[1]
+
+    def is_online(self, uuid):
+        with self._lock:
+            if uuid in self.ordered:
+                self.ordered[uuid] -= 1
+                if self.ordered[uuid] <= 0:
+                    del self.ordered[uuid]
+                    self.offline.discard(uuid)
+            return uuid not in self.offline
+
+    def order(self, uuid):
+        """Order an OFFLINE product, returning False if the LTA quota is exceeded."""
+        with self._lock:
+            if uuid not in self.ordered:
+                if self.lta_quota is not None and len(self.ordered) >= self.lta_quota:
+                    return False
+                self.ordered[uuid] = self.lta_checks
+            self.max_ordered = max(self.max_ordered, len(self.ordered))
+            return True
+
+    def product_property(self, uuid, name, default=None):
+        return self.properties.get(uuid, {}).get(name, default)
+
+    def product_date(self, uuid, name):
+        """The ``beginposition`` or ``ingestiondate`` of a product, as a string."""
+        date = self.product_property(uuid, "date", DEFAULT_DATE)
+        if name == "ingestiondate":
+            return self.product_property(uuid, "ingestiondate", date)
+        return date
+
+    def search(self, query, order_by=None):
+        """uuids of the products matching an OpenSearch query, sorted."""
+        ranges, values = self._query_filters(query)
+        uuids = [u for u in self.products if self._matches(u, ranges, values)]
+        order_field = order_by.split()[0] if order_by else None
+        if order_field in ("beginposition", "ingestiondate"):
+            uuids.sort(
+                key=lambda u: (self.product_date(u, order_field), u),
+                reverse=order_by.endswith(" desc"),
+            )
+        else:
+            uuids.sort()
+        return uuids
+
+    def _matches(self, uuid, ranges, values):
+        for key, lower, upper in ranges:
+            if key in ("beginposition", "ingestiondate"):
+                value = isoparse(self.product_date(uuid, key))
+                bounds = [_parse_date(lower), _parse_date(upper)]
+            elif key == "cloudcoverpercentage":
+                value = self.product_property(uuid, key, 0.0)
+                bounds = [float(lower), float(upper)]
+            else:
+                continue
+            if bounds[0] is not None and value < bounds[0]:
+                return False
+            if bounds[1] is not None and value > bounds[1]:
+                return False
+        for key, expected in values:
+            if key in ("producttype", "platformname"):
+                default = DEFAULT_PRODUCT_TYPE if key == "producttype" else "Sentinel-2"
+                if self.product_property(uuid, key, default) != expected:
+                    return False
+            elif key == "footprint":
+                footprint = wkt.loads(
+                    self.product_property(uuid, "footprint", DEFAULT_FOOTPRINT)
+                )
+                if not footprint.intersects(expected):
+                    return False
+        return True
+
+    def _query_filters(self, query):
+        """Parse the filters of a query once, as ranges and values."""
+        with self._lock:
+            if query in self._filters:
+                return self._filters[query]
+        ranges = [
+            (key.lower(), lower, upper)
+            for key, lower, upper in _RANGE_TERM.findall(query)
+        ]
+        values = []
+        for key, value in _VALUE_TERM.findall(_RANGE_TERM.sub("", query)):
+            key = key.lower()
+            if key == "footprint":
+                match = _INTERSECTS.match(value)
+                if match is None:
+                    continue
+                value = wkt.loads(match.group(1))
+            values.append((key, value))
+        with self._lock:
+            self._filters[query] = (ranges, values)
+        return ranges, values
+
+    def opensearch_entry(self, uuid):
+        title = "S2A_MSIL1C_%s" % uuid
+        date = self.product_property(uuid, "date", DEFAULT_DATE)
+        entry = {
+            "id": uuid,
+            "title": title,
+            "link": [{"href": "%sodata/v1/Products('%s')/$value" % (self.url, uuid)}],
+            "date": [{"name": "beginposition", "content": date}],
+            "str": [
+                {"name": "uuid", "content": uuid},
+                {"name": "identifier", "content": title},
+                {
+                    "name": "footprint",
+                    "content": self.product_property(
+                        uuid, "footprint", DEFAULT_FOOTPRINT
+                    ),
+                },
+                {
+                    "name": "producttype",
+                    "content": self.product_property(
+                        uuid, "producttype", DEFAULT_PRODUCT_TYPE
+                    ),
+                },
+            ],
+        }
+        if uuid in self.properties:
+            # Complete entries, closer to the ones of SciHub
+            entry["date"].extend(
+                [
+                    {"name": "endposition", "content": date},
+                    {
+                        "name": "ingestiondate",
+                        "content": self.product_date(uuid, "ingestiondate"),
+                    },
+                ]
+            )
+            entry["double"] = [
+                {
+                    "name": "cloudcoverpercentage",
+                    "content": str(
+                        self.product_property(uuid, "cloudcoverpercentage", 0.0)
+                    ),
+                }
+            ]
+            entry["str"].extend(
+                [
+                    {
+                        "name": "platformname",
+                        "content": self.product_property(
+                            uuid, "platformname", "Sentinel-2"
+                        ),
+                    },
+                    {"name": "filename", "content": "%s.SAFE" % title},
+                    {"name": "size", "content": "%s B" % len(self.products[uuid])},
+                ]
+            )
+        return entry
+
+    def odata_entry(self, uuid):
+        content = self.products[uuid]
+        return {
+            "Id": uuid,
+            "Name": "S2A_MSIL1C_%s" % uuid,
+            "ContentLength": str(len(content)),
+            "Checksum": {
+                "Algorithm": "MD5",
+                "Value": hashlib.md5(content).hexdigest().upper(),
+            },
+            "ContentDate": {"Start": "/Date(1588329000000)/"},
+            "ContentGeometry": (
+                '<gml:Polygon xmlns:gml="http://www.opengis.net/gml">'
+                "<gml:outerBoundaryIs><gml:LinearRing><gml:coordinates>"
+                "43,1 44,1 44,2 43,2 43,1"
+                "</gml:coordinates></gml:LinearRing></gml:outerBoundaryIs>"
+                "</gml:Polygon>"
+            ),
+            "__metadata": {
+                "media_src": "%sodata/v1/Products('%s')/$value" % (self.url, uuid)
+            },
+            "Online": uuid not in self.offline,
+            "CreationDate": "/Date(1588329000000)/",
+            "IngestionDate": "/Date(1588329000000)/",
+            "Attributes": {"results": []},
+        }
+
+    def _handler(self):
+        dhus = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def send(self, status, body=b"", content_type="application/json"):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(body)
+
+            def send_content(self, uuid):
+                with dhus._lock:
+                    dhus.transfers += 1
+                    dhus.max_transfers = max(dhus.max_transfers, dhus.transfers)
+                try:
+                    self._send_content(uuid)
+                finally:
+                    with dhus._lock:
+                        dhus.transfers -= 1
+
+            def _send_content(self, uuid):
+                content = dhus.products[uuid]
+                if uuid in dhus.corrupt:
+                    content = bytes([content[0] ^ 0xFF]) + content[1:]
+                start = 0
+                status = 200
+                match = re.match(r"bytes=(\d+)-$", self.headers.get("Range", ""))
+                if match:
+                    dhus.ranges.append((uuid, self.headers["Range"]))
+                    start = int(match.group(1))
+                    status = 206
+                self.send_response(status)
+                self.send_header("Content-Type", "application/zip")
+                self.send_header("Content-Length", str(len(content) - start))
+                self.end_headers()
+                end = len(content)
+                interrupt = dhus.interrupt.pop(uuid, None)
+                if interrupt is not None:
+                    end = start + interrupt
+                if dhus.rate:
+                    step = 2**16
+                    for i in range(start, end, step):
+                        time.sleep(step / dhus.rate)
+                        chunk_end = min(i + step, end)
+                        self.wfile.write(content[i:chunk_end])
+                else:
+                    self.wfile.write(content[start:end])
+                if interrupt is not None:
+                    self.wfile.flush()
+                    self.close_connection = True
+
+            def send_json(self, data):
+                self.send(200, json.dumps(data).encode())
+
+            def send_search(self, query):
+                rows = int(query.get("rows", ["100"])[0])
+                start = int(query.get("start", ["0"])[0])
+                if rows > dhus.max_rows:
+                    self.send_json_error(500, "Rows cannot exceed %s" % dhus.max_rows)
+                    return
+                order_by = query.get("orderby", [None])[0]
+                uuids = dhus.search(query.get("q", [""])[0], order_by)
+                self.send_json(
+                    {
+                        "feed": {
+                            "opensearch:totalResults": str(len(uuids)),
+                            "entry": [
+                                dhus.opensearch_entry(u) for u in uuids[start:][:rows]
+                            ],
+                        }
+                    }
+                )
+
+            def send_json_error(self, status, message):
+                body = {"error": {"code": None, "message": {"value": message}}}
+                self.send(status, json.dumps(body).encode())
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                dhus.requests.append("%s %s" % (self.command, url.path))
+                if dhus.latency:
+                    time.sleep(dhus.latency)
+                if dhus.maintenance:
+                    self.send_json_error(503, "The service is under maintenance")
+                    return
+                query = parse_qs(url.query)
+                product = re.match(r"/odata/v1/Products\('([^']+)'\)(.*)", url.path)
+                if url.path == "/search":
+                    self.send_search(query)
+                elif url.path == "/odata/v1/Products":
+                    uuids = re.findall(r"Id eq '([^']+)'", query["$filter"][0])
+                    if "Checksum" in query["$select"][0]:
+                        results = [
+                            {"Id": u, "Checksum": dhus.odata_entry(u)["Checksum"]}
+                            for u in uuids
+                            if u in dhus.products
+                        ]
+                    else:
+                        results = [
+                            {"Id": u, "Online": dhus.is_online(u)}
+                            for u in uuids
+                            if u in dhus.products
+                        ]
+                    self.send_json({"d": {"results": results}})
+                elif product is None or product.group(1) not in dhus.products:
+                    self.send(404)
+                elif product.group(2) == "":
+                    self.send_json({"d": dhus.odata_entry(product.group(1))})
+                elif product.group(2) == "/Online/$value":
+                    online = dhus.is_online(product.group(1))
+                    self.send(200, b"true" if online else b"false", "text/plain")
+                elif product.group(2) == "/Attributes('Filename')/Value/$value":
+                    filename = "S2A_MSIL1C_%s.SAFE" % product.group(1)
+                    self.send(200, filename.encode("utf-8"), "text/plain")
+                elif product.group(2) == "/$value":
+                    if self.command == "HEAD":
+                        self.send_response(200)
+                        self.send_header(
+                            "Content-Disposition",
+                            'attachment; filename="S2A_MSIL1C_%s.zip"'
+                            % product.group(1),
+                        )
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                    elif product.group(1) in dhus.offline:
+                        if dhus.order(product.group(1)):
+                            self.send(202)
+                        else:
+                            self.send_json_error(403, "User quota exceeded")
+                    elif product.group(1) in dhus.throttle:
+                        dhus.throttle.discard(product.group(1))
+                        self.send(429)
+                    else:
+                        self.send_content(product.group(1))
+                else:
+                    self.send(404)
+
+            do_HEAD = do_GET
+
+        return Handler
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _parse_date(value):
+    """Parse a date bound of a query, None if unbounded or not supported."""
+    if not value or value == "*" or value.startswith("NOW"):
+        return None
+    return isoparse(value)
+
+
+def main(args=None):
+    """Start a mock DHuS server with synthetic products."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--products", type=int, default=100, help="products count")
+    parser.add_argument(
+        "--size", type=int, default=2**20, help="size of the products, in bytes"
+    )
+    parser.add_argument(
+        "--offline", type=float, default=0, help="ratio of OFFLINE products"
+    )
+    parser.add_argument(
+        "--lta-checks",
+        type=int,
+        default=1,
+        help="storage status checks before an ordered product is ONLINE",
+    )
+    parser.add_argument(
+        "--lta-quota", type=int, help="maximum number of products being restored"
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0, help="latency of the requests, in seconds"
+    )
+    parser.add_argument(
+        "--max-rows", type=int, default=DEFAULT_MAX_ROWS, help="maximum page size"
+    )
+    parser.add_argument(
+        "--rate", type=float, help="download rate of each product, in bytes/s"
+    )
+    args = parser.parse_args(args)
+
+    products, properties = synthetic_products(args.products, args.size)
+    offline_count = int(args.products * args.offline)
+    offline = sorted(products)[:offline_count]
+    dhus = MockDHuS(
+        products,
+        properties=properties,
+        offline=offline,
+        lta_checks=args.lta_checks,
+        lta_quota=args.lta_quota,
+        latency=args.latency,
+        max_rows=args.max_rows,
+        rate=args.rate,
+        port=args.port,
+    )
+    print("Mock DHuS serving %s products on %s" % (len(products), dhus.url))
+    try:
+        dhus.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        dhus.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
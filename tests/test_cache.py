@@ -0,0 +1,103 @@
+import datetime
+import json
+from unittest import mock
+
+import pytest
+
+from eodag_sentinelsat.cache import (
+    DiskQueryCache,
+    MemoryQueryCache,
+    QueryCache,
+    build_query_cache,
+    make_cache_key,
+)
+
+
+def test_make_cache_key():
+    """Check that equivalent query parameters get the same cache key"""
+
+    start = datetime.datetime(2020, 5, 1)
+    end = datetime.datetime(2020, 5, 2)
+    key = make_cache_key(
+        "https://example.com", producttype="S2MSI1C", date=(start, end), limit=10
+    )
+    assert key == make_cache_key(
+        "https://example.com", limit=10, date=[start, end], producttype="S2MSI1C"
+    )
+    assert key != make_cache_key(
+        "https://example.com", producttype="S2MSI1C", date=(start, end), limit=20
+    )
+
+
+def test_memory_query_cache():
+    """Check the in-memory cache LRU eviction, expiration and counters"""
+
+    cache = MemoryQueryCache(ttl=60, max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    # "b" is the least recently used entry
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    assert cache.stats() == {"hits": 2, "misses": 1}
+
+    with mock.patch("eodag_sentinelsat.cache.time.time", return_value=1e12):
+        assert cache.get("a") is None
+
+    cache.invalidate()
+    assert cache.get("c") is None
+
+
+def test_disk_query_cache(tmp_path):
+    """Check that the on-disk cache entries are shared between instances"""
+
+    cache = build_query_cache({"directory": str(tmp_path), "ttl": 60})
+    assert isinstance(cache, DiskQueryCache)
+    cache.set("a", ({"uuid": {"title": "foo"}}, 1))
+
+    other_cache = DiskQueryCache(str(tmp_path))
+    assert other_cache.get("a") == ({"uuid": {"title": "foo"}}, 1)
+    other_cache.invalidate("a")
+    assert cache.get("a") is None
+
+
+def test_disk_query_cache_json(tmp_path):
+    """Check that the on-disk cache entries are JSON, sentinelsat dates included"""
+    cache = DiskQueryCache(str(tmp_path))
+    result = {
+        "title": "foo",
+        "beginposition": datetime.datetime(2020, 5, 1, 10, 30, 24, 500),
+        "ingestiondate": datetime.datetime(
+            2020, 5, 1, 12, tzinfo=datetime.timezone.utc
+        ),
+        "date": datetime.date(2020, 5, 1),
+        "size": 10.5,
+    }
+    cache.set("a", ({"uuid": result}, 1))
+
+    with open(str(tmp_path / "a.json")) as fh:
+        expires_at, value = json.load(fh)
+    assert value == {
+        "$tuple": [
+            {
+                "uuid": {
+                    "title": "foo",
+                    "beginposition": {"$datetime": "2020-05-01T10:30:24.000500"},
+                    "ingestiondate": {"$datetime": "2020-05-01T12:00:00+00:00"},
+                    "date": {"$date": "2020-05-01"},
+                    "size": 10.5,
+                }
+            },
+            1,
+        ]
+    }
+    assert cache.get("a") == ({"uuid": result}, 1)
+    with pytest.raises(TypeError):
+        cache.set("b", object())
+
+
+def test_query_cache_abstract():
+    """Check that the caches must implement the storage methods"""
+    with pytest.raises(TypeError):
+        QueryCache()
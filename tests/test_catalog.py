@@ -0,0 +1,167 @@
+from datetime import datetime
+
+import pytest
+from eodag.utils.exceptions import MisconfiguredError
+from shapely.geometry import box
+
+from eodag_sentinelsat.catalog import CatalogQuery, SQLiteCatalog
+from tests.mock_dhus import synthetic_products
+
+
+def search_requests(dhus):
+    return [r for r in dhus.requests if r == "GET /search"]
+
+
+def test_catalog_coverage(tmp_path):
+    """Check that only the date ranges not searched yet are uncovered"""
+    catalog = SQLiteCatalog(str(tmp_path / "catalog.sqlite"))
+    area = box(0, 0, 10, 10).wkt
+    query = CatalogQuery(
+        "https://hub/",
+        {
+            "producttype": "S2MSI1C",
+            "date": (datetime(2020, 1, 1), datetime(2020, 3, 1)),
+        },
+    )
+    assert catalog.uncovered(query) == [(datetime(2020, 1, 1), datetime(2020, 3, 1))]
+
+    catalog.add_coverage(query, datetime(2020, 1, 10), datetime(2020, 1, 20))
+    catalog.add_coverage(query, datetime(2020, 1, 15), datetime(2020, 2, 1))
+    assert catalog.uncovered(query) == [
+        (datetime(2020, 1, 1), datetime(2020, 1, 10)),
+        (datetime(2020, 2, 1), datetime(2020, 3, 1)),
+    ]
+
+    # Coverage of other criteria, or of a smaller area, does not count
+    other_query = CatalogQuery(
+        "https://hub/",
+        {
+            "producttype": "S2MSI2A",
+            "area": area,
+            "date": (datetime(2020, 1, 1), datetime(2020, 3, 1)),
+        },
+    )
+    catalog.add_coverage(other_query, datetime(2020, 1, 1), datetime(2020, 3, 1))
+    small_area_query = CatalogQuery(
+        "https://hub/",
+        {
+            "producttype": "S2MSI1C",
+            "area": box(0, 0, 1, 1).wkt,
+            "date": (datetime(2020, 1, 1), datetime(2020, 3, 1)),
+        },
+    )
+    catalog.add_coverage(small_area_query, datetime(2020, 1, 1), datetime(2020, 3, 1))
+    area_query = CatalogQuery(
+        "https://hub/",
+        {
+            "producttype": "S2MSI1C",
+            "area": area,
+            "date": (datetime(2020, 1, 1), datetime(2020, 2, 15)),
+        },
+    )
+    assert catalog.uncovered(area_query) == [
+        (datetime(2020, 1, 1), datetime(2020, 1, 10)),
+        (datetime(2020, 2, 1), datetime(2020, 2, 15)),
+    ]
+    # Searches without a geometry cover all the geometries
+    assert catalog.uncovered(small_area_query) == []
+
+    catalog.invalidate()
+    assert len(catalog.uncovered(query)) == 1
+    catalog.close()
+
+
+def test_catalog_hybrid_search(plugin_api, mock_dhus):
+    """Check that only the date ranges not covered by the catalog are searched"""
+    products, properties = synthetic_products(48, size=10, archives=False)
+    dhus = mock_dhus(products, properties=properties)
+    plugin_api.config.endpoint = dhus.url
+    plugin_api.config.catalog = {"source": "hybrid"}
+
+    search_result, count = plugin_api.query(
+        productType="S2_MSI_L1C",
+        startTimeFromAscendingNode="2020-05-01T12:00:00Z",
+        completionTimeFromAscendingNode="2020-05-02T00:00:00Z",
+    )
+    assert count == 12
+    assert len(search_requests(dhus)) == 1
+
+    # Already covered, even for a smaller geometry
+    search_result, count = plugin_api.query(
+        productType="S2_MSI_L1C",
+        startTimeFromAscendingNode="2020-05-01T12:00:00Z",
+        completionTimeFromAscendingNode="2020-05-01T18:00:00Z",
+        items_per_page=2,
+        page=2,
+    )
+    assert count == 6
+    assert [p.properties["uuid"] for p in search_result] == [
+        "uuid-000004",
+        "uuid-000005",
+    ]
+    search_result, count = plugin_api.query(
+        productType="S2_MSI_L1C",
+        startTimeFromAscendingNode="2020-05-01T12:00:00Z",
+        completionTimeFromAscendingNode="2020-05-02T00:00:00Z",
+        geometry=box(1.2, 44.2, 1.8, 44.8),
+    )
+    assert [p.properties["uuid"] for p in search_result] == ["uuid-000010"]
+    assert len(search_requests(dhus)) == 1
+    assert all(p.properties["storageStatus"] == "ONLINE" for p in search_result)
+
+    # Only the uncovered date range is searched
+    _, count = plugin_api.query(
+        productType="S2_MSI_L1C",
+        startTimeFromAscendingNode="2020-05-01T12:00:00Z",
+        completionTimeFromAscendingNode="2020-05-02T12:00:00Z",
+    )
+    assert count == 24
+    assert len(search_requests(dhus)) == 2
+    query_params, _ = plugin_api._update_keyword(
+        productType="S2_MSI_L1C",
+        startTimeFromAscendingNode="2020-05-01T00:00:00Z",
+        completionTimeFromAscendingNode="2020-05-02T12:00:00Z",
+    )
+    query = CatalogQuery(plugin_api.config.endpoint, query_params)
+    assert plugin_api.get_catalog().uncovered(query) == [
+        (datetime(2020, 5, 1), datetime(2020, 5, 1, 12))
+    ]
+
+    # Uncovered date ranges are searched by pages
+    plugin_api.config.pagination["max_items_per_page"] = 5
+    _, count = plugin_api.query(
+        productType="S2_MSI_L1C",
+        startTimeFromAscendingNode="2020-05-02T12:00:00Z",
+        completionTimeFromAscendingNode="2020-05-03T00:00:00Z",
+    )
+    assert count == 12
+    assert len(search_requests(dhus)) == 5
+
+    # The remote source bypasses the catalog
+    _, count = plugin_api.query(productType="S2_MSI_L1C", source="remote")
+    assert count == 48
+    assert len(search_requests(dhus)) == 6
+
+
+def test_catalog_local_search(plugin_api, mock_dhus):
+    """Check that the products found on the hub are searched locally"""
+    products, properties = synthetic_products(10, size=10, archives=False)
+    dhus = mock_dhus(products, properties=properties)
+    plugin_api.config.endpoint = dhus.url
+
+    with pytest.raises(MisconfiguredError):
+        plugin_api.query(productType="S2_MSI_L1C", source="local")
+
+    plugin_api.config.catalog = True
+    _, count = plugin_api.query(productType="S2_MSI_L1C", source="local")
+    assert count == 0
+    remote_result, _ = plugin_api.query(productType="S2_MSI_L1C", items_per_page=5)
+
+    search_result, count = plugin_api.query(productType="S2_MSI_L1C", source="local")
+    assert count == 5
+    assert [p.properties for p in search_result] == [
+        p.properties for p in remote_result
+    ]
+    assert len(search_requests(dhus)) == 1
+    _, count = plugin_api.query(productType="S2_MSI_L2A", source="local")
+    assert count == 0
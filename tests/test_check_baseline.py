@@ -0,0 +1,48 @@
+import json
+
+from benchmarks.check_baseline import check, main, relative_times
+
+
+def benchmark_results(times):
+    """Results like the ones saved by pytest-benchmark"""
+    return {
+        "benchmarks": [
+            {"name": name, "stats": {"min": time, "mean": time * 2}}
+            for name, time in times.items()
+        ]
+    }
+
+
+def test_check_baseline(tmp_path, capsys):
+    """Check that benchmarks are compared to the baseline relatively to the reference"""
+    baseline_path = str(tmp_path / "baseline.json")
+    results_path = tmp_path / "results.json"
+    results_path.write_text(
+        json.dumps(
+            benchmark_results({"test_reference": 0.05, "test_a": 0.1, "test_b": 0.5})
+        )
+    )
+    slower_path = tmp_path / "slower.json"
+    slower_path.write_text(
+        json.dumps(benchmark_results({"test_reference": 0.05, "test_a": 0.2}))
+    )
+    args = [str(results_path), str(slower_path), "--baseline", baseline_path]
+    assert main(args + ["--save"]) == 0
+    # Slowest run of each benchmark
+    with open(baseline_path) as fh:
+        assert json.load(fh)["ratios"] == {"test_a": 4.0, "test_b": 10.0}
+
+    # Twice slower machine
+    results = benchmark_results(
+        {"test_reference": 0.1, "test_a": 0.2, "test_b": 1.0, "test_c": 1.0}
+    )
+    lines, regressions = check(relative_times(results), {"test_a": 4, "test_b": 10})
+    assert regressions == []
+    assert "no baseline" in lines[2]
+
+    results = benchmark_results({"test_reference": 0.1, "test_a": 0.8, "test_b": 1})
+    results_path.write_text(json.dumps(results))
+    args = [str(results_path), "--baseline", baseline_path]
+    assert main(args) == 1
+    assert "Slower by more than 50%: test_a" in capsys.readouterr().out
+    assert main(args + ["--tolerance", "2"]) == 0
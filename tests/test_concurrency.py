@@ -0,0 +1,99 @@
+import os
+import threading
+from unittest import mock
+
+from eodag_sentinelsat.concurrency import AdaptiveConcurrency
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def measure(concurrency, clock, throughput):
+    """Simulate transfers receiving bytes at the given throughput during a measure"""
+    clock.now += concurrency.interval
+    concurrency.record(throughput * concurrency.interval)
+
+
+def test_adaptive_concurrency():
+    """Check that the limit increases while the throughput improves, up to its ceiling"""
+    clock = FakeClock()
+    concurrency = AdaptiveConcurrency(max_concurrency=3, interval=1, clock=clock)
+    assert concurrency.limit == 1
+
+    with concurrency.slot():
+        measure(concurrency, clock, 100)
+        assert concurrency.limit == 2
+        # Not all slots used: the limit is kept
+        measure(concurrency, clock, 100)
+        assert concurrency.limit == 2
+        with concurrency.slot():
+            measure(concurrency, clock, 200)
+            assert concurrency.limit == 3
+            with concurrency.slot():
+                # The last increase did not help
+                measure(concurrency, clock, 150)
+                assert concurrency.limit == 2
+    assert concurrency.stats() == {"limit": 2, "active": 0, "throughput": 150}
+
+    concurrency.limit = 3
+    with concurrency.slot(), concurrency.slot(), concurrency.slot():
+        measure(concurrency, clock, 300)
+        assert concurrency.limit == 3
+
+
+def test_adaptive_concurrency_backoff():
+    """Check that the limit is halved on failures, once per measure, down to its minimum"""
+    clock = FakeClock()
+    concurrency = AdaptiveConcurrency(
+        initial=8, max_concurrency=8, interval=1, clock=clock
+    )
+    concurrency.backoff("throttled")
+    concurrency.backoff("throttled")
+    assert concurrency.limit == 4
+    for _ in range(3):
+        clock.now += 1
+        concurrency.backoff("throttled")
+    assert concurrency.limit == 1
+
+
+def test_adaptive_concurrency_slots():
+    """Check that a transfer waits for a free slot"""
+    concurrency = AdaptiveConcurrency(initial=1)
+    acquired = threading.Event()
+
+    def transfer():
+        with concurrency.slot():
+            acquired.set()
+
+    with concurrency.slot():
+        thread = threading.Thread(target=transfer)
+        thread.start()
+        assert not acquired.wait(0.1)
+    assert acquired.wait(10)
+    thread.join()
+
+
+def test_download_adaptive_concurrency(plugin_api, mock_dhus):
+    """Check that downloads hold a slot of the limit and back off when throttled"""
+    contents = {"uuid-%s" % i: os.urandom(1000) for i in range(6)}
+    dhus = mock_dhus(contents, throttle=["uuid-0"])
+    plugin_api.config.endpoint = dhus.url
+    plugin_api.config.adaptive_concurrency = {"initial": 2, "max": 4}
+    search_result, _ = plugin_api.query(productType="S2_MSI_L1C")
+
+    with mock.patch("sentinelsat.download._wait"):
+        paths = plugin_api.download_all(search_result, extract=False)
+
+    assert len(paths) == 6
+    for product, path in zip(search_result, paths):
+        with open(path, "rb") as fh:
+            assert fh.read() == contents[product.properties["uuid"]]
+    assert dhus.max_transfers <= 2
+    concurrency = plugin_api.get_download_concurrency()
+    assert concurrency.limit == 1
+    assert concurrency.max_concurrency == 4
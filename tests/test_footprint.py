@@ -0,0 +1,142 @@
+from unittest import mock
+
+from shapely import wkt
+from shapely.affinity import rotate
+from shapely.geometry import LineString, Point, Polygon, box
+
+from eodag_sentinelsat.footprint import (
+    FootprintSimplifier,
+    build_footprint_simplifier,
+)
+from tests.mock_dhus import synthetic_products
+
+
+def test_footprint_simplifier():
+    """Check that long geometries are replaced by shorter ones covering them"""
+    simplifier = FootprintSimplifier(max_length=500)
+    short = Point(2, 44).buffer(0.5, 2).wkt
+    assert simplifier.simplify(short).wkt == short
+    assert simplifier.simplify(short).original is None
+
+    detailed = Point(2, 44).buffer(0.5, 1000)
+    simplified = simplifier.simplify(detailed.wkt)
+    assert simplified.method == "simplify"
+    assert len(simplified.wkt) <= 500
+    assert wkt.loads(simplified.wkt).covers(detailed)
+
+    # Cached by geometry hash
+    assert simplifier.simplify(detailed.wkt) is simplified
+    assert simplifier.stats() == {"hits": 1, "misses": 1}
+
+    # Falls back to the bounding box
+    simplified = FootprintSimplifier(max_length=100, steps=0).simplify(detailed.wkt)
+    assert simplified.method == "envelope"
+    assert wkt.loads(simplified.wkt).equals(detailed.envelope)
+
+    # A larger geometry would miss footprints containing the original one
+    assert simplifier.simplify(detailed.wkt, "Contains").wkt == detailed.wkt
+
+
+def test_footprint_simplifier_covers():
+    """Check that candidates no longer covering the geometry once rounded are skipped"""
+    # Redundant vertices along the sides of a square, rounded inwards to 1 decimal
+    side = [0.06 + 0.88 * i / 50 for i in range(50)]
+    square = Polygon(
+        [(x, 0.06) for x in side]
+        + [(0.94, y) for y in side]
+        + [(x, 0.94) for x in reversed(side)]
+        + [(0.06, y) for y in reversed(side)]
+    )
+    simplifier = FootprintSimplifier(max_length=500, precision=1)
+    simplified = simplifier.simplify(square.wkt)
+    assert simplified.method == "simplify"
+    assert wkt.loads(simplified.wkt).covers(simplified.original)
+
+    simplified = FootprintSimplifier(max_length=60, steps=0, precision=1).simplify(
+        "POLYGON ((0.06 0.06, 0.94 0.06, 0.94 0.94, 0.06 0.94, 0.06 0.06))"
+    )
+    assert simplified.method == "envelope"
+    assert wkt.loads(simplified.wkt).equals(box(0, 0, 1, 1))
+
+
+def test_update_keyword_area(plugin_api):
+    """Check that eodag's search geometry is only replaced by a simplified one"""
+    simplifier = plugin_api.footprint_simplifier = build_footprint_simplifier(
+        {"max_length": 500}
+    )
+    detailed = Point(2, 44).buffer(0.5, 1000)
+    short = Point(2, 44).buffer(0.5, 4)
+    bind_query_plan = plugin_api._bind_query_plan
+
+    def update_keyword(geometry, relation=None):
+        def bind(*args):
+            qp, qs = bind_query_plan(*args)
+            if relation is not None:
+                qp["area_relation"] = relation
+            return qp, qs
+
+        with mock.patch.object(plugin_api, "_bind_query_plan", side_effect=bind):
+            qp, _ = plugin_api._update_keyword(
+                productType="S2_MSI_L1C", geometry=geometry
+            )
+        return qp["area"]
+
+    assert update_keyword(detailed) == simplifier.dumps(detailed)
+    # Neither simplified nor filtered by the plugin
+    assert update_keyword(detailed, "Contains") != simplifier.dumps(detailed)
+    assert update_keyword(short) != simplifier.dumps(short)
+
+
+def test_footprint_filter():
+    """Check that results are filtered on the original geometry"""
+    area = LineString([(0, 0), (10, 10)]).buffer(0.1, 64)
+    simplified = FootprintSimplifier(max_length=100, steps=0).simplify(area.wkt)
+    results = {
+        "crossed": {"footprint": "POLYGON((4 4,6 4,6 6,4 6,4 4))"},
+        "corner": {"footprint": "POLYGON((8 0,10 0,10 2,8 2,8 0))"},
+        "unknown": {"footprint": None},
+    }
+    assert set(simplified.filter(results)) == {"crossed", "unknown"}
+
+    within = FootprintSimplifier(max_length=100, steps=0).simplify(area.wkt, "IsWithin")
+    assert set(within.filter(results)) == {"unknown"}
+
+
+def test_query_simplified_footprint(plugin_api, mock_dhus):
+    """Check that a simpler geometry is searched, and the results filtered"""
+    products, properties = synthetic_products(100, size=10, archives=False)
+    dhus = mock_dhus(products, properties=properties)
+    plugin_api.config.endpoint = dhus.url
+    # A diagonal band, crossing 5 tiles of the grid
+    band = LineString([(1.5, 43.3), (3.5, 45.7)]).buffer(0.05, 256)
+    expected = {
+        uuid
+        for uuid, product in properties.items()
+        if wkt.loads(product["footprint"]).intersects(band)
+    }
+    assert len(expected) == 5
+    plugin_api.footprint_simplifier = build_footprint_simplifier(
+        {"max_length": 300, "steps": 0}
+    )
+    search_result, simplified_count = plugin_api.query(
+        productType="S2_MSI_L1C", geometry=band, items_per_page=100
+    )
+    assert {p.properties["uuid"] for p in search_result} == expected
+    # The bounding box searched instead covers 9 tiles
+    assert simplified_count == 9
+    assert plugin_api.footprint_simplifier.stats() == {"hits": 0, "misses": 1}
+
+
+def test_query_boundary_products(plugin_api, mock_dhus):
+    """Check that the products near the boundary of a detailed geometry are found"""
+    products, properties = synthetic_products(100, size=10, archives=False)
+    dhus = mock_dhus(products, properties=properties)
+    plugin_api.config.endpoint = dhus.url
+    plugin_api.footprint_simplifier = build_footprint_simplifier(True)
+    # A disc slightly overlapping the 4 tiles around the one it is centered on
+    disc = rotate(Point(2.5, 44.5).buffer(0.53, 500), 22, origin=(2.5, 44.5))
+
+    search_result, count = plugin_api.query(
+        productType="S2_MSI_L1C", geometry=disc, items_per_page=100
+    )
+    assert count == len(search_result) == 5
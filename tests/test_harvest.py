@@ -0,0 +1,74 @@
+from datetime import datetime
+
+from tests.mock_dhus import synthetic_products
+
+
+def harvest(plugin_api, **kwargs):
+    return [
+        p.properties["uuid"]
+        for p in plugin_api.harvest(productType="S2_MSI_L1C", **kwargs)
+    ]
+
+
+def add_product(products, properties, uuid, ingestiondate):
+    products[uuid] = b"0"
+    properties[uuid] = {
+        "date": "2020-05-01T10:00:00.000Z",
+        "ingestiondate": ingestiondate,
+    }
+
+
+def test_harvest(plugin_api, mock_dhus):
+    """Check that each run returns the products ingested since the previous one"""
+    products, properties = synthetic_products(10, size=10, archives=False)
+    # Ingested in the reverse order of their uuids
+    for i, uuid in enumerate(sorted(properties)):
+        properties[uuid]["ingestiondate"] = "2020-05-02T%02d:00:00.000Z" % (9 - i)
+    dhus = mock_dhus(products, properties=properties)
+    plugin_api.config.endpoint = dhus.url
+    plugin_api.config.harvest = {"overlap": 1800}
+
+    assert harvest(plugin_api, items_per_page=4) == sorted(products, reverse=True)
+    watermarks = plugin_api.get_harvest_watermarks()
+    assert watermarks.get("daily") is None
+    name = next(iter(watermarks._conn.execute("SELECT name FROM watermarks")))[0]
+    assert watermarks.get(name) == datetime(2020, 5, 2, 9)
+    assert harvest(plugin_api) == []
+
+    # New products, and one published late but within the overlap
+    add_product(products, properties, "uuid-new", "2020-05-02T10:00:00.000Z")
+    add_product(products, properties, "uuid-late", "2020-05-02T08:45:00.000Z")
+    add_product(products, properties, "uuid-too-late", "2020-05-02T08:00:00.000Z")
+    assert harvest(plugin_api) == ["uuid-late", "uuid-new"]
+    assert watermarks.get(name) == datetime(2020, 5, 2, 10)
+
+    # From a given date, only the products harvested during the overlap are skipped
+    assert harvest(plugin_api, since="2020-05-02T08:00:00Z") == [
+        "uuid-000001",
+        "uuid-too-late",
+        "uuid-late",
+        "uuid-000000",
+    ]
+
+
+def test_harvest_interrupted(plugin_api, mock_dhus):
+    """Check that the products of a page not fully consumed are returned again"""
+    products, properties = synthetic_products(6, size=10, archives=False)
+    dhus = mock_dhus(products, properties=properties)
+    plugin_api.config.endpoint = dhus.url
+
+    products_iterator = plugin_api.harvest(
+        name="test", items_per_page=2, productType="S2_MSI_L1C"
+    )
+    first = [next(products_iterator).properties["uuid"] for _ in range(3)]
+    products_iterator.close()
+    assert first == ["uuid-000000", "uuid-000001", "uuid-000002"]
+
+    assert harvest(plugin_api, name="test", items_per_page=2) == [
+        "uuid-000002",
+        "uuid-000003",
+        "uuid-000004",
+        "uuid-000005",
+    ]
+    plugin_api.get_harvest_watermarks().reset("test")
+    assert len(harvest(plugin_api, name="test")) == 6
@@ -0,0 +1,182 @@
+import io
+import os
+import threading
+import zipfile
+from unittest import mock
+
+import pytest
+import requests
+
+from eodag_sentinelsat.eodag_sentinelsat import (
+    SentinelsatAPI,
+    _ProductDownloader,
+)
+from eodag_sentinelsat.journal import (
+    DOWNLOADING,
+    EXTRACTED,
+    MOVED,
+    QUEUED,
+    DownloadJournal,
+)
+
+
+class Crash(BaseException):
+    """Simulate a crash of the process"""
+
+
+def safe_archive(uuid, files=3):
+    """A zip archive like the ones of Sentinel products"""
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zfile:
+        for i in range(files):
+            zfile.writestr("S2A_MSIL1C_%s.SAFE/file%s" % (uuid, i), os.urandom(100))
+    return archive.getvalue()
+
+
+def test_download_journal(tmp_path):
+    """Check that products stages are journaled"""
+    journal = DownloadJournal(str(tmp_path / "journal.sqlite"))
+    journal.set_many([("uuid-%s" % i, QUEUED, "/path/%s" % i, None) for i in range(3)])
+    journal.set("uuid-1", DOWNLOADING, "/path/1", 100)
+
+    assert journal.lookup(["uuid-0", "uuid-1", "uuid-3"]) == {
+        "uuid-0": (QUEUED, "/path/0", None),
+        "uuid-1": (DOWNLOADING, "/path/1", 100),
+    }
+    journal.remove(["uuid-0", "uuid-1"])
+    journal.close()
+
+    journal = DownloadJournal(str(tmp_path / "journal.sqlite"))
+    assert journal.lookup(["uuid-%s" % i for i in range(3)]) == {
+        "uuid-2": (QUEUED, "/path/2", None)
+    }
+
+
+def test_resume_interrupted_download(plugin_api, mock_dhus, tmp_path):
+    """Check that an interrupted download is resumed with a range request"""
+    plugin_api.config.download_journal = True
+    content = os.urandom(3 * 2**20)
+    dhus = mock_dhus({"uuid-0": content}, interrupt={"uuid-0": 2**20 + 1000})
+    plugin_api.config.endpoint = dhus.url
+    search_result, _ = plugin_api.query(productType="S2_MSI_L1C")
+
+    assert plugin_api.download_all(search_result, extract=False, max_attempts=1) == []
+    journal = plugin_api._get_download_journal()
+    stage, path, downloaded_bytes = journal.lookup(["uuid-0"])["uuid-0"]
+    assert stage == DOWNLOADING
+    assert os.path.getsize(path + ".incomplete") == downloaded_bytes > 0
+
+    paths = plugin_api.download_all(search_result, extract=False)
+
+    assert paths == [path]
+    with open(path, "rb") as fh:
+        assert fh.read() == content
+    assert dhus.ranges == [("uuid-0", "bytes=%s-" % downloaded_bytes)]
+    assert journal.lookup(["uuid-0"]) == {}
+
+
+def test_resume_interrupted_extraction(plugin_api, mock_dhus, tmp_path):
+    """Check that a product whose extraction crashed is extracted again, not downloaded"""
+    plugin_api.config.download_journal = True
+    dhus = mock_dhus({"uuid-0": safe_archive("uuid-0")})
+    plugin_api.config.endpoint = dhus.url
+    search_result, _ = plugin_api.query(productType="S2_MSI_L1C")
+
+    extract = zipfile.ZipFile.extract
+
+    def crashing_extract(zfile, member, path=None, pwd=None):
+        if member.filename.endswith("file1"):
+            raise Crash()
+        return extract(zfile, member, path=path, pwd=pwd)
+
+    with mock.patch.object(zipfile.ZipFile, "extract", crashing_extract):
+        with pytest.raises(Crash):
+            plugin_api.download_all(search_result)
+    journal = plugin_api._get_download_journal()
+    assert journal.lookup(["uuid-0"])["uuid-0"][0] == MOVED
+    extract_dir = tmp_path / "S2A_MSIL1C_uuid-0"
+    assert len(list(extract_dir.glob("**/file*"))) == 1
+
+    dhus.requests.clear()
+    paths = plugin_api.download_all(search_result)
+
+    assert len(paths) == 1
+    assert len(list(extract_dir.glob("**/file*"))) == 3
+    assert "GET /odata/v1/Products('uuid-0')/$value" not in dhus.requests
+    assert journal.lookup(["uuid-0"]) == {}
+    # The download has been recorded
+    assert plugin_api._prepare_downloads(search_result)[0].to_download is False
+
+
+def test_resume_after_extraction(plugin_api, mock_dhus, tmp_path):
+    """Check that a product extracted before a crash is only recorded"""
+    plugin_api.config.download_journal = True
+    dhus = mock_dhus({"uuid-0": safe_archive("uuid-0")})
+    plugin_api.config.endpoint = dhus.url
+    search_result, _ = plugin_api.query(productType="S2_MSI_L1C")
+
+    def crash(plugin, product_managers, **kwargs):
+        for pm in product_managers:
+            pm.finalize_future.result()
+        raise Crash()
+
+    with mock.patch.object(
+        SentinelsatAPI, "_finalize_downloads", autospec=True, side_effect=crash
+    ):
+        with pytest.raises(Crash):
+            plugin_api.download_all(search_result)
+    journal = plugin_api._get_download_journal()
+    stage, path, _ = journal.lookup(["uuid-0"])["uuid-0"]
+    assert stage == EXTRACTED
+
+    dhus.requests.clear()
+    assert plugin_api.download_all(search_result) == [path]
+    assert not any(
+        r.startswith("GET /odata/v1/Products('uuid-0')") for r in dhus.requests
+    )
+    assert plugin_api._prepare_downloads(search_result)[0].to_download is False
+
+
+def test_resume_without_range_support(tmp_path):
+    """Check that a download is restarted if the server ignores range requests"""
+    api = mock.MagicMock(concurrent_dl_limit=2, dl_limit_semaphore=threading.Lock())
+    api.session.get.return_value.status_code = 200
+    api.session.get.return_value.iter_content.return_value = iter([b"full content"])
+    path = tmp_path / "S2A_MSIL1C_uuid-0.zip.incomplete"
+    path.write_bytes(b"full")
+
+    downloader = _ProductDownloader(api)
+    downloaded_bytes = downloader._download("url", path, 12, path.name, None)
+
+    assert api.session.get.call_args[1]["headers"] == {"Range": "bytes=4-"}
+    assert downloaded_bytes == 12
+    assert path.read_bytes() == b"full content"
+
+
+def test_short_transfer_kept_incomplete(tmp_path):
+    """Check that a transfer ending early is retried from its incomplete file"""
+    api = mock.MagicMock(concurrent_dl_limit=2, dl_limit_semaphore=threading.Lock())
+    api.session.get.return_value.status_code = 200
+    api.session.get.return_value.iter_content.return_value = iter([b"trunc"])
+    path = tmp_path / "S2A_MSIL1C_uuid-0.zip"
+    product_info = {"id": "uuid-0", "url": "url", "size": 12, "path": str(path)}
+    journal = DownloadJournal(str(tmp_path / "journal.sqlite"))
+
+    downloader = _ProductDownloader(api)
+    downloader.journal = journal
+    downloader.verify_checksum = False
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        downloader._download_journaled(product_info, path, None)
+
+    assert not path.exists()
+    temp_path = path.with_name(path.name + ".incomplete")
+    assert temp_path.read_bytes() == b"trunc"
+    assert journal.lookup(["uuid-0"]) == {"uuid-0": (DOWNLOADING, str(path), 5)}
+
+    api.session.get.return_value.status_code = 206
+    api.session.get.return_value.iter_content.return_value = iter([b"ed body"])
+    downloader._download_journaled(product_info, path, None)
+
+    assert api.session.get.call_args[1]["headers"] == {"Range": "bytes=5-"}
+    assert path.read_bytes() == b"trunced body"
+    assert not temp_path.exists()
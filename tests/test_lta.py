@@ -0,0 +1,171 @@
+import os
+import time
+from unittest import mock
+
+import pytest
+from eodag.utils.exceptions import DownloadError
+from sentinelsat.exceptions import InvalidKeyError
+
+from eodag_sentinelsat.lta import ORDERED, LTAScheduler
+
+
+def wait_for(condition, timeout=10):
+    """Wait until a condition is fulfilled"""
+    start = time.monotonic()
+    while not condition():
+        assert time.monotonic() - start < timeout
+        time.sleep(0.01)
+
+
+def test_lta_scheduler(plugin_api, mock_dhus, tmp_path):
+    """Check that products are ordered within the quota and downloaded once ONLINE"""
+    contents = {"uuid-%s" % i: os.urandom(100) for i in range(4)}
+    dhus = mock_dhus(contents, offline=["uuid-1", "uuid-2", "uuid-3"], lta_checks=2)
+    plugin_api.config.endpoint = dhus.url
+    plugin_api.config.outputs_prefix = str(tmp_path)
+    plugin_api.config.lta_scheduler = {"poll_interval": 0.05, "max_orders": 2}
+    search_result, _ = plugin_api.query(productType="S2_MSI_L1C")
+
+    scheduler = plugin_api.get_lta_scheduler()
+    try:
+        futures = plugin_api.order_all(search_result, extract=False)
+        paths = [future.result(timeout=10) for future in futures]
+    finally:
+        scheduler.close()
+
+    for product, path in zip(search_result, paths):
+        with open(path, "rb") as fh:
+            assert fh.read() == contents[product.properties["uuid"]]
+    assert dhus.max_ordered == 2
+    assert not dhus.offline
+    assert scheduler.pending() == {}
+    assert os.path.isfile(tmp_path / ".lta_queue.sqlite")
+
+
+def test_lta_scheduler_restart(plugin_api, mock_dhus, tmp_path):
+    """Check that pending orders are resumed by a new scheduler"""
+    dhus = mock_dhus({"uuid-0": b"content"}, offline=["uuid-0"], lta_checks=2)
+    plugin_api.config.endpoint = dhus.url
+    search_result, _ = plugin_api.query(productType="S2_MSI_L1C")
+    queue_path = str(tmp_path / "queue.sqlite")
+
+    scheduler = LTAScheduler(plugin_api, queue_path, poll_interval=60)
+    future = scheduler.submit(
+        search_result[0], outputs_prefix=str(tmp_path), extract=False
+    )
+    wait_for(lambda: scheduler._orders["uuid-0"].status == ORDERED)
+    scheduler.close()
+    assert not future.done()
+    assert "uuid-0" in dhus.ordered
+
+    scheduler = LTAScheduler(plugin_api, queue_path, poll_interval=0.05)
+    try:
+        pending = scheduler.pending()
+        assert list(pending) == ["uuid-0"]
+        assert scheduler._orders["uuid-0"].product.properties["id"] == (
+            search_result[0].properties["id"]
+        )
+        scheduler.start()
+        path = pending["uuid-0"].result(timeout=10)
+    finally:
+        scheduler.close()
+
+    # Not ordered again
+    assert dhus.requests.count("GET /odata/v1/Products('uuid-0')/$value") == 2
+    assert os.path.basename(path) == "S2A_MSIL1C_uuid-0.zip"
+    assert LTAScheduler(plugin_api, queue_path).pending() == {}
+
+
+def test_lta_scheduler_max_attempts(plugin_api, mock_dhus, tmp_path):
+    """Check that products failing to download are given up after some attempts"""
+    dhus = mock_dhus({"uuid-0": b"content"})
+    plugin_api.config.endpoint = dhus.url
+    search_result, _ = plugin_api.query(productType="S2_MSI_L1C")
+    # Each download fails on the checksum
+    dhus.corrupt.add("uuid-0")
+    queue_path = str(tmp_path / "queue.sqlite")
+
+    scheduler = LTAScheduler(plugin_api, queue_path, poll_interval=0.05, max_attempts=2)
+    try:
+        future = scheduler.submit(
+            search_result[0],
+            outputs_prefix=str(tmp_path),
+            extract=False,
+            max_attempts=1,
+        )
+        with pytest.raises(DownloadError, match="after 2 attempts"):
+            future.result(timeout=10)
+    finally:
+        scheduler.close()
+    assert LTAScheduler(plugin_api, queue_path).pending() == {}
+
+
+def test_lta_scheduler_submit(plugin_api, mock_dhus, tmp_path):
+    """Check the download options of the orders and the scheduler replaced once closed"""
+    dhus = mock_dhus({"uuid-0": b"content"}, offline=["uuid-0"])
+    plugin_api.config.endpoint = dhus.url
+    plugin_api.config.outputs_prefix = str(tmp_path)
+    plugin_api.config.lta_scheduler = {"poll_interval": 60}
+    search_result, _ = plugin_api.query(productType="S2_MSI_L1C")
+
+    scheduler = plugin_api.get_lta_scheduler()
+    with pytest.raises(ValueError, match="JSON serializable"):
+        scheduler.submit(search_result[0], outputs_prefix=tmp_path)
+    assert scheduler.pending() == {}
+    # Not kept in the queue
+    scheduler.submit(search_result[0], progress_callback=object(), extract=False)
+    assert scheduler._orders["uuid-0"].download_kwargs == {"extract": False}
+    scheduler.close()
+
+    with pytest.raises(RuntimeError, match="closed"):
+        scheduler.submit(search_result[0])
+    new_scheduler = plugin_api.get_lta_scheduler()
+    try:
+        assert new_scheduler is not scheduler
+        assert list(new_scheduler.pending()) == ["uuid-0"]
+    finally:
+        new_scheduler.close()
+
+
+def test_lta_scheduler_status_fallback(plugin_api, mock_dhus, tmp_path):
+    """Check that storage statuses missing from OData are checked one by one"""
+    dhus = mock_dhus({"uuid-0": b"content"})
+    plugin_api.config.endpoint = dhus.url
+    search_result, _ = plugin_api.query(productType="S2_MSI_L1C")
+
+    scheduler = LTAScheduler(plugin_api, str(tmp_path / "queue.sqlite"))
+    try:
+        with mock.patch.object(plugin_api, "_get_online_statuses", return_value={}):
+            future = scheduler.submit(
+                search_result[0], outputs_prefix=str(tmp_path), extract=False
+            )
+            path = future.result(timeout=10)
+    finally:
+        scheduler.close()
+    assert os.path.basename(path) == "S2A_MSIL1C_uuid-0.zip"
+    assert "GET /odata/v1/Products('uuid-0')/Online/$value" in dhus.requests
+
+
+def test_lta_scheduler_unknown_product(plugin_api, mock_dhus, tmp_path):
+    """Check that the orders of products unknown to the provider fail"""
+    dhus = mock_dhus({"uuid-0": b"content"}, offline=["uuid-0"])
+    plugin_api.config.endpoint = dhus.url
+    search_result, _ = plugin_api.query(productType="S2_MSI_L1C")
+    queue_path = str(tmp_path / "queue.sqlite")
+
+    scheduler = LTAScheduler(plugin_api, queue_path, poll_interval=0.05)
+    try:
+        with mock.patch.object(
+            plugin_api, "_get_online_statuses", return_value={}
+        ), mock.patch.object(
+            plugin_api, "_is_online", side_effect=InvalidKeyError("Invalid key", None)
+        ):
+            future = scheduler.submit(
+                search_result[0], outputs_prefix=str(tmp_path), extract=False
+            )
+            with pytest.raises(InvalidKeyError):
+                future.result(timeout=10)
+    finally:
+        scheduler.close()
+    assert "uuid-0" not in dhus.ordered
+    assert LTAScheduler(plugin_api, queue_path).pending() == {}
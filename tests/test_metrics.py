@@ -0,0 +1,178 @@
+import logging
+import os
+import socket
+from unittest import mock
+from urllib.request import urlopen
+
+import pytest
+
+from eodag_sentinelsat.metrics import (
+    Metrics,
+    build_metrics,
+    opentelemetry_hook,
+    prometheus_text,
+)
+
+
+def test_metrics():
+    """Check that phases are timed, counted and passed to the hooks"""
+    metrics = Metrics()
+    records = []
+    metrics.add_hook(records.append)
+
+    with metrics.phase("query", products=10):
+        pass
+    with pytest.raises(ValueError):
+        with metrics.phase("query") as phase:
+            phase.set(products=0)
+            raise ValueError()
+    metrics.add("downloaded_bytes", 100)
+    metrics.add("downloaded_bytes", 50)
+    metrics.gauge("download_concurrency", lambda: 4)
+
+    assert [(r.name, r.attributes) for r in records] == [
+        ("query", {"products": 10}),
+        ("query", {"products": 0}),
+    ]
+    assert isinstance(records[1].error, ValueError)
+    snapshot = metrics.snapshot()
+    assert snapshot["phases"]["query"]["count"] == 2
+    assert snapshot["phases"]["query"]["errors"] == 1
+    assert snapshot["counters"] == {"downloaded_bytes": 150}
+    assert snapshot["gauges"] == {"download_concurrency": 4}
+
+    text = metrics.prometheus_text()
+    assert 'eodag_sentinelsat_phase_seconds_count{phase="query"} 2\n' in text
+    assert 'eodag_sentinelsat_phase_errors_total{phase="query"} 1\n' in text
+    assert "eodag_sentinelsat_downloaded_bytes_total 150\n" in text
+    assert "eodag_sentinelsat_download_concurrency 4.0\n" in text
+
+
+def test_prometheus_exporter(tmp_path):
+    """Check that metrics are written to a file and served over HTTP"""
+    metrics = Metrics(prefix="test")
+    metrics.add("downloaded_products")
+
+    path = str(tmp_path / "metrics.prom")
+    metrics.write_prometheus(path)
+    with open(path) as fh:
+        assert fh.read() == metrics.prometheus_text()
+
+    server = metrics.serve_prometheus(0, "127.0.0.1")
+    try:
+        url = "http://127.0.0.1:%s/metrics" % server.server_address[1]
+        with urlopen(url) as response:
+            assert b"test_downloaded_products_total 1\n" in response.read()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_prometheus_server_lazy(caplog):
+    """Check that the configured server is started once, when a phase ends"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+        # The port is busy: the error is logged, not raised
+        busy = build_metrics({"prometheus_port": port})
+        with caplog.at_level(logging.WARNING, "eodag.plugins.apis.sentinelsat"):
+            with busy.phase("query"):
+                pass
+        assert "Could not serve Prometheus metrics" in caplog.text
+
+    first = build_metrics({"prometheus_port": port, "prefix": "first"})
+    second = build_metrics({"prometheus_port": port, "prefix": "second"})
+    url = "http://127.0.0.1:%s/metrics" % port
+    with pytest.raises(OSError):
+        urlopen(url)
+    with first.phase("query"):
+        pass
+    server = first.serve_prometheus(port)
+    try:
+        with second.phase("query"):
+            pass
+        assert second.serve_prometheus(port) is server
+        with urlopen(url) as response:
+            body = response.read()
+        assert b'first_phase_seconds_count{phase="query"} 1\n' in body
+        assert b'second_phase_seconds_count{phase="query"} 1\n' in body
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_prometheus_server_merged():
+    """Check that the metric families of the plugins sharing a server are merged"""
+    first = build_metrics({"prometheus_port": 0}, provider="scihub")
+    second = build_metrics({"labels": {"provider": 'mirror "2"'}}, provider="scihub")
+    for metrics in (first, second):
+        with metrics.phase("query"):
+            pass
+        metrics.add("downloaded_products")
+
+    server = first.serve_prometheus(0)
+    try:
+        second.serve_prometheus(server.server_address[1])
+        url = "http://127.0.0.1:%s/metrics" % server.server_address[1]
+        with urlopen(url) as response:
+            body = response.read().decode("utf-8")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert body == prometheus_text([first, second])
+    assert body.count("# TYPE eodag_sentinelsat_phase_seconds summary\n") == 1
+    assert body.count("# TYPE eodag_sentinelsat_downloaded_products_total") == 1
+    assert (
+        'eodag_sentinelsat_phase_seconds_count{provider="scihub",phase="query"} 1\n'
+        in body
+    )
+    assert (
+        'eodag_sentinelsat_downloaded_products_total{provider="mirror \\"2\\""} 1\n'
+        in body
+    )
+
+
+def test_opentelemetry_hook():
+    """Check that phases are turned into spans"""
+    tracer = mock.MagicMock()
+    metrics = Metrics(hooks=[opentelemetry_hook(tracer)])
+
+    with metrics.phase("download", uuid="uuid-0"):
+        pass
+
+    name = tracer.start_span.call_args[0][0]
+    assert name == "sentinelsat.download"
+    assert tracer.start_span.call_args[1]["attributes"] == {"uuid": "uuid-0"}
+    start = tracer.start_span.call_args[1]["start_time"]
+    span = tracer.start_span.return_value
+    assert span.end.call_args[1]["end_time"] >= start
+    span.record_exception.assert_not_called()
+
+
+def test_plugin_metrics(plugin_api, mock_dhus):
+    """Check that the plugin phases are instrumented"""
+    assert plugin_api.metrics is None
+
+    contents = {"uuid-%s" % i: os.urandom(1000) for i in range(3)}
+    dhus = mock_dhus(contents)
+    plugin_api.config.endpoint = dhus.url
+    plugin_api.metrics = build_metrics(True)
+    search_result, _ = plugin_api.query(productType="S2_MSI_L1C")
+    plugin_api.download_all(search_result, extract=False)
+
+    snapshot = plugin_api.metrics.snapshot()
+    assert {name: values["count"] for name, values in snapshot["phases"].items()} == {
+        "init_api": 1,
+        "query": 1,
+        "storage_status": 1,
+        "normalize": 1,
+        "download_all": 1,
+        "download": 3,
+        "extract": 3,
+    }
+    assert snapshot["counters"] == {
+        "downloaded_bytes": 3000,
+        "downloaded_products": 3,
+    }
+    assert snapshot["rates"]["downloaded_products"] > 0
@@ -0,0 +1,281 @@
+import os
+import re
+from unittest import mock
+
+import pytest
+from sentinelsat.exceptions import QuerySyntaxError, ServerError
+
+from eodag_sentinelsat.mirrors import MirrorPool
+from tests.conftest import run_async
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def transfers(dhus):
+    return [r for r in dhus.requests if re.match(r"GET .*\('[^']+'\)/\$value$", r)]
+
+
+def test_mirror_pool():
+    """Check that the fastest healthy mirror is used, failing over to the others"""
+    clock = FakeClock()
+    apis = [mock.Mock(api_url="https://hub%s/" % i) for i in range(3)]
+    pool = MirrorPool(apis, cooldown=10, clock=clock)
+    assert [m.api for m in pool.ranked()] == apis
+
+    for mirror, latency in zip(pool.mirrors, [0.5, 0.1, 0.3]):
+        pool.record_success(mirror, latency)
+    assert [m.api for m in pool.ranked()] == [apis[1], apis[2], apis[0]]
+
+    def query(api):
+        if api is apis[1]:
+            raise ServerError("The service is under maintenance")
+        return api.api_url
+
+    assert pool.call(query) == "https://hub2/"
+    assert [m.api for m in pool.ranked()] == [apis[2], apis[0], apis[1]]
+    assert pool.stats()[1]["healthy"] is False
+    # Failing over in the configured order
+    assert pool.failover(query) == "https://hub0/"
+
+    # The cooldown is doubled after each failure
+    clock.now += 10
+    assert pool.ranked()[0].api is apis[1]
+    assert pool.call(query) == "https://hub2/"
+    clock.now += 10
+    assert pool.ranked()[-1].api is apis[1]
+    clock.now += 10
+    assert pool.ranked()[0].api is apis[1]
+
+    # Other errors are not failures of the mirrors
+    with pytest.raises(QuerySyntaxError):
+        pool.call(mock.Mock(side_effect=QuerySyntaxError("Invalid query", None)))
+    assert all(m["healthy"] for m in pool.stats())
+
+    def maintenance(api):
+        raise ServerError("The service is under maintenance")
+
+    with pytest.raises(ServerError):
+        pool.call(maintenance)
+
+    # A pinned mirror is the only one called
+    called = []
+    with pytest.raises(ServerError):
+        pool.call(lambda api: called.append(api) or maintenance(api), pool.mirrors[2])
+    assert called == [apis[2]]
+
+
+def test_mirror_pool_downloads():
+    """Check that downloads are spread over the mirrors holding the product"""
+    apis = [mock.Mock(api_url="https://hub%s/" % i) for i in range(3)]
+    pool = MirrorPool(apis)
+
+    first = pool.acquire_download()
+    second = pool.acquire_download(lambda api: api is not apis[1])
+    assert first.api is apis[0]
+    assert second.api is apis[2]
+    assert [m["transfers"] for m in pool.stats()] == [1, 0, 1]
+
+    pool.release_download(first)
+    pool.release_download(second, ServerError("Connection reset"))
+    assert [m["transfers"] for m in pool.stats()] == [0, 0, 0]
+    assert pool.stats()[2]["healthy"] is False
+
+
+def test_mirrored_api_online():
+    """Check that the mirror on which the last products were found online is
+    remembered"""
+    apis = [mock.Mock(api_url="https://hub%s/" % i) for i in range(2)]
+    apis[0].is_online.side_effect = lambda id: id != "uuid-0"
+    pool = MirrorPool(apis)
+
+    with mock.patch("eodag_sentinelsat.mirrors.MAX_ONLINE_PRODUCTS", 2):
+        for i in range(3):
+            assert pool.api.is_online("uuid-%s" % i) is (i > 0)
+        assert pool.api.found_online("uuid-1", apis[0])
+        assert not pool.api.found_online("uuid-1", apis[1])
+        assert pool.api.is_online("uuid-3")
+    # The least recently checked product is forgotten
+    assert not pool.api.found_online("uuid-1", apis[0])
+    assert pool.api.found_online("uuid-2", apis[0])
+    pool.api.forget_online("uuid-2")
+    assert not pool.api.found_online("uuid-2", apis[0])
+    assert pool.api.found_online("uuid-3", apis[0])
+
+
+def test_query_mirror_failover(plugin_api, mock_dhus):
+    """Check that queries are sent to another mirror when a hub is in maintenance"""
+    products = {"uuid-%s" % i: os.urandom(1000) for i in range(3)}
+    hub = mock_dhus(products)
+    mirror = mock_dhus(products)
+    plugin_api.config.endpoint = hub.url
+    plugin_api.config.mirrors = {"endpoints": [mirror.url]}
+
+    hub.maintenance = True
+    search_result, count = plugin_api.query(productType="S2_MSI_L1C")
+    assert count == 3
+    assert search_result[0].properties["downloadLink"].startswith(mirror.url)
+    hub_requests = len(hub.requests)
+    assert [m["healthy"] for m in plugin_api.mirrors.stats()] == [False, True]
+
+    # The failing hub is not requested again during its cooldown
+    plugin_api.query(productType="S2_MSI_L1C")
+    assert len(hub.requests) == hub_requests
+
+
+def test_download_mirrors(plugin_api, mock_dhus):
+    """Check that products are downloaded from several mirrors at the same time"""
+    contents = {"uuid-%s" % i: os.urandom(1000) for i in range(6)}
+    # Slow transfers, so that they overlap
+    hub = mock_dhus(contents, rate=2**16 * 10)
+    mirror = mock_dhus(contents, rate=2**16 * 10, offline=["uuid-5"])
+    plugin_api.config.endpoint = hub.url
+    plugin_api.config.mirrors = {"endpoints": [mirror.url]}
+    search_result, _ = plugin_api.query(productType="S2_MSI_L1C")
+
+    paths = plugin_api.download_all(search_result, extract=False, n_concurrent_dl=4)
+
+    for product, path in zip(search_result, paths):
+        with open(path, "rb") as fh:
+            assert fh.read() == contents[product.properties["uuid"]]
+    assert transfers(hub) and transfers(mirror)
+    assert len(transfers(hub)) + len(transfers(mirror)) == 6
+    # Only downloaded from the mirrors holding it online
+    assert "GET /odata/v1/Products('uuid-5')/$value" not in transfers(mirror)
+
+
+@pytest.mark.parametrize("asynchronous", [False, True])
+def test_download_mirror_failover(plugin_api, mock_dhus, tmp_path, asynchronous):
+    """Check that products are downloaded from a mirror when the hub is in maintenance"""
+    contents = {"uuid-%s" % i: os.urandom(1000) for i in range(3)}
+    hub = mock_dhus(contents)
+    mirror = mock_dhus(contents, offline=["uuid-2"], lta_checks=2)
+    plugin_api.config.endpoint = hub.url
+    plugin_api.config.mirrors = {"endpoints": [mirror.url]}
+    search_result, _ = plugin_api.query(productType="S2_MSI_L1C")
+
+    hub.maintenance = True
+    kwargs = dict(wait=0.001, timeout=1, outputs_prefix=str(tmp_path), extract=False)
+    if asynchronous:
+        paths = run_async(plugin_api.adownload_all(search_result, **kwargs))
+    else:
+        paths = plugin_api.download_all(search_result, **kwargs)
+
+    assert len(paths) == 3
+    for product, path in zip(search_result, paths):
+        with open(path, "rb") as fh:
+            assert fh.read() == contents[product.properties["uuid"]]
+    assert not transfers(hub)
+    # The OFFLINE product was ordered from the mirror, then downloaded once ONLINE
+    assert transfers(mirror).count("GET /odata/v1/Products('uuid-2')/$value") == 2
+    assert not mirror.offline
+
+
+@pytest.mark.parametrize("asynchronous", [False, True])
+def test_iter_query_mirror_pinned(plugin_api, mock_dhus, asynchronous):
+    """Check that the pages of a search come from one mirror, the search being
+    restarted on another one when it fails"""
+    products = {"uuid-%s" % i: os.urandom(10) for i in range(9)}
+    hub = mock_dhus(products)
+    mirror = mock_dhus(products)
+    plugin_api.config.endpoint = hub.url
+    plugin_api.config.mirrors = {"endpoints": [mirror.url]}
+
+    def searches(dhus):
+        return [r for r in dhus.requests if r.startswith("GET /search")]
+
+    def iter_uuids(on_product=None):
+        uuids = []
+
+        async def consume():
+            async for product in plugin_api.aiter_query(
+                productType="S2_MSI_L1C", items_per_page=3
+            ):
+                uuids.append(product.properties["uuid"])
+                if on_product is not None:
+                    on_product()
+
+        if asynchronous:
+            run_async(consume())
+        else:
+            for product in plugin_api.iter_query(
+                productType="S2_MSI_L1C", items_per_page=3
+            ):
+                uuids.append(product.properties["uuid"])
+                if on_product is not None:
+                    on_product()
+        return uuids
+
+    # The latency of the mirror is unknown after the first page, which would make
+    # it the fastest one: the pages still come from the hub
+    assert sorted(iter_uuids()) == sorted(products)
+    assert len(searches(hub)) == 3
+    assert not searches(mirror)
+
+    # The pinned mirror fails once the first product is returned
+    hub.requests.clear()
+    pinned = []
+
+    def fail_pinned():
+        if not pinned:
+            pinned.append(hub if searches(hub) else mirror)
+            pinned[0].maintenance = True
+
+    uuids = iter_uuids(fail_pinned)
+    assert sorted(uuids) == sorted(products)
+    # Restarted from the first page on the other mirror, which returned all the pages
+    other = mirror if pinned[0] is hub else hub
+    assert len(searches(other)) == 3
+    assert [m["healthy"] for m in plugin_api.mirrors.stats()] == [
+        pinned[0] is mirror,
+        pinned[0] is hub,
+    ]
+
+
+def test_query_page_mirror_pinned(plugin_api, mock_dhus):
+    """Check that the pages of a search are requested from the same mirror, until it
+    fails"""
+    products = {"uuid-%s" % i: os.urandom(10) for i in range(9)}
+    hub = mock_dhus(products)
+    mirror = mock_dhus(products)
+    plugin_api.config.endpoint = hub.url
+    plugin_api.config.mirrors = {"endpoints": [mirror.url]}
+
+    def searches(dhus):
+        return [r for r in dhus.requests if r.startswith("GET /search")]
+
+    def query_page(page):
+        search_result, _ = plugin_api.query(
+            productType="S2_MSI_L1C", items_per_page=3, page=page
+        )
+        return [p.properties["uuid"] for p in search_result]
+
+    uuids = query_page(1)
+    assert len(searches(hub)) == 1
+    # The mirror is now the fastest one, the next pages still come from the hub
+    hub_mirror, other_mirror = plugin_api.mirrors.mirrors
+    plugin_api.mirrors.record_success(hub_mirror, 1)
+    plugin_api.mirrors.record_success(other_mirror, 0.01)
+    uuids += query_page(2)
+    assert len(searches(hub)) == 2
+    assert not searches(mirror)
+    # Another search is sent to the fastest mirror
+    plugin_api.query(productType="S2_MSI_L2A", items_per_page=3)
+    assert len(searches(mirror)) == 1
+
+    # The search is pinned to the mirror once the hub fails
+    hub.maintenance = True
+    uuids += query_page(3)
+    assert len(searches(mirror)) == 2
+    # and stays pinned to it when the hub is the fastest healthy mirror again
+    hub.maintenance = False
+    hub_mirror.down_until = 0
+    plugin_api.mirrors.record_success(hub_mirror, 0.001)
+    assert query_page(3) == uuids[6:]
+    assert len(searches(mirror)) == 3
+    assert sorted(uuids) == sorted(products)
@@ -0,0 +1,64 @@
+import zipfile
+from io import BytesIO
+
+import pytest
+from sentinelsat import SentinelAPI
+from sentinelsat.exceptions import LTAError, ServerError
+from shapely.geometry import box
+
+from tests.mock_dhus import safe_archive, synthetic_products
+
+
+def test_safe_archive():
+    """Check that synthetic archives look like SAFE products"""
+    content = safe_archive("S2A_MSIL1C_TEST", size=3000, files=3)
+    with zipfile.ZipFile(BytesIO(content)) as zfile:
+        names = zfile.namelist()
+        assert names[0] == "S2A_MSIL1C_TEST.SAFE/manifest.safe"
+        assert len(names) == 4
+        assert sum(info.file_size for info in zfile.infolist()[1:]) == 3000
+
+
+def test_mock_dhus_search_filters(plugin_api, mock_dhus):
+    """Check that searches are filtered on dates, footprints and cloud cover"""
+    products, properties = synthetic_products(48, size=10, archives=False)
+    dhus = mock_dhus(products, properties=properties)
+    plugin_api.config.endpoint = dhus.url
+
+    _, count = plugin_api.query(productType="S2_MSI_L1C")
+    assert count == 48
+    search_result, count = plugin_api.query(
+        productType="S2_MSI_L1C",
+        startTimeFromAscendingNode="2020-05-01T12:00:00Z",
+        completionTimeFromAscendingNode="2020-05-02T00:00:00Z",
+    )
+    assert count == 12
+    assert sorted(p.properties["uuid"] for p in search_result) == [
+        "uuid-%06d" % i for i in range(2, 14)
+    ]
+    _, count = plugin_api.query(
+        productType="S2_MSI_L1C", geometry=box(1.2, 43.2, 2.8, 43.8)
+    )
+    # The two first tiles of the grid
+    assert count == 2
+    _, count = plugin_api.query(productType="S2_MSI_L1C", cloudCover=9)
+    assert count == 10
+    _, count = plugin_api.query(productType="S2_MSI_L2A")
+    assert count == 0
+
+
+def test_mock_dhus_limits(mock_dhus):
+    """Check that large pages and orders beyond the LTA quota are refused"""
+    products = {"uuid-%s" % i: b"0" for i in range(3)}
+    dhus = mock_dhus(products, offline=products, max_rows=2, lta_quota=1)
+    api = SentinelAPI(None, None, dhus.url)
+
+    api.page_size = 3
+    with pytest.raises(ServerError):
+        api.query(raw="*")
+    api.page_size = 2
+    assert len(api.query(raw="*")) == 3
+
+    assert api.trigger_offline_retrieval("uuid-0")
+    with pytest.raises(LTAError):
+        api.trigger_offline_retrieval("uuid-1")
@@ -1,11 +1,31 @@
+import asyncio
+import copy
 import datetime
+import hashlib
+import inspect
+import io
+import os
+import threading
+import zipfile
+from unittest import mock
 
 import pytest
+import sentinelsat.sentinel
 import shapely.wkt
 from eodag import EODataAccessGateway, setup_logging
+from eodag.api.search_result import SearchResult
 from eodag.config import load_default_config
 from eodag.plugins.manager import PluginManager
-from eodag.utils import ProgressCallback
+from eodag.utils import ProgressCallback, uri_to_path
+from eodag.utils.exceptions import DownloadError, MisconfiguredError
+from sentinelsat import SentinelAPI
+from sentinelsat.download import Downloader, DownloadStatus
+from sentinelsat.exceptions import InvalidChecksumError
+
+from eodag_sentinelsat.cache import MemoryQueryCache
+from eodag_sentinelsat.eodag_sentinelsat import _ProductDownloader
+from eodag_sentinelsat.streaming import StreamExtractError
+from tests.conftest import run_async
 
 
 @pytest.fixture
@@ -16,12 +36,20 @@ def dag():
     yield dag
 
 
-@pytest.fixture
-def plugin_api():
-    providers_config = load_default_config()
-    plugins_manager = PluginManager(providers_config)
-
-    yield next(plugins_manager.get_search_plugins(provider="scihub"))
+def sentinelsat_result(uuid, online=None):
+    """Minimal product properties, as returned by sentinelsat query"""
+    result = {
+        "uuid": uuid,
+        "identifier": "S2A_MSIL1C_%s" % uuid,
+        "title": "S2A_MSIL1C_%s" % uuid,
+        "footprint": "POLYGON ((1 43, 1 44, 2 44, 2 43, 1 43))",
+        "link": "https://example.com/apihub/odata/v1/Products('%s')/$value" % uuid,
+        "producttype": "S2MSI1C",
+        "beginposition": datetime.datetime(2020, 5, 1, 10, 30),
+    }
+    if online is not None:
+        result["storage_status"] = online
+    return result
 
 
 @pytest.mark.usefixtures("logging_info")
@@ -81,3 +109,739 @@ def test_progress_bar(plugin_api):
 
     setup_logging(2, no_progress_bar=True)
     assert plugin_api.api._tqdm().disable is True
+
+
+def test_resolve_storage_status(plugin_api):
+    """Check that the storage status of a page of results is resolved in batch"""
+
+    plugin_api.api = mock.MagicMock()
+    plugin_api.api.api_url = "https://example.com/apihub/"
+    plugin_api.api._online_attribute_used = True
+    odata_response = mock.MagicMock()
+    odata_response.json.return_value = {
+        "d": {"results": [{"Id": "uuid-3", "Online": False}, {"Id": "uuid-4"}]}
+    }
+    plugin_api.api.session.get.return_value = odata_response
+    plugin_api.api.is_online.return_value = True
+
+    results = {
+        "uuid-1": {"ondemand": "false"},
+        "uuid-2": {"ondemand": "true"},
+        "uuid-3": {},
+        "uuid-4": {},
+        "uuid-5": {},
+    }
+    plugin_api._resolve_storage_status(results)
+
+    assert [res["storage_status"] for res in results.values()] == [
+        True,
+        False,
+        False,
+        True,
+        True,
+    ]
+    # A single OData request for the products missing from the feed
+    plugin_api.api.session.get.assert_called_once()
+    odata_filter = plugin_api.api.session.get.call_args[1]["params"]["$filter"]
+    assert odata_filter == "Id eq 'uuid-3' or Id eq 'uuid-4' or Id eq 'uuid-5'"
+    # Only the product absent from the OData response is checked individually
+    plugin_api.api.is_online.assert_called_once_with("uuid-5")
+
+
+def test_online_statuses_chunks(plugin_api, mock_dhus):
+    """Check that the OData chunks of the storage status are requested concurrently"""
+    products = {"uuid-%s" % i: b"" for i in range(7)}
+    dhus = mock_dhus(products, offline=["uuid-1", "uuid-5"])
+    plugin_api.config.endpoint = dhus.url
+    plugin_api.config.storage_status_chunk_size = 2
+    plugin_api.config.storage_status_workers = 3
+    plugin_api._init_api()
+
+    # Fails if the first three chunks are not requested at the same time
+    barrier = threading.Barrier(3, timeout=10)
+    request_odata_products = plugin_api._request_odata_products
+
+    def request(uuids, select):
+        if uuids[0] in ("uuid-0", "uuid-2", "uuid-4"):
+            barrier.wait()
+        return request_odata_products(uuids, select)
+
+    with mock.patch.object(plugin_api, "_request_odata_products", side_effect=request):
+        statuses = plugin_api._get_online_statuses(sorted(products))
+    assert statuses == {
+        uuid: uuid not in ("uuid-1", "uuid-5") for uuid in sorted(products)
+    }
+    assert len([r for r in dhus.requests if r.startswith("GET /odata")]) == 4
+
+
+def test_lazy_storage_status(plugin_api):
+    """Check that storageStatus is only resolved when read, for the whole page at once"""
+
+    plugin_api.api = mock.MagicMock()
+    plugin_api.api.api_url = "https://example.com/apihub/"
+    plugin_api.api._online_attribute_used = True
+    odata_response = mock.MagicMock()
+    odata_response.json.return_value = {
+        "d": {"results": [{"Id": "uuid-1", "Online": True}, {"Id": "uuid-2"}]}
+    }
+    plugin_api.api.session.get.return_value = odata_response
+    plugin_api.api.is_online.return_value = False
+
+    products = plugin_api._normalize_results(
+        [sentinelsat_result("uuid-1"), sentinelsat_result("uuid-2")],
+        lazy_storage_status=True,
+        productType="S2_MSI_L1C",
+    )
+    assert products[0].properties["startTimeFromAscendingNode"] == (
+        "2020-05-01T10:30:00.000000Z"
+    )
+    plugin_api.api.session.get.assert_not_called()
+
+    assert products[0].properties["storageStatus"] == "ONLINE"
+    assert products[1].properties["storageStatus"] == "ONLINE"
+    plugin_api.api.session.get.assert_called_once()
+    plugin_api.api.is_online.assert_not_called()
+    assert products[1].as_dict()["properties"]["storageStatus"] == "ONLINE"
+
+
+def test_query_count_from_page_response(plugin_api):
+    """Check that the total count is read from the page query response"""
+
+    plugin_api.api = mock.MagicMock()
+    plugin_api.api.format_query.return_value = "producttype:S2MSI1C"
+    plugin_api.api.check_query_length.return_value = 0.1
+    plugin_api.api._load_query.return_value = ([], 42)
+
+    products, total_count = plugin_api.query(
+        items_per_page=10, page=3, productType="S2_MSI_L1C"
+    )
+
+    assert products == []
+    assert total_count == 42
+    plugin_api.api.count.assert_not_called()
+    plugin_api.api._load_query.assert_called_once_with(
+        "producttype:S2MSI1C", None, 10, 20
+    )
+
+    _, total_count = plugin_api.query(
+        items_per_page=10, page=3, count=False, productType="S2_MSI_L1C"
+    )
+    assert total_count is None
+
+
+def test_query_cache(plugin_api):
+    """Check that query results and count are cached, and that the cache can be bypassed"""
+
+    plugin_api.query_cache = MemoryQueryCache()
+    plugin_api.api = mock.MagicMock()
+    plugin_api.api.format_query.return_value = "producttype:S2MSI1C"
+    plugin_api.api.check_query_length.return_value = 0.1
+    plugin_api.api._load_query.return_value = ([], 42)
+
+    for _ in range(2):
+        _, total_count = plugin_api.query(
+            items_per_page=10, page=1, productType="S2_MSI_L1C"
+        )
+        assert total_count == 42
+    assert plugin_api.api._load_query.call_count == 1
+    assert plugin_api.query_cache.stats() == {"hits": 1, "misses": 1}
+
+    # Another page is another query
+    plugin_api.query(items_per_page=10, page=2, productType="S2_MSI_L1C")
+    assert plugin_api.api._load_query.call_count == 2
+
+    plugin_api.query(
+        items_per_page=10, page=1, productType="S2_MSI_L1C", use_cache=False
+    )
+    assert plugin_api.api._load_query.call_count == 3
+
+    plugin_api.api._load_query.return_value = ([], 43)
+    _, total_count = plugin_api.query(
+        items_per_page=10, page=1, productType="S2_MSI_L1C", invalidate_cache=True
+    )
+    assert total_count == 43
+    assert plugin_api.api._load_query.call_count == 4
+
+
+def test_query_cache_copies(plugin_api):
+    """Check that each cache hit gets its own results, without storage status"""
+
+    def query_with_count(limit=None, offset=0, **query_params):
+        result = sentinelsat_result("uuid-0")
+        result["Online"] = "true"
+        return {"uuid-0": result}, 1
+
+    plugin_api.query_cache = MemoryQueryCache()
+    plugin_api.api = mock.MagicMock()
+    with mock.patch.object(
+        plugin_api, "_query_with_count", side_effect=query_with_count
+    ) as mock_query, mock.patch.object(
+        plugin_api,
+        "_resolve_storage_status",
+        wraps=plugin_api._resolve_storage_status,
+    ) as mock_resolve:
+        for _ in range(3):
+            products, _ = plugin_api.query(productType="S2_MSI_L1C")
+            assert products[0].properties["storageStatus"] == "ONLINE"
+    assert mock_query.call_count == 1
+
+    pages = [c[0][0] for c in mock_resolve.call_args_list]
+    assert len({id(page["uuid-0"]) for page in pages}) == 3
+    _, (cached_results, _) = next(iter(plugin_api.query_cache._entries.values()))
+    assert "storage_status" not in cached_results["uuid-0"]
+
+
+def test_iter_query(plugin_api):
+    """Check that iter_query walks through all the pages of results"""
+
+    uuids = ["uuid-%s" % i for i in range(5)]
+
+    def query_with_count(limit=None, offset=0, **query_params):
+        page_uuids = uuids[offset:][:limit]
+        results = {uuid: sentinelsat_result(uuid, online=True) for uuid in page_uuids}
+        return results, len(uuids)
+
+    plugin_api.api = mock.MagicMock()
+    with mock.patch.object(
+        plugin_api, "_query_with_count", side_effect=query_with_count
+    ) as mock_query:
+        products = plugin_api.iter_query(items_per_page=2, productType="S2_MSI_L1C")
+        assert next(products).properties["uuid"] == "uuid-0"
+        assert [p.properties["uuid"] for p in products] == uuids[1:]
+
+    assert [c[1]["offset"] for c in mock_query.call_args_list] == [0, 2, 4]
+
+
+def test_split_query(plugin_api):
+    """Check that a search is split by date and area, and its results merged"""
+
+    def query_with_count(limit=None, offset=0, date=None, area=None, **query_params):
+        # The same product is found by several sub-queries
+        start, _ = date
+        uuids = ["uuid-%s" % start.day, "uuid-shared"]
+        results = {uuid: sentinelsat_result(uuid, online=True) for uuid in uuids}
+        results["uuid-%s" % start.day]["beginposition"] = start
+        return results, len(results)
+
+    plugin_api.api = mock.MagicMock()
+    with mock.patch.object(
+        plugin_api, "_query_with_count", side_effect=query_with_count
+    ) as mock_query:
+        products, total_count = plugin_api.split_query(
+            split_period=3,
+            split_grid=(2, 1),
+            productType="S2_MSI_L1C",
+            startTimeFromAscendingNode="2020-05-01",
+            completionTimeFromAscendingNode="2020-05-10",
+            geometry=shapely.geometry.box(1, 43, 2, 44),
+        )
+
+    # 3 date ranges and 2 areas
+    assert mock_query.call_count == 6
+    dates = sorted({c[1]["date"] for c in mock_query.call_args_list})
+    assert [(start.day, end.day) for start, end in dates] == [(1, 4), (4, 7), (7, 10)]
+    areas = {c[1]["area"] for c in mock_query.call_args_list}
+    assert [shapely.wkt.loads(area).bounds for area in sorted(areas)] == [
+        (1.0, 43.0, 1.5, 44.0),
+        (1.5, 43.0, 2.0, 44.0),
+    ]
+
+    assert total_count == 4
+    assert [p.properties["uuid"] for p in products] == [
+        "uuid-1",
+        "uuid-shared",
+        "uuid-4",
+        "uuid-7",
+    ]
+
+
+def test_query_plan_cache(plugin_api):
+    """Check that query plans are compiled once per product type and configuration"""
+
+    kwargs = dict(
+        productType="S2_MSI_L1C",
+        startTimeFromAscendingNode="2020-05-01",
+        completionTimeFromAscendingNode="2020-05-02",
+        geometry=shapely.geometry.box(1, 43, 2, 44),
+    )
+    with mock.patch.object(
+        plugin_api, "map_product_type", wraps=plugin_api.map_product_type
+    ) as mock_map:
+        first_params, _ = plugin_api._update_keyword(**kwargs)
+        params, _ = plugin_api._update_keyword(**kwargs)
+        assert mock_map.call_count == 1
+        assert params == first_params
+
+        # Same parameters as the generic QueryStringSearch.build_query_string
+        with mock.patch.object(
+            plugin_api,
+            "_bind_query_plan",
+            side_effect=lambda plan, pt, kw: (plugin_api.build_query_string(pt, **kw)),
+        ):
+            assert plugin_api._update_keyword(**kwargs)[0] == params
+
+        # A configuration update, merged in place, invalidates the plan
+        plugin_api.update_config(
+            {"products": {"S2_MSI_L1C": {"productType": "S2MSI2A"}}}
+        )
+        params, provider_product_type = plugin_api._update_keyword(**kwargs)
+        assert mock_map.call_count == 2
+        assert params["producttype"] == provider_product_type == "S2MSI2A"
+
+        # As clearing the plans after editing the configuration
+        plugin_api.config.products["S2_MSI_L1C"]["productType"] = "S2MSI1C"
+        plugin_api._update_keyword(**kwargs)
+        assert mock_map.call_count == 2
+        plugin_api.clear_query_plans()
+        params, provider_product_type = plugin_api._update_keyword(**kwargs)
+        assert mock_map.call_count == 3
+        assert params["producttype"] == provider_product_type == "S2MSI1C"
+
+
+def test_pagination_params(plugin_api):
+    """Check the pagination parameters built from the compiled template"""
+
+    assert plugin_api._get_pagination_params(20, 3) == {"limit": 20, "offset": 40}
+    assert plugin_api._get_pagination_params(20, None) == {"limit": 20, "offset": 0}
+    assert plugin_api._get_pagination_params(None, None) == {}
+    with pytest.raises(ValueError):
+        plugin_api._get_pagination_params(20, 0)
+
+    plugin_api.config.pagination["next_page_query_obj"] = '{{"rows":"{page}"}}'
+    assert plugin_api._get_pagination_params(20, 3) == {"rows": "3"}
+
+    plugin_api.config.pagination["next_page_query_obj"] = '{{"limit":{unknown}}}'
+    with pytest.raises(MisconfiguredError):
+        plugin_api._get_pagination_params(20, 3)
+
+
+def test_normalize_results(plugin_api):
+    """Check that the single-pass extraction gives the same properties as eodag"""
+    from eodag.api.product import EOProduct
+    from eodag.api.product.metadata_mapping import properties_from_json
+
+    from eodag_sentinelsat.metadata import may_be_literal
+
+    result = sentinelsat_result("uuid-1", online=False)
+    result.update(
+        {
+            "endposition": datetime.datetime(2020, 5, 1, 10, 31),
+            "generationdate": datetime.datetime(2020, 5, 1, 11),
+            "cloudcoverpercentage": 12.5,
+            "orbitnumber": 123,
+            "processingbaseline": "02.09",
+            "size": "700 MB",
+            "summary": "Date: 2020-05-01T10:30:00.024Z, Instrument: MSI",
+            "filename": None,
+        }
+    )
+    discover_metadata = plugin_api.config.discover_metadata
+    expected = properties_from_json(
+        result,
+        plugin_api.config.metadata_mapping,
+        discovery_pattern=discover_metadata["metadata_pattern"],
+        discovery_path=discover_metadata["metadata_path"],
+    )
+    for key, value in expected.items():
+        if isinstance(value, (datetime.date, datetime.datetime)):
+            expected[key] = value.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+    products = plugin_api._normalize_results([result, dict(result)])
+    for product in products:
+        assert product.properties == EOProduct("scihub", expected).properties
+    properties = products[0].properties
+    assert properties["startTimeFromAscendingNode"] == "2020-05-01T10:30:00.000000Z"
+    assert properties["generationdate"] == "2020-05-01T11:00:00.000000Z"
+    assert properties["storageStatus"] == "OFFLINE"
+    assert properties["processingBaseline"] == 2.09
+    assert properties["filename"] is None
+
+    for value in ("1", " -2", "[1]", "True", "None ", "set()", "r'a'", "'a'"):
+        assert may_be_literal(value)
+    for value in ("", "S2A_MSIL1C", "Not Available", "POLYGON ((1 43))"):
+        assert not may_be_literal(value)
+
+
+def test_download_records(plugin_api, tmp_path):
+    """Check that downloads are recorded and looked up in the indexed records store"""
+
+    plugin_api.config.download_records = "sqlite"
+    plugin_api.config.outputs_prefix = str(tmp_path)
+    plugin_api.config.extract = False
+    plugin_api.api = mock.MagicMock()
+
+    def download_all(downloader, uuids, directory):
+        product_infos = {}
+        for uuid in uuids:
+            path = os.path.join(directory, "S2A_MSIL1C_%s.zip" % uuid)
+            with open(path, "w") as fh:
+                fh.write(uuid)
+            product_infos[uuid] = {"id": uuid, "path": path}
+        return {uuid: DownloadStatus.DOWNLOADED for uuid in uuids}, {}, product_infos
+
+    def products():
+        return SearchResult(
+            plugin_api._normalize_results(
+                [sentinelsat_result("uuid-1"), sentinelsat_result("uuid-2")]
+            )
+        )
+
+    with mock.patch.object(
+        _ProductDownloader, "download_all", autospec=True, side_effect=download_all
+    ) as mock_download_all:
+        paths = plugin_api.download_all(products())
+        assert sorted(os.path.basename(p) for p in paths) == [
+            "S2A_MSIL1C_uuid-1.zip",
+            "S2A_MSIL1C_uuid-2.zip",
+        ]
+        assert os.path.isfile(tmp_path / ".downloaded.sqlite")
+        # eodag record files are only looked up, not written
+        assert os.listdir(tmp_path / ".downloaded") == []
+
+        # Already downloaded products are found in the records
+        assert sorted(plugin_api.download_all(products())) == sorted(paths)
+        assert mock_download_all.call_count == 1
+
+        # Records of deleted products are removed
+        os.remove(paths[0])
+        plugin_api.download_all(products())
+        assert mock_download_all.call_count == 2
+        assert len(mock_download_all.call_args[0][1]) == 1
+
+        # Products downloaded with an eodag record file are still found
+        plugin_api._download_records.clear()
+        for path in tmp_path.glob(".downloaded.sqlite*"):
+            path.unlink()
+        plugin_api.config.download_records = None
+        plugin_api.download_all(products())
+        assert mock_download_all.call_count == 3
+        plugin_api.config.download_records = "sqlite"
+        assert sorted(plugin_api.download_all(products())) == sorted(paths)
+        assert mock_download_all.call_count == 3
+
+
+def test_download_records_paths(plugin_api, tmp_path):
+    """Check that both download records backends name the products the same way"""
+
+    plugin_api.config.outputs_prefix = str(tmp_path)
+    result = sentinelsat_result("uuid-1")
+    result["title"] = "S2A MSIL1C/uuid-1"
+    search_result = SearchResult(plugin_api._normalize_results([result]))
+
+    fs_paths = []
+    for download_records in (None, "sqlite"):
+        plugin_api.config.download_records = download_records
+        (pm,) = plugin_api._prepare_downloads(search_result)
+        assert pm.to_download
+        fs_paths.append(pm.fs_path)
+    assert fs_paths[0] == fs_paths[1]
+    # Sanitized title, with the product id avoiding collisions
+    assert os.path.basename(fs_paths[0]) == "S2A_MSIL1C_uuid-1-S2A_MSIL1C_uuid-1.zip"
+
+
+def test_extract_downloads(plugin_api, tmp_path):
+    """Check that products are extracted once downloaded, failures being isolated"""
+
+    plugin_api.config.outputs_prefix = str(tmp_path)
+    plugin_api.config.extract = True
+    plugin_api.api = mock.MagicMock()
+
+    def download_all(downloader, uuids, directory):
+        product_infos = {}
+        for uuid in sorted(uuids):
+            path = downloader.target_paths[uuid]
+            if uuid == "uuid-bad":
+                with open(path, "w") as fh:
+                    fh.write("not a zip file")
+            else:
+                with zipfile.ZipFile(path, "w") as zfile:
+                    zfile.writestr("S2A_MSIL1C_%s.SAFE/manifest.safe" % uuid, uuid)
+            product_infos[uuid] = {"id": uuid, "path": path}
+            # Extraction starts as soon as a product is downloaded
+            if uuid == "uuid-1":
+                downloader.on_downloaded(product_infos[uuid])
+        return {uuid: DownloadStatus.DOWNLOADED for uuid in uuids}, {}, product_infos
+
+    search_result = SearchResult(
+        plugin_api._normalize_results(
+            [sentinelsat_result(uuid) for uuid in ("uuid-1", "uuid-2", "uuid-bad")]
+        )
+    )
+
+    with mock.patch.object(
+        _ProductDownloader, "download_all", autospec=True, side_effect=download_all
+    ):
+        with pytest.raises(DownloadError, match="1 of 3 .* S2A_MSIL1C_uuid-bad"):
+            plugin_api.download_all(search_result, extract_workers=2)
+
+    paths = [uri_to_path(product.location) for product in search_result[:2]]
+    assert paths == [
+        str(tmp_path / "S2A_MSIL1C_uuid-1" / "S2A_MSIL1C_uuid-1.SAFE"),
+        str(tmp_path / "S2A_MSIL1C_uuid-2" / "S2A_MSIL1C_uuid-2.SAFE"),
+    ]
+    assert os.path.isfile(os.path.join(paths[0], "manifest.safe"))
+    assert search_result[2].location == search_result[2].remote_location
+
+
+# Source hashes of the sentinelsat 1.2.1 methods overridden by _ProductDownloader
+SENTINELSAT_OVERRIDDEN = {
+    "download": "f50b3b62eb2b25ea3c4728db2009716fcca53d08f21d2803b7d458333841a3f6",
+    "_download_common": "b1a5897d48b8eed5bcca3f35fa980a2a0ca056682d8a1ec875e2b485a9728770",
+    "_download": "e45df20969588076af53cb7c8de0d5a3e68e848919eb5d585ffbf3412da05225",
+    "trigger_offline_retrieval": (
+        "3a7f1bf91e3247810cc45e214aa3d932f600c4c85acf3631e5bbcc985f7bb71b"
+    ),
+}
+
+
+def test_sentinelsat_internals():
+    """Check that the sentinelsat internals used by the plugin did not change"""
+    for name, digest in SENTINELSAT_OVERRIDDEN.items():
+        source = inspect.getsource(getattr(Downloader, name))
+        assert hashlib.sha256(source.encode()).hexdigest() == digest, (
+            "sentinelsat Downloader.%s changed, check _ProductDownloader" % name
+        )
+
+    for name in ("_format_order_by", "_parse_opensearch_response"):
+        assert callable(getattr(sentinelsat.sentinel, name))
+    for name in ("_load_query", "_check_scihub_response", "_get_filename"):
+        assert callable(getattr(SentinelAPI, name))
+    api = SentinelAPI(None, None)
+    for name in (
+        "_tqdm",
+        "_online_attribute_used",
+        "dl_limit_semaphore",
+        "lta_limit_semaphore",
+    ):
+        assert hasattr(api, name)
+    downloader = Downloader(api)
+    for name in ("_tqdm", "chunk_size", "verify_checksum", "node_filter", "logger"):
+        assert hasattr(downloader, name)
+
+
+def test_product_downloader():
+    """Check that the downloader callback is called once a product is downloaded"""
+    downloader = _ProductDownloader(mock.MagicMock(concurrent_dl_limit=2))
+    downloader.on_downloaded = mock.MagicMock()
+    product_info = {"id": "uuid-1", "path": "/tmp/product.zip"}
+    with mock.patch.object(Downloader, "download", return_value=product_info):
+        assert copy.copy(downloader).download("uuid-1", "/tmp") == product_info
+    downloader.on_downloaded.assert_called_once_with(product_info)
+
+
+def test_stream_extract(tmp_path):
+    """Check that archives are extracted while downloaded, with checksum verification"""
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zfile:
+        zfile.writestr("S2A_MSIL1C_uuid-1.SAFE/manifest.safe", b"<xml/>" * 1000)
+    archive = archive.getvalue()
+
+    api = mock.MagicMock(concurrent_dl_limit=2, dl_limit_semaphore=threading.Lock())
+    chunks = [archive[i:][:100] for i in range(0, len(archive), 100)]
+    api.session.get.return_value.iter_content.side_effect = lambda chunk_size: iter(
+        chunks
+    )
+    downloader = _ProductDownloader(api)
+    downloader.stream_extract = True
+    product_info = {
+        "id": "uuid-1",
+        "url": "https://example.com/uuid-1",
+        "size": len(archive),
+        "md5": hashlib.md5(archive).hexdigest(),
+    }
+    path = tmp_path / "S2A_MSIL1C_uuid-1.zip"
+
+    product_info = downloader._download_common(product_info, path, None)
+    assert product_info["path"] == str(tmp_path / "S2A_MSIL1C_uuid-1")
+    assert product_info["downloaded_bytes"] == len(archive)
+    assert os.listdir(tmp_path) == ["S2A_MSIL1C_uuid-1"]
+    assert os.path.isfile(
+        tmp_path / "S2A_MSIL1C_uuid-1" / "S2A_MSIL1C_uuid-1.SAFE" / "manifest.safe"
+    )
+
+    # Nothing is left if the checksum does not match
+    product_info = dict(product_info, id="uuid-2", md5="0" * 32)
+    with pytest.raises(InvalidChecksumError):
+        downloader._download_common(product_info, tmp_path / "uuid-2.zip", None)
+    assert os.listdir(tmp_path) == ["S2A_MSIL1C_uuid-1"]
+
+    # The archive is downloaded if it cannot be extracted on the fly
+    product_info = dict(product_info, id="uuid-3")
+    with mock.patch.object(
+        _ProductDownloader, "_download_archive", return_value=product_info
+    ) as mock_download:
+        with mock.patch(
+            "eodag_sentinelsat.eodag_sentinelsat.ZipStreamExtractor.feed",
+            side_effect=StreamExtractError("unsupported"),
+        ):
+            downloader._download_common(product_info, tmp_path / "uuid-3.zip", None)
+    mock_download.assert_called_once()
+    assert product_info["path"] == str(tmp_path / "uuid-3.zip")
+
+
+def test_download_to_eodag_path(tmp_path):
+    """Check that products are downloaded straight to the path expected by EODAG"""
+    api = mock.MagicMock(concurrent_dl_limit=2)
+    api.get_product_odata.side_effect = lambda uuid: {"id": uuid, "size": 10}
+    api._get_filename.side_effect = lambda info: "sentinelsat_%s.zip" % info["id"]
+    downloader = _ProductDownloader(api)
+    downloader.target_paths = {"uuid-1": str(tmp_path / "eodag_uuid-1.zip")}
+
+    def download_common(product_info, path, stop_event):
+        path.write_text(product_info["id"])
+        return product_info
+
+    with mock.patch.object(
+        _ProductDownloader, "_download_archive", side_effect=download_common
+    ) as mock_download:
+        product_info = copy.copy(downloader).download("uuid-1", str(tmp_path))
+        assert product_info["path"] == str(tmp_path / "eodag_uuid-1.zip")
+        assert mock_download.call_args[0][1] == tmp_path / "eodag_uuid-1.zip"
+
+        # Already downloaded
+        copy.copy(downloader).download("uuid-1", str(tmp_path))
+        assert mock_download.call_count == 1
+
+        # Other products are downloaded to sentinelsat's path
+        with mock.patch.object(
+            Downloader, "download", return_value={"id": "uuid-2"}
+        ) as mock_sentinelsat_download:
+            downloader.download("uuid-2", str(tmp_path))
+        mock_sentinelsat_download.assert_called_once()
+
+
+def test_api_pool():
+    """Check that plugins with the same endpoint and credentials share their API"""
+
+    providers_config = load_default_config()
+    plugins = [
+        next(PluginManager(providers_config).get_search_plugins(provider="scihub"))
+        for _ in range(3)
+    ]
+    plugins[0].config.credentials = {"username": "user", "password": "pass"}
+    plugins[1].config.credentials = {"username": "user", "password": "pass"}
+    plugins[2].config.credentials = {"username": "other", "password": "pass"}
+    plugins[2].config.http_pool_size = 2
+    for plugin in plugins:
+        plugin._init_api()
+
+    assert plugins[0].api is plugins[1].api
+    assert plugins[0].api is not plugins[2].api
+    assert (
+        plugins[0].api.session.get_adapter(plugins[0].config.endpoint)._pool_maxsize
+        == 16
+    )
+    assert (
+        plugins[2].api.session.get_adapter(plugins[2].config.endpoint)._pool_maxsize
+        == 2
+    )
+
+
+def test_async_query(plugin_api, mock_dhus):
+    """Check that asynchronous searches run concurrently against a DHuS server"""
+    dhus = mock_dhus({"uuid-%s" % i: b"" for i in range(5)})
+    plugin_api.config.endpoint = dhus.url
+
+    async def search():
+        pages = await asyncio.gather(
+            *(
+                plugin_api.aquery(productType="S2_MSI_L1C", items_per_page=2, page=page)
+                for page in (1, 2, 3)
+            )
+        )
+        products = [p async for p in plugin_api.aiter_query(productType="S2_MSI_L1C")]
+        paged_products = [
+            p
+            async for p in plugin_api.aiter_query(
+                productType="S2_MSI_L1C", items_per_page=2
+            )
+        ]
+        return pages, products, paged_products
+
+    pages, products, paged_products = run_async(search())
+
+    assert [len(products) for products, _ in pages] == [2, 2, 1]
+    assert [count for _, count in pages] == [5, 5, 5]
+    assert [p.properties["id"] for products, _ in pages for p in products] == [
+        "S2A_MSIL1C_uuid-%s" % i for i in range(5)
+    ]
+    assert len(products) == 5
+    assert [p.properties["id"] for p in paged_products] == [
+        p.properties["id"] for p in products
+    ]
+    assert dhus.requests.count("GET /search") == 3 + 1 + 3
+
+
+def test_async_download_all(plugin_api, mock_dhus, tmp_path):
+    """Check that asynchronous downloads wait for OFFLINE products without blocking"""
+    contents = {"uuid-%s" % i: os.urandom(1000) for i in range(3)}
+    dhus = mock_dhus(contents, offline=["uuid-2"], lta_checks=2)
+    plugin_api.config.endpoint = dhus.url
+    search_result, _ = plugin_api.query(productType="S2_MSI_L1C")
+
+    paths = run_async(
+        plugin_api.adownload_all(
+            search_result,
+            wait=0.001,
+            timeout=1,
+            outputs_prefix=str(tmp_path),
+            extract=False,
+            max_concurrency=2,
+        )
+    )
+
+    assert len(paths) == 3
+    for product, path in zip(search_result, paths):
+        with open(path, "rb") as fh:
+            assert fh.read() == contents[product.properties["uuid"]]
+        assert product.location == "file://" + path
+    # The OFFLINE product was ordered, then downloaded once ONLINE
+    assert dhus.requests.count("GET /odata/v1/Products('uuid-2')/$value") == 2
+    assert not dhus.offline
+
+    # Downloaded products are not downloaded again
+    dhus.requests.clear()
+    assert (
+        run_async(
+            plugin_api.adownload_all(
+                search_result, outputs_prefix=str(tmp_path), extract=False
+            )
+        )
+        == paths
+    )
+    assert not any(path.endswith("$value") for path in dhus.requests)
+
+
+def test_async_download_lta_slots(plugin_api, mock_dhus, tmp_path):
+    """Check that ONLINE products are not delayed by the OFFLINE ones being retrieved"""
+    contents = {"uuid-%s" % i: os.urandom(1000) for i in range(4)}
+    offline = ["uuid-0", "uuid-1", "uuid-2"]
+    dhus = mock_dhus(contents, offline=offline, lta_checks=3)
+    plugin_api.config.endpoint = dhus.url
+    search_result, _ = plugin_api.query(productType="S2_MSI_L1C")
+    # Fewer LTA slots than OFFLINE products
+    plugin_api.api.concurrent_lta_trigger_limit = 1
+
+    paths = run_async(
+        plugin_api.adownload_all(
+            search_result,
+            wait=0.001,
+            timeout=1,
+            outputs_prefix=str(tmp_path),
+            extract=False,
+        )
+    )
+
+    assert len(paths) == 4
+    transfers = [
+        r
+        for r in dhus.requests
+        if r.startswith("GET /odata/v1/Products(") and r.endswith("')/$value")
+    ]
+    # The OFFLINE products are requested twice, ordered then downloaded, after the
+    # ONLINE product
+    online_transfer = transfers.index("GET /odata/v1/Products('uuid-3')/$value")
+    for uuid in offline:
+        request = "GET /odata/v1/Products('%s')/$value" % uuid
+        assert transfers.count(request) == 2
+        assert len(transfers) - 1 - transfers[::-1].index(request) > online_transfer
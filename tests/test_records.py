@@ -0,0 +1,153 @@
+import hashlib
+import os
+import sqlite3
+from unittest import mock
+
+from sentinelsat import SentinelAPI
+
+from eodag_sentinelsat.records import (
+    SQLiteDownloadRecords,
+    build_download_records,
+    main,
+    record_downloads,
+    record_key,
+)
+from eodag_sentinelsat.store import StoresByDirectory
+
+
+def test_sqlite_download_records(tmp_path):
+    """Check the bulk lookup, insertion and removal of download records"""
+
+    records = SQLiteDownloadRecords(str(tmp_path / "records.sqlite"))
+    urls = ["https://example.com/%s" % i for i in range(1200)]
+    records.add([(url, "/data/%s.zip" % i) for i, url in enumerate(urls[:1000])])
+
+    found = records.lookup(record_key(url) for url in urls)
+    assert len(found) == 1000
+    assert found[record_key(urls[10])] == (urls[10], "/data/10.zip")
+
+    records.remove([record_key(urls[10])])
+    assert record_key(urls[10]) not in records.lookup([record_key(urls[10])])
+    records.close()
+
+    # Records are persisted
+    records = SQLiteDownloadRecords(str(tmp_path / "records.sqlite"))
+    assert len(records.lookup(record_key(url) for url in urls)) == 999
+    records.close()
+
+
+def test_import_record_files(tmp_path):
+    """Check the import of eodag record files"""
+
+    records_dir = tmp_path / ".downloaded"
+    records_dir.mkdir()
+    urls = ["https://example.com/%s" % i for i in range(3)]
+    for url in urls:
+        (records_dir / record_key(url)).write_text(url)
+    (records_dir / "not-a-record").write_text("something else")
+
+    main([str(tmp_path), "--remove"])
+
+    assert os.listdir(records_dir) == ["not-a-record"]
+    records = build_download_records("sqlite", str(tmp_path))
+    assert records.path == os.path.join(str(tmp_path), ".downloaded.sqlite")
+    assert set(records.lookup(record_key(url) for url in urls)) == {
+        record_key(url) for url in urls
+    }
+    records.close()
+
+    assert build_download_records(None, str(tmp_path)) is None
+    assert build_download_records("files", str(tmp_path)) is None
+
+
+def test_record_downloads(tmp_path):
+    """Check that downloads are recorded in the records store or in record files"""
+
+    stores = StoresByDirectory(build_download_records)
+    assert stores.get(None, str(tmp_path)) is None
+    records = stores.get("sqlite", str(tmp_path))
+    assert stores.get("sqlite", str(tmp_path)) is records
+    url = "https://example.com/0"
+    record_downloads(records, [(url, "/data/0.zip", "md5:abc", None)])
+    assert records.lookup([record_key(url)]) == {record_key(url): (url, "/data/0.zip")}
+    assert records.checksums([record_key(url)]) == {record_key(url): "md5:abc"}
+    stores.clear()
+    assert stores.get("sqlite", str(tmp_path)) is not records
+    stores.clear()
+
+    record_file = tmp_path / record_key(url)
+    record_downloads(None, [(url, "/data/0.zip", None, str(record_file))])
+    assert record_file.read_text() == url
+
+
+def test_download_records_checksums(tmp_path):
+    """Check that checksums are kept with the records, also in previous databases"""
+    path = str(tmp_path / "records.sqlite")
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute(
+            "CREATE TABLE records ("
+            "key TEXT PRIMARY KEY, remote_location TEXT, fs_path TEXT, recorded_at REAL)"
+        )
+        conn.execute(
+            "INSERT INTO records VALUES (?, ?, ?, ?)",
+            (record_key("https://example.com/0"), "https://example.com/0", None, 0),
+        )
+    conn.close()
+
+    records = SQLiteDownloadRecords(path)
+    records.add(
+        [
+            ("https://example.com/1", "/data/1.zip", "md5:0123"),
+            ("https://example.com/2", "/data/2.zip"),
+        ]
+    )
+    keys = [record_key("https://example.com/%s" % i) for i in range(3)]
+    assert records.checksums(keys) == {keys[1]: "md5:0123"}
+    records.set_checksums({keys[0]: "md5:4567"})
+    assert records.checksums(keys) == {keys[0]: "md5:4567", keys[1]: "md5:0123"}
+    assert records.lookup(keys)[keys[1]] == ("https://example.com/1", "/data/1.zip")
+    records.close()
+
+
+def test_check_downloads(plugin_api, mock_dhus, tmp_path):
+    """Check that downloads are checked with the checksums computed while downloaded"""
+    plugin_api.config.download_records = "sqlite"
+    contents = {"uuid-%s" % i: os.urandom(1000) for i in range(3)}
+    dhus = mock_dhus(contents)
+    plugin_api.config.endpoint = dhus.url
+    search_result, _ = plugin_api.query(productType="S2_MSI_L1C")
+    # Archives are not read again to be checked
+    with mock.patch.object(
+        SentinelAPI, "_checksum_compare", side_effect=AssertionError
+    ):
+        paths = plugin_api.download_all(search_result, extract=False)
+
+    records = plugin_api._get_download_records()
+    keys = [record_key(product.remote_location) for product in search_result]
+    assert records.checksums(keys) == {
+        key: "md5:%s" % hashlib.md5(contents[product.properties["uuid"]]).hexdigest()
+        for key, product in zip(keys, search_result)
+    }
+
+    with mock.patch(
+        "eodag_sentinelsat.eodag_sentinelsat._hash_file", autospec=True
+    ) as hash_file:
+        assert plugin_api.check_downloads(search_result) == []
+    hash_file.assert_not_called()
+
+    # A corrupted archive recorded without checksum
+    records.add([(search_result[1].remote_location, paths[1])])
+    with open(paths[1], "r+b") as fh:
+        fh.write(b"corrupted")
+
+    assert plugin_api.check_downloads(search_result) == [search_result[1]]
+    assert not os.path.exists(paths[1])
+    assert keys[1] not in records.lookup(keys)
+    assert records.checksums(keys) == {
+        key: "md5:%s" % hashlib.md5(contents[product.properties["uuid"]]).hexdigest()
+        for key, product in zip(keys, search_result)
+        if key != keys[1]
+    }
+    assert plugin_api.download_all(search_result, extract=False) == paths
+    assert plugin_api.check_downloads(search_result) == []
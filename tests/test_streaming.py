@@ -0,0 +1,96 @@
+import io
+import os
+import zipfile
+
+import pytest
+
+from eodag_sentinelsat.streaming import StreamExtractError, ZipStreamExtractor
+
+
+class Unseekable(io.RawIOBase):
+    """Output stream that makes zipfile write data descriptors"""
+
+    def __init__(self):
+        self.output = io.BytesIO()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return self.output.write(data)
+
+
+ENTRIES = {
+    "S2A.SAFE/manifest.safe": b"<xml/>" * 1000,
+    "S2A.SAFE/GRANULE/IMG_B01.jp2": os.urandom(100000),
+    "S2A.SAFE/empty.txt": b"",
+}
+
+
+def make_archive(seekable=True, compression=zipfile.ZIP_DEFLATED, zip64=False):
+    fp = io.BytesIO() if seekable else Unseekable()
+    with zipfile.ZipFile(fp, "w", compression) as zfile:
+        zfile.writestr("S2A.SAFE/", b"")
+        for name, data in ENTRIES.items():
+            with zfile.open(name, "w", force_zip64=zip64) as fh:
+                fh.write(data)
+    return (fp if seekable else fp.output).getvalue()
+
+
+def extract(archive, directory, chunk_size):
+    extractor = ZipStreamExtractor(str(directory))
+    for i in range(0, len(archive), chunk_size):
+        chunk_end = i + chunk_size
+        extractor.feed(archive[i:chunk_end])
+    extractor.close()
+    return extractor
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 2**16])
+@pytest.mark.parametrize(
+    "seekable,compression,zip64",
+    [
+        (True, zipfile.ZIP_DEFLATED, False),
+        (True, zipfile.ZIP_STORED, False),
+        (False, zipfile.ZIP_DEFLATED, False),
+        (True, zipfile.ZIP_DEFLATED, True),
+        (False, zipfile.ZIP_DEFLATED, True),
+    ],
+)
+def test_zip_stream_extractor(tmp_path, chunk_size, seekable, compression, zip64):
+    """Check that archives are extracted from their successive chunks"""
+
+    archive = make_archive(seekable, compression, zip64)
+    extractor = extract(archive, tmp_path, chunk_size)
+
+    assert extractor.entries == len(ENTRIES)
+    for name, data in ENTRIES.items():
+        with open(tmp_path / name, "rb") as fh:
+            assert fh.read() == data
+
+
+def test_zip_stream_extractor_errors(tmp_path):
+    """Check that archives that cannot be extracted on the fly are detected"""
+
+    # Stored entries of unknown size
+    with pytest.raises(StreamExtractError):
+        extract(make_archive(False, zipfile.ZIP_STORED), tmp_path / "stored", 1024)
+
+    # Truncated archive
+    archive = make_archive()
+    with pytest.raises(StreamExtractError):
+        extract(archive[: len(archive) // 2], tmp_path / "truncated", 1024)
+
+    # Corrupted entry
+    archive = bytearray(make_archive(compression=zipfile.ZIP_STORED))
+    archive[archive.index(b"<xml/>")] = ord("[")
+    with pytest.raises(StreamExtractError, match="CRC"):
+        extract(bytes(archive), tmp_path / "corrupted", 1024)
+
+    # Entries outside of the extraction directory
+    fp = io.BytesIO()
+    with zipfile.ZipFile(fp, "w") as zfile:
+        zfile.writestr("../evil.txt", b"evil")
+    with pytest.raises(StreamExtractError, match="Invalid entry name"):
+        extract(fp.getvalue(), tmp_path / "evil", 1024)
+    assert not os.path.exists(tmp_path / "evil.txt")